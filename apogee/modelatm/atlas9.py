@@ -5,7 +5,6 @@ import os, os.path
 import copy
 import numpy
 from scipy import interpolate, ndimage
-from galpy.util import bovy_plot
 import apogee.tools.path as appath
 import apogee.tools.download as apdownload
 from apogee.util import int_newton_cotes
@@ -73,6 +72,7 @@ class Atlas9Atmosphere(object):
         HISTORY:
            2015-03-20 - Written - Bovy (IAS)
         """
+        from galpy.util import bovy_plot
         # Load atmospheric quantity
         if y.upper() == 'RHOX':
             indx= 0
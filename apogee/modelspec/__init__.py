@@ -1,36 +1,45 @@
 from functools import wraps
+from collections import OrderedDict
 import os, os.path
+import hashlib
 import shutil
 import subprocess
 import numpy
 from scipy import special
+import scipy.sparse
 import apogee.tools.read as apread
 import apogee.tools.path as appath
 from apogee.tools import toAspcapGrid
-from apogee.spec.plot import apStarWavegrid
+from apogee.spec.wavegrid import apStarWavegrid, aspcapWavegrid
+from apogee.spec.cube import SpecCube
+# Most recently used macroturbulence kernels; keys are (vmacro,x hash,sparse,
+# norm)
+_MAX_VMACRO_CACHE= 8
+_VMACRO_CACHE= OrderedDict()
 def specFitInput(func):
     """Decorator to parse the input for spectral fitting"""
     @wraps(func)
     def input_wrapper(*args,**kwargs):
+        if isinstance(args[0],SpecCube): # spectral cube; no separate errors
+            args= (args[0].spec,args[0].specerr)+args[1:]
         spec= args[0]
         specerr= args[1]
         if isinstance(specerr,str): # locID+APOGEE-ID; array
-            ispec= apread.aspcapStar(spec,specerr,ext=1,header=False,
-                                     aspcapWavegrid=True)
-            ispecerr= apread.aspcapStar(spec,specerr,ext=2,header=False,
-                                        aspcapWavegrid=True)
-            spec= ispec
-            specerr= ispecerr
+            # Read spectrum and errors w/ a single open of the file
+            spec, specerr= apread._spec_exts(spec,specerr,[1,2])
+            spec= toAspcapGrid(spec)
+            specerr= toAspcapGrid(specerr)
         elif (isinstance(specerr,(list,numpy.ndarray)) \
                   and isinstance(specerr[0],str)): # locID+APOGEE-ID; array
             nspec= len(specerr)
-            ispec= numpy.empty((nspec,7214))
-            ispecerr= numpy.empty((nspec,7214))
+            # aspcapStar files are read for the default data release
+            npix= aspcapWavegrid(dr=appath._default_dr()).npix
+            ispec= numpy.empty((nspec,npix))
+            ispecerr= numpy.empty((nspec,npix))
             for ii in range(nspec):
-                ispec[ii]= apread.aspcapStar(spec[ii],specerr[ii],ext=1,
-                                             header=False,aspcapWavegrid=True)
-                ispecerr[ii]= apread.aspcapStar(spec[ii],specerr[ii],ext=2,
-                                                header=False,aspcapWavegrid=True)
+                tspec, tspecerr= apread._spec_exts(spec[ii],specerr[ii],[1,2])
+                ispec[ii]= toAspcapGrid(tspec)
+                ispecerr[ii]= toAspcapGrid(tspecerr)
             spec= ispec
             specerr= ispecerr
         elif isinstance(specerr,(list,numpy.ndarray)) \
@@ -111,33 +120,57 @@ def vmacro(x,vmacro=6.,sparse=False,norm=True):
        sparse= (False) if True, return a sparse representation that can be passed to apogee.spec.lsf.convolve for easy convolution      
        norm= (True) if False, don't normalize to sum to 1 (useful to check whether the kernel actually integrates to 1)
     OUTPUT:
-       LSF-like array of the macroturbulence
+       LSF-like array of the macroturbulence (the most recently used kernels are cached; a copy of the cached kernel is returned, which can be modified)
     HISTORY:
        2015-03-23 - Written - Bovy (IAS)
+       2026-10-18 - Cache kernels, compute the kernel once for all pixel centers - Bovy (IAS)
+       2026-10-18 - Return a copy of cached sparse kernels - Bovy (IAS)
+       2026-10-18 - Return a copy of cached dense kernels - Bovy (IAS)
     """
-    from apogee.spec.lsf import sparsify
+    key= (float(vmacro),hashlib.md5(numpy.ascontiguousarray(x,dtype='f8')\
+                                        .tostring()).hexdigest(),
+          sparse,norm)
+    if key in _VMACRO_CACHE:
+        out= _VMACRO_CACHE.pop(key)
+        _VMACRO_CACHE[key]= out # most recently used
+        return _vmacro_copy(out,sparse)
     # Convert vmacro to Gaussian sigma / c
     sigvm= vmacro/3./10.**5./2./numpy.sqrt(2.*numpy.log(2.))
     # Are the x unit pixels or a fraction 1/hires thereof?
-    hires= int(1./(x[1]-x[0]))
+    hires= int(round(1./(x[1]-x[0])))
     # Setup output
     wav= apStarWavegrid()
     l10wav= numpy.log10(wav)
     dowav= l10wav[1]-l10wav[0]
-    # Hi-res wavelength for output
-    hireswav= 10.**numpy.arange(l10wav[0],l10wav[-1]+dowav/hires,dowav/hires)
-    # Calculate kernel
-    lam= numpy.tile(hireswav,(len(x),1)).T
-    dlam= 10.**(numpy.tile(numpy.log10(hireswav),(len(x),1)).T\
-                    +numpy.tile(x,(len(hireswav),1))*dowav)/lam-1.
+    # Number of hi-res wavelengths for output
+    nhires= len(numpy.arange(l10wav[0],l10wav[-1]+dowav/hires,dowav/hires))
+    # Calculate kernel; on the logarithmic wavelength grid, the kernel is 
+    # the same for all pixel centers
+    dlam= 10.**(x*dowav)-1.
     u= numpy.fabs(dlam/sigvm)
-    out= 2./numpy.sqrt(numpy.pi)*u\
-        *(numpy.exp(-u**2.)/u-numpy.sqrt(numpy.pi)*special.erfc(u))
-    out[dlam == 0.]= 2./numpy.sqrt(numpy.pi)
-    out*= (1.+dlam)*numpy.log(10.)/sigvm
-    if norm: out/= numpy.tile(numpy.sum(out,axis=1),(len(x),1)).T
-    if sparse: out= sparsify(out)
-    return out
+    with numpy.errstate(divide='ignore',invalid='ignore'):
+        kernel= 2./numpy.sqrt(numpy.pi)*u\
+            *(numpy.exp(-u**2.)/u-numpy.sqrt(numpy.pi)*special.erfc(u))
+    kernel[dlam == 0.]= 2./numpy.sqrt(numpy.pi)
+    kernel*= (1.+dlam)*numpy.log(10.)/sigvm
+    if norm: kernel/= numpy.sum(kernel)
+    if sparse:
+        # Like apogee.spec.lsf.sparsify, w/o the dense array
+        offsets= len(x)//2-numpy.arange(len(x))
+        out= scipy.sparse.diags([kernel[ii]*numpy.ones(nhires-abs(offset))
+                                 for ii,offset in enumerate(offsets)],
+                                offsets)
+    else:
+        out= numpy.broadcast_to(kernel,(nhires,len(x)))
+    if len(_VMACRO_CACHE) >= _MAX_VMACRO_CACHE:
+        _VMACRO_CACHE.popitem(last=False)
+    _VMACRO_CACHE[key]= out
+    return _vmacro_copy(out,sparse)
+
+def _vmacro_copy(out,sparse):
+    """Copy of a cached vmacro kernel, such that callers can modify it"""
+    if sparse: return out.copy()
+    else: return numpy.array(out)
 
 def _chi2(mspec,spec,specerr,weights=None):
     """Internal function that calculates the chi^2 for a given model,
@@ -14,10 +14,6 @@ from apogee.tools.read import modelspecOnApStarWavegrid
 import apogee.spec.window as apwindow
 import apogee.spec.cannon as cannon
 from apogee.modelspec import specFitInput, _chi2
-try:
-    import apogee.util.emcee
-except ImportError:
-    pass
 def paramArrayInputDecorator(startIndx):
     """Decorator to parse spectral input parameters given as arrays,
     assumes the arguments are: something,somethingelse,teff,logg,metals,am,nm,cm,vmicro=,
@@ -990,6 +986,7 @@ def mcmc(spec,specerr,
     dspec= numpy.tile(spec,(nwalkers,1))
     dspecerr= numpy.tile(specerr,(nwalkers,1))
     # Run MCMC
+    import apogee.util.emcee
     sampler= apogee.util.emcee.EnsembleSampler(nwalkers,ndim,_mcmc_lnprob,
                                                args=[dspec,dspecerr,
                                                      teff,logg,vm,metals,
@@ -7,11 +7,10 @@ import shutil
 import tempfile
 import subprocess
 import numpy
-from scipy import interpolate
 import apogee.spec.lsf as aplsf
 import apogee.spec.continuum as apcont
 import apogee.spec.window as apwindow
-from apogee.spec.plot import apStarWavegrid
+from apogee.spec.wavegrid import apStarWavegrid
 from apogee.tools import paramIndx
 import apogee.tools.path as appath
 import apogee.tools.download as download
@@ -35,9 +34,11 @@ def synth(*args,**kwargs):
           [Atomic numberM,diffM_1,diffM_2,diffM_3,...,diffM_N]
     INPUT KEYWORDS:
        LSF:
-          lsf= ('all') LSF to convolve with; output of apogee.spec.lsf.eval; sparsify for efficiency; if 'all' or 'combo' a pre-computed version will be downloaded from the web
+          lsf= ('all') LSF to convolve with; output of apogee.spec.lsf.eval; sparsify for efficiency; if 'all' or 'combo' a pre-computed version will be downloaded from the web; if a fiber number or a list of fiber numbers, the LSF of these fibers is evaluated
+          lsfcache= (False) if True and lsf is a fiber number or a list of fiber numbers, cache the evaluated LSF on disk (see apogee.spec.lsf.eval)
+          lsfbank= (False) if True and lsf is a fiber number or a list of fiber numbers, look up the LSF in the LSF bank built with apogee.spec.lsf.build_bank instead of evaluating it (see apogee.spec.lsf.eval_bank)
           Either:
-             xlsf= (None) pixel offset grid on which the LSF is computed (see apogee.spec.lsf.eval); unnecessary if lsf=='all' or 'combo'
+             xlsf= (None) pixel offset grid on which the LSF is computed (see apogee.spec.lsf.eval); unnecessary if lsf=='all' or 'combo' (and defaults to numpy.linspace(-7.,7.,43) if lsf is a fiber number)
              dxlsf= (None) spacing of pixel offsets
           vmacro= (6.) macroturbulence to apply
        CONTINUUM:
@@ -74,9 +75,19 @@ def synth(*args,**kwargs):
     run_weedout= kwargs.pop('run_weedout',False)
     # Check that we have the LSF and store the relevant keywords
     lsf= kwargs.pop('lsf','all')
+    lsfcache= kwargs.pop('lsfcache',False)
+    lsfbank= kwargs.pop('lsfbank',False)
     if isinstance(lsf,str):
         xlsf, lsf= aplsf._load_precomp(dr=kwargs.get('dr',None),fiber=lsf)
         dxlsf= None
+    elif aplsf._is_fiber(lsf):
+        xlsf= kwargs.pop('xlsf',numpy.linspace(-7.,7.,43))
+        if lsfbank:
+            lsf= aplsf.eval_bank(fiber=lsf,x=xlsf,dr=kwargs.get('dr',None))
+        else:
+            lsf= aplsf.eval(xlsf,fiber=lsf,sparse=True,
+                            dr=kwargs.get('dr',None),cache=lsfcache)
+        dxlsf= None
     else:
         xlsf= kwargs.pop('xlsf',None)
         dxlsf= kwargs.pop('dxlsf',None)
@@ -167,11 +178,7 @@ def synth(*args,**kwargs):
     if cont.lower() == 'true':
         # Get the true continuum on the apStar wavelength grid
         apWave= apStarWavegrid()
-        baseline= numpy.polynomial.Polynomial.fit(mwav,cflux,4)
-        ip= interpolate.InterpolatedUnivariateSpline(mwav,
-                                                     cflux/baseline(mwav),
-                                                     k=3)
-        cflux= baseline(apWave)*ip(apWave)
+        cflux= aplsf.resample(mwav,cflux,apWave)
         # Divide it out
         out/= numpy.tile(cflux,(nsynth,1))
     elif not cont is None:
@@ -205,9 +212,11 @@ def windows(*args,**kwargs):
           >>> baseline= moogsynth(**kwargs)[1]
           >>> mwav, cflux= moogsynth(doflux=True,**kwargs)
        LSF:
-          lsf= ('all') LSF to convolve with; output of apogee.spec.lsf.eval; sparsify for efficiency; if 'all' or 'combo' a pre-computed version will be downloaded from the web
+          lsf= ('all') LSF to convolve with; output of apogee.spec.lsf.eval; sparsify for efficiency; if 'all' or 'combo' a pre-computed version will be downloaded from the web; if a fiber number or a list of fiber numbers, the LSF of these fibers is evaluated
+          lsfcache= (False) if True and lsf is a fiber number or a list of fiber numbers, cache the evaluated LSF on disk (see apogee.spec.lsf.eval)
+          lsfbank= (False) if True and lsf is a fiber number or a list of fiber numbers, look up the LSF in the LSF bank built with apogee.spec.lsf.build_bank instead of evaluating it (see apogee.spec.lsf.eval_bank)
           Either:
-             xlsf= (None) pixel offset grid on which the LSF is computed (see apogee.spec.lsf.eval); unnecessary if lsf=='all' or 'combo'
+             xlsf= (None) pixel offset grid on which the LSF is computed (see apogee.spec.lsf.eval); unnecessary if lsf=='all' or 'combo' (and defaults to numpy.linspace(-7.,7.,43) if lsf is a fiber number)
              dxlsf= (None) spacing of pixel offsets
           vmacro= (6.) macroturbulence to apply
        CONTINUUM:
@@ -247,9 +256,19 @@ def windows(*args,**kwargs):
     cflux= kwargs.pop('cflux',None)
     # Check that we have the LSF and store the relevant keywords
     lsf= kwargs.pop('lsf','all')
+    lsfcache= kwargs.pop('lsfcache',False)
+    lsfbank= kwargs.pop('lsfbank',False)
     if isinstance(lsf,str):
         xlsf, lsf= aplsf._load_precomp(dr=kwargs.get('dr',None),fiber=lsf)
         dxlsf= None
+    elif aplsf._is_fiber(lsf):
+        xlsf= kwargs.pop('xlsf',numpy.linspace(-7.,7.,43))
+        if lsfbank:
+            lsf= aplsf.eval_bank(fiber=lsf,x=xlsf,dr=kwargs.get('dr',None))
+        else:
+            lsf= aplsf.eval(xlsf,fiber=lsf,sparse=True,
+                            dr=kwargs.get('dr',None),cache=lsfcache)
+        dxlsf= None
     else:
         xlsf= kwargs.pop('xlsf',None)
         dxlsf= kwargs.pop('dxlsf',None)
@@ -368,11 +387,7 @@ def windows(*args,**kwargs):
     if cont.lower() == 'true':
         # Get the true continuum on the apStar wavelength grid
         apWave= apStarWavegrid()
-        baseline= numpy.polynomial.Polynomial.fit(mwav,cflux,4)
-        ip= interpolate.InterpolatedUnivariateSpline(mwav,
-                                                     cflux/baseline(mwav),
-                                                     k=3)
-        cflux= baseline(apWave)*ip(apWave)
+        cflux= aplsf.resample(mwav,cflux,apWave)
         # Divide it out
         out/= numpy.tile(cflux,(nsynth,1))
     elif not cont is None:
@@ -9,13 +9,12 @@ import tempfile
 import subprocess
 import warnings
 import numpy
-from scipy import interpolate
 import apogee.spec.lsf as aplsf
 import apogee.spec.continuum as apcont
 import apogee.spec.window as apwindow
 import apogee.tools.path as appath
 from apogee.tools import paramIndx, air2vac, vac2air
-from apogee.spec.plot import apStarWavegrid
+from apogee.spec.wavegrid import apStarWavegrid
 import apogee.tools.download as download
 from apogee.modelatm import atlas9
 from apogee.util import solarabundances
@@ -37,9 +36,11 @@ def synth(*args,**kwargs):
           [Atomic numberM,diffM_1,diffM_2,diffM_3,...,diffM_N]
     INPUT KEYWORDS:
        LSF:
-          lsf= ('all') LSF to convolve with; output of apogee.spec.lsf.eval; sparsify for efficiency; if 'all' or 'combo' a pre-computed version will be downloaded from the web
+          lsf= ('all') LSF to convolve with; output of apogee.spec.lsf.eval; sparsify for efficiency; if 'all' or 'combo' a pre-computed version will be downloaded from the web; if a fiber number or a list of fiber numbers, the LSF of these fibers is evaluated
+          lsfcache= (False) if True and lsf is a fiber number or a list of fiber numbers, cache the evaluated LSF on disk (see apogee.spec.lsf.eval)
+          lsfbank= (False) if True and lsf is a fiber number or a list of fiber numbers, look up the LSF in the LSF bank built with apogee.spec.lsf.build_bank instead of evaluating it (see apogee.spec.lsf.eval_bank)
           Either:
-             xlsf= (None) pixel offset grid on which the LSF is computed (see apogee.spec.lsf.eval); unnecessary if lsf=='all' or 'combo'
+             xlsf= (None) pixel offset grid on which the LSF is computed (see apogee.spec.lsf.eval); unnecessary if lsf=='all' or 'combo' (and defaults to numpy.linspace(-7.,7.,43) if lsf is a fiber number)
              dxlsf= (None) spacing of pixel offsets
           vmacro= (6.) macroturbulence to apply
        CONTINUUM:
@@ -76,9 +77,19 @@ def synth(*args,**kwargs):
     """
     # Check that we have the LSF and store the relevant keywords
     lsf= kwargs.pop('lsf','all')
+    lsfcache= kwargs.pop('lsfcache',False)
+    lsfbank= kwargs.pop('lsfbank',False)
     if isinstance(lsf,str):
         xlsf, lsf= aplsf._load_precomp(dr=kwargs.get('dr',None),fiber=lsf)
         dxlsf= None
+    elif aplsf._is_fiber(lsf):
+        xlsf= kwargs.pop('xlsf',numpy.linspace(-7.,7.,43))
+        if lsfbank:
+            lsf= aplsf.eval_bank(fiber=lsf,x=xlsf,dr=kwargs.get('dr',None))
+        else:
+            lsf= aplsf.eval(xlsf,fiber=lsf,sparse=True,
+                            dr=kwargs.get('dr',None),cache=lsfcache)
+        dxlsf= None
     else:
         xlsf= kwargs.pop('xlsf',None)
         dxlsf= kwargs.pop('dxlsf',None)
@@ -146,12 +157,7 @@ def synth(*args,**kwargs):
     if cont.lower() == 'true':
         # Get the true continuum on the apStar wavelength grid
         apWave= apStarWavegrid()
-        baseline= numpy.polynomial.Polynomial.fit(mwav,tmpOut[2]/tmpOut[1],4)
-        ip= interpolate.InterpolatedUnivariateSpline(mwav,
-                                                     tmpOut[2]/tmpOut[1]\
-                                                         /baseline(mwav),
-                                                     k=3)
-        cflux= baseline(apWave)*ip(apWave)
+        cflux= aplsf.resample(mwav,tmpOut[2]/tmpOut[1],apWave)
         # Divide it out
         out/= numpy.tile(cflux,(nsynth,1))
     elif not cont is None:
@@ -190,9 +196,11 @@ def windows(*args,**kwargs):
           >>> cflux= baseline[2]/baseline[1]
           >>> baseline= baseline[1]
        LSF:
-          lsf= ('all') LSF to convolve with; output of apogee.spec.lsf.eval; sparsify for efficiency; if 'all' or 'combo' a pre-computed version will be downloaded from the web
+          lsf= ('all') LSF to convolve with; output of apogee.spec.lsf.eval; sparsify for efficiency; if 'all' or 'combo' a pre-computed version will be downloaded from the web; if a fiber number or a list of fiber numbers, the LSF of these fibers is evaluated
+          lsfcache= (False) if True and lsf is a fiber number or a list of fiber numbers, cache the evaluated LSF on disk (see apogee.spec.lsf.eval)
+          lsfbank= (False) if True and lsf is a fiber number or a list of fiber numbers, look up the LSF in the LSF bank built with apogee.spec.lsf.build_bank instead of evaluating it (see apogee.spec.lsf.eval_bank)
           Either:
-             xlsf= (None) pixel offset grid on which the LSF is computed (see apogee.spec.lsf.eval); unnecessary if lsf=='all' or 'combo'
+             xlsf= (None) pixel offset grid on which the LSF is computed (see apogee.spec.lsf.eval); unnecessary if lsf=='all' or 'combo' (and defaults to numpy.linspace(-7.,7.,43) if lsf is a fiber number)
              dxlsf= (None) spacing of pixel offsets
           vmacro= (6.) macroturbulence to apply
        CONTINUUM:
@@ -235,9 +243,19 @@ def windows(*args,**kwargs):
     raw= kwargs.pop('raw',False)
     # Check that we have the LSF and store the relevant keywords
     lsf= kwargs.pop('lsf','all')
+    lsfcache= kwargs.pop('lsfcache',False)
+    lsfbank= kwargs.pop('lsfbank',False)
     if isinstance(lsf,str):
         xlsf, lsf= aplsf._load_precomp(dr=kwargs.get('dr',None),fiber=lsf)
         dxlsf= None
+    elif aplsf._is_fiber(lsf):
+        xlsf= kwargs.pop('xlsf',numpy.linspace(-7.,7.,43))
+        if lsfbank:
+            lsf= aplsf.eval_bank(fiber=lsf,x=xlsf,dr=kwargs.get('dr',None))
+        else:
+            lsf= aplsf.eval(xlsf,fiber=lsf,sparse=True,
+                            dr=kwargs.get('dr',None),cache=lsfcache)
+        dxlsf= None
     else:
         xlsf= kwargs.pop('xlsf',None)
         dxlsf= kwargs.pop('dxlsf',None)
@@ -360,11 +378,7 @@ def windows(*args,**kwargs):
     if cont.lower() == 'true':
         # Get the true continuum on the apStar wavelength grid
         apWave= apStarWavegrid()
-        baseline= numpy.polynomial.Polynomial.fit(mwav,cflux,4)
-        ip= interpolate.InterpolatedUnivariateSpline(mwav,
-                                                     cflux/baseline(mwav),
-                                                     k=3)
-        cflux= baseline(apWave)*ip(apWave)
+        cflux= aplsf.resample(mwav,cflux,apWave)
         # Divide it out
         out/= numpy.tile(cflux,(nsynth,1))
     elif not cont is None:
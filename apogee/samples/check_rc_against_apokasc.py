@@ -9,6 +9,7 @@ import esutil
 import fitsio
 import isodist
 import apogee.tools.read as apread
+import apogee.tools.match as apmatch
 import apogee.samples.rc as rcmodel
 def match_apokasc_rc(rcfile=None,addl_logg_cut=False):
     #First read apokasc
@@ -22,10 +23,9 @@ def match_apokasc_rc(rcfile=None,addl_logg_cut=False):
         rcdata= rcdata[rcdata['ADDL_LOGG_CUT'] == 1]
     print "RC catalog has %i entries ..." % len(rcdata)
     #Match
-    h=esutil.htm.HTM()
-    m1,m2,d12 = h.match(kascdata['RA'],kascdata['DEC'],
-                        rcdata['RA'],rcdata['DEC'],
-                        2./3600.,maxmatch=1)
+    m1,m2,d12 = apmatch.match(kascdata['RA'],kascdata['DEC'],
+                               rcdata['RA'],rcdata['DEC'],
+                               2./3600.,maxmatch=1)
     kascdata= esutil.numpy_util.add_fields(kascdata,[('RC', int)])
     kascdata['RC']= 0
     kascdata['RC'][m1]= 1
@@ -1,12 +1,6 @@
 import numpy
 from scipy import misc, special
 import scipy.interpolate
-import isodist, isodist.imf
-try:
-    from galpy.util import bovy_plot
-    _BOVY_PLOT_LOADED= True
-except ImportError:
-    _BOVY_PLOT_LOADED= False
 from apogee.util import dens_kde
 class isomodel:
     """isomodel: isochrone model for the distribution in (J-Ks,M_H) of a set of isochrones"""
@@ -48,6 +42,7 @@ class isomodel:
         HISTORY:
            2012-11-07 - Written - Bovy (IAS)
         """
+        import isodist, isodist.imf
         self._band= band
         self._loggmin= loggmin
         self._loggmax= loggmax
@@ -268,7 +263,9 @@ class isomodel:
         HISTORY:
            2012-11-09 - Written - Bovy (IAS)
         """
-        if not _BOVY_PLOT_LOADED:
+        try:
+            from galpy.util import bovy_plot
+        except ImportError:
             raise ImportError("galpy.util.bovy_plot could not be imported")
         xs, lnpdf= self.calc_pdf(jk)
         if self._band == 'J':
@@ -460,7 +457,9 @@ class isomodel:
         HISTORY:
            2012-02-17 - Written - Bovy (IAS)
         """
-        if not _BOVY_PLOT_LOADED:
+        try:
+            from galpy.util import bovy_plot
+        except ImportError:
             raise ImportError("'galpy.util.bovy_plot' plotting package not found")
         #Form histogram grid
         if nbins is None:
@@ -533,7 +532,9 @@ class isomodel:
         HISTORY:
            2012-06-15 - Written - Bovy (IAS)
         """
-        if not _BOVY_PLOT_LOADED:
+        try:
+            from galpy.util import bovy_plot
+        except ImportError:
             raise ImportError("'galpy.util.bovy_plot' plotting package not found")
         if self._band == 'J':
             ylabel= r'$M_J$'
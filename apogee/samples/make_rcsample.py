@@ -24,6 +24,7 @@ import esutil
 from galpy.util import bovy_coords
 import isodist
 import apogee.tools.read as apread
+import apogee.tools.match as apmatch
 import apogee.tools.path as appath
 import apogee.select.apogeeSelect
 import apogee.samples.rc as rcmodel
@@ -264,9 +265,8 @@ def make_rcsample(parser):
                                       17: lambda s: float(s.strip() or -9999),
                                       18: lambda s: float(s.strip() or -9999)},
                           usecols=(4,5,15,16,17,18))
-        h=esutil.htm.HTM()
-        m1,m2,d12 = h.match(data['RA'],data['DEC'],
-                            ma[:,0],ma[:,1],4./3600.,maxmatch=1)
+        m1,m2,d12 = apmatch.match(data['RA'],data['DEC'],
+                                  ma[:,0],ma[:,1],4./3600.,maxmatch=1)
         pmdata['PMMATCH']= 0
         pmdata['RA']= data['RA']
         pmdata['DEC']= data['DEC']
@@ -295,10 +295,9 @@ def make_rcsample(parser):
                                              ('PMDEC_ERR', numpy.float),
                                              ('PMMATCH',numpy.int32)])
     data['PMMATCH']= 0
-    h=esutil.htm.HTM()
-    m1,m2,d12 = h.match(pmdata['RA'],pmdata['DEC'],
-                        data['RA'],data['DEC'],
-                        2./3600.,maxmatch=1)
+    m1,m2,d12 = apmatch.match(pmdata['RA'],pmdata['DEC'],
+                              data['RA'],data['DEC'],
+                              2./3600.,maxmatch=1)
     data['PMRA'][m2]= pmdata['PMRA'][m1]
     data['PMDEC'][m2]= pmdata['PMDEC'][m1]
     data['PMRA_ERR'][m2]= pmdata['PMRA_ERR'][m1]
@@ -380,9 +379,8 @@ def make_rcsample(parser):
                                       17: lambda s: float(s.strip() or -9999),
                                       18: lambda s: float(s.strip() or -9999)},
                           usecols=(4,5,15,16,19,20))
-        h=esutil.htm.HTM()
-        m1,m2,d12 = h.match(data['RA'],data['DEC'],
-                            ma[:,0],ma[:,1],4./3600.,maxmatch=1)
+        m1,m2,d12 = apmatch.match(data['RA'],data['DEC'],
+                                  ma[:,0],ma[:,1],4./3600.,maxmatch=1)
         pmdata['PMMATCH']= 0
         pmdata['RA']= data['RA']
         pmdata['DEC']= data['DEC']
@@ -407,10 +405,9 @@ def make_rcsample(parser):
                                              ('PMDEC_ERR_PPMXL', numpy.float),
                                              ('PMMATCH_PPMXL',numpy.int32)])
     data['PMMATCH_PPMXL']= 0
-    h=esutil.htm.HTM()
-    m1,m2,d12 = h.match(pmdata['RA'],pmdata['DEC'],
-                        data['RA'],data['DEC'],
-                        2./3600.,maxmatch=1)
+    m1,m2,d12 = apmatch.match(pmdata['RA'],pmdata['DEC'],
+                              data['RA'],data['DEC'],
+                              2./3600.,maxmatch=1)
     data['PMRA_PPMXL'][m2]= pmdata['PMRA'][m1]
     data['PMDEC_PPMXL'][m2]= pmdata['PMDEC'][m1]
     data['PMRA_ERR_PPMXL'][m2]= pmdata['PMRA_ERR'][m1]
@@ -3,14 +3,6 @@ import copy
 import pickle
 import numpy
 from scipy import optimize, interpolate
-try:
-    from galpy.util import bovy_plot
-    _BOVY_PLOT_LOADED= True
-except ImportError:
-    _BOVY_PLOT_LOADED= False
-from matplotlib import pyplot
-from matplotlib.ticker import NullFormatter
-import isodist
 from apogee.samples.isomodel import isomodel
 from apogee.util import localfehdist, zsolar
 def jkzcut(jk,upper=False):
@@ -50,6 +42,7 @@ def zjkcut(z,upper=False):
             return 0.8
 
 def loggteffcut(teff,z,upper=True):
+    import isodist
     if not upper:
         return 1.8
     else:
@@ -227,6 +220,7 @@ class rcpop:
         HISTORY:
            2014-02-28 - Written in this form - Bovy (IAS)
         """
+        import isodist
         if lage < numpy.log10(0.8):
             return numpy.nan
         z= isodist.FEH2Z(feh,zsolar=zsolar())
@@ -247,7 +241,12 @@ class rcpop:
         HISTORY:
            2014-02-28 - Written in this form - Bovy (IAS)
         """
-        if not _BOVY_PLOT_LOADED:
+        import isodist
+        from matplotlib import pyplot
+        from matplotlib.ticker import NullFormatter
+        try:
+            from galpy.util import bovy_plot
+        except ImportError:
             raise ImportError("galpy.util.bovy_plot could not be imported")
         fehs= numpy.linspace(-1.,0.5,101)
         lages= self._finelages
@@ -321,6 +320,7 @@ class rcpop:
         HISTORY:
            2014-02-28 - Written in this form - Bovy (IAS)
         """
+        import isodist
         if lage < numpy.log10(0.8):
             return numpy.nan
         z= isodist.FEH2Z(feh,zsolar=zsolar())
@@ -341,7 +341,12 @@ class rcpop:
         HISTORY:
            2014-02-28 - Written in this form - Bovy (IAS)
         """
-        if not _BOVY_PLOT_LOADED:
+        import isodist
+        from matplotlib import pyplot
+        from matplotlib.ticker import NullFormatter
+        try:
+            from galpy.util import bovy_plot
+        except ImportError:
             raise ImportError("galpy.util.bovy_plot could not be imported")
         fehs= numpy.linspace(-1.,0.5,101)
         lages= self._coarselages
@@ -416,6 +421,7 @@ class rcpop:
         HISTORY:
            2014-02-27 - Written in this form - Bovy (IAS)
         """
+        import isodist
         if isinstance(fehdist,(int,float,numpy.float32,numpy.float64)):
             pz= numpy.zeros(len(self._zs))
             pz[numpy.argmin(numpy.fabs(self._zs-isodist.FEH2Z(fehdist,zsolar=zsolar())))]= 1.
@@ -453,7 +459,9 @@ class rcpop:
         HISTORY:
            2014-02-27 - Written in this form - Bovy (IAS)
         """
-        if not _BOVY_PLOT_LOADED:
+        try:
+            from galpy.util import bovy_plot
+        except ImportError:
             raise ImportError("galpy.util.bovy_plot could not be imported")
         page= self.calc_age_pdf(fehdist)
         plages= numpy.linspace(0.8,10.,1001)
@@ -544,7 +552,9 @@ class rcmodel(isomodel):
         HISTORY:
            2012-02-17 - Written - Bovy (IAS)
         """
-        if not _BOVY_PLOT_LOADED:
+        try:
+            from galpy.util import bovy_plot
+        except ImportError:
             raise ImportError("galpy.util.bovy_plot could not be imported")
         out= isomodel.plot(self,log=log,conditional=conditional,nbins=nbins,
                            overlay_mode=overlay_mode)
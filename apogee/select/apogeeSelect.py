@@ -3,9 +3,6 @@ import copy
 import tqdm
 import numpy
 from scipy import stats, special
-from galpy.util import bovy_plot, bovy_coords
-import matplotlib
-from matplotlib import cm, pyplot
 import warnings
 warnings.filterwarnings('ignore','.*All-NaN.*',) #turn-off All-NaN warnings
 warnings.filterwarnings('ignore','.*invalid value encountered in .*',) #turn-off NaN warnings
@@ -450,6 +447,8 @@ class apogeeSelect:
         HISTORY:
            2011-11-11 - Written - Bovy (IAS)
         """
+        from galpy.util import bovy_plot, bovy_coords
+        from matplotlib import cm, pyplot
         nHs= 201
         Xs= numpy.zeros((len(self._locations),nHs))+numpy.nan
         Ys= numpy.zeros((len(self._locations),nHs))+numpy.nan
@@ -622,6 +621,7 @@ class apogeeSelect:
         HISTORY:
            2011-11-11 - Written - Bovy (IAS)
         """
+        from galpy.util import bovy_plot
         #Plot progress
         plotSF= numpy.zeros(len(self._locations))
         if type.lower() == 'selfunc':
@@ -703,6 +703,9 @@ class apogeeSelect:
         HISTORY:
            2013-11-11 - Written - Bovy (IAS)
         """
+        from galpy.util import bovy_plot
+        import matplotlib
+        from matplotlib import pyplot
         if isinstance(location,str) and location.lower() == 'all':
             location= self._locations
         elif isinstance(location,str) and location.lower() == 'short':
@@ -866,6 +869,8 @@ class apogeeSelect:
         HISTORY:
            2011-11-05 - Written - Bovy (IAS)
         """
+        from galpy.util import bovy_plot, bovy_coords
+        from matplotlib import cm
         #Plot progress
         progress= numpy.zeros(len(self._locations))
         for ii in range(len(self._locations)):
@@ -982,6 +987,7 @@ class apogeeSelect:
         HISTORY:
            2013-11-11 - Written - Bovy (IAS)
         """
+        from galpy.util import bovy_plot
         photr,specr,fn1,fn2= self._location_Hcdfs(location,cohort)
         if numpy.all(numpy.isnan(photr)):
             print "Location %i has no spectroscopic data in the statistical sample ..." % location
@@ -1432,6 +1438,7 @@ class apogeeSelect:
         apogeeField= apogeeField[numpy.argsort(reorderapField)]
         apogeeField= apogeeField.view(numpy.recarray)
         #apogeeField is now ordered the same as locations
+        from galpy.util import bovy_coords
         fieldlb= bovy_coords.radec_to_lb(apogeeField['RA'],apogeeField['DEC'],
                                          degree=True)
         apogeeField= _append_field_recarray(apogeeField,'GLON',fieldlb[:,0])
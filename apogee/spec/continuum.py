@@ -1,11 +1,12 @@
 ###############################################################################
 # apogee.spec.continuum: tools for dealing with the continuum
 ###############################################################################
-import copy
 import numpy
 from apogee.spec import cannon
 from apogee.tools import toAspcapGrid, toApStarGrid
-def fit(spec,specerr,type='aspcap',
+import apogee.spec.wavegrid as apwavegrid
+from apogee.spec.cube import SpecCube
+def fit(spec,specerr=None,type='aspcap',
         deg=None,
         niter=10,usigma=3.,lsigma=0.1,
         cont_pixels=None):
@@ -15,8 +16,8 @@ def fit(spec,specerr,type='aspcap',
     PURPOSE:
        fit the continuum (a) with a sigma-clipping rejection method (~ASPCAP) or (b) with a Chebyshev polynomial based on a set of continuum pixels
     INPUT:
-       spec - spectra to fit (nspec,nlambda)
-       specerr - errors on the spectra (nspec,nlambda); assume no covariances
+       spec - spectra to fit (nspec,nlambda) or a spectral cube (apogee.spec.cube.SpecCube)
+       specerr - errors on the spectra (nspec,nlambda); assume no covariances (not needed for a spectral cube)
        type= ('aspcap') type of continuum fitting to do: 'ASPCAP' for the sigma-clipping rejection that ASPCAP uses and 'Cannon' for fitting a Chebyshev polynomial to continuum pixels
        ASPCAP keywords:
           deg= (4) degree of the polynomial
@@ -24,79 +25,54 @@ def fit(spec,specerr,type='aspcap',
           usigma, lsigma= (3., 0.1) upper and lower sigmas for sigma clipping
        Cannon keywords:
           deg= (2) degree of the polynomial
-          cont_pixels= (None; loads default) boolean index in the ASPCAP wavelength grid with True for continuum pixels
+          cont_pixels= (None; loads default) boolean index in the ASPCAP wavelength grid of any data release (or in the apStar grid) with True for continuum pixels; mapped onto the grid of spec
     OUTPUT:
-       continuum (nspec,nlambda)
+       continuum (nspec,nlambda); NaN for spectra whose fit cannot be solved (e.g., all errors infinite)
     HISTORY:
        2015-03-01 - Cannon-style fit written - Bovy (IAS)
        2015-03-01 - ASPCAP-style fit written - Bovy (IAS)
+       2026-10-18 - Fit all spectra at once with batched normal equations; use the detector ranges of the input's ASPCAP grid - Bovy (IAS)
+       2026-10-18 - Fit in float64; map cont_pixels onto the grid of the input; NaN for spectra whose fit cannot be solved - Bovy (IAS)
     """
     # Parse input
+    if isinstance(spec,SpecCube):
+        specerr= spec.specerr
+        spec= spec.spec
+    # Fit in float64, also for float32 input (e.g., spectral cubes)
     if len(spec.shape) == 1:
-        tspec= copy.copy(numpy.reshape(spec,(1,len(spec))))
-        tspecerr= numpy.reshape(specerr,(1,len(specerr)))
+        tspec= numpy.array(numpy.reshape(spec,(1,len(spec))),dtype='float64')
+        tspecerr= numpy.asarray(numpy.reshape(specerr,(1,len(specerr))),
+                                dtype='float64')
     else:
-        tspec= copy.copy(spec)
-        tspecerr= specerr
+        tspec= numpy.array(spec,dtype='float64')
+        tspecerr= numpy.asarray(specerr,dtype='float64')
     if tspec.shape[1] == 8575:
         tspec= toAspcapGrid(tspec)
         tspecerr= toAspcapGrid(tspecerr)
     if deg is None and type.lower() == 'aspcap': deg= 4
     elif deg is None: deg= 2
-    # Fit each detector separately
-    cont= numpy.empty_like(tspec)
-    # Rescale wavelengths
-    bluewav= numpy.arange(2920)/2919.*2.-1.
-    greenwav= numpy.arange(2400)/2399.*2.-1.
-    redwav= numpy.arange(1894)/1893.*2.-1.
-    # Split the continuum pixels
+    grid= apwavegrid.aspcapWavegrid(npix=tspec.shape[1])
     if type.lower() == 'cannon':
-        if cont_pixels is None:
-            cont_pixels= pixels_cannon()
-        blue_pixels= cont_pixels[:2920]
-        green_pixels= cont_pixels[2920:5320]
-        red_pixels= cont_pixels[5320:]
-    # Loop through the data
-    for ii in range(tspec.shape[0]):
-        # Blue
-        if type.lower() == 'aspcap':
-            cont[ii,:2920]= _fit_aspcap(bluewav,
-                                        tspec[ii,:2920],
-                                        tspecerr[ii,:2920],
-                                        deg,
-                                        niter,usigma,lsigma)
-        else:
-            cont[ii,:2920]= _fit_cannonpixels(bluewav,
-                                              tspec[ii,:2920],
-                                              tspecerr[ii,:2920],
-                                              deg,
-                                              blue_pixels)
-        # Green
-        if type.lower() == 'aspcap':
-            cont[ii,2920:5320]= _fit_aspcap(greenwav,
-                                            tspec[ii,2920:5320],
-                                            tspecerr[ii,2920:5320],
-                                            deg,
-                                            niter,usigma,lsigma)
-        else:
-            cont[ii,2920:5320]= _fit_cannonpixels(greenwav,
-                                                  tspec[ii,2920:5320],
-                                                  tspecerr[ii,2920:5320],
-                                                  deg,
-                                                  green_pixels)
-        # Red
+        if cont_pixels is None: cont_pixels= pixels_cannon()
+        cont_pixels= _cont_pixels_on_grid(cont_pixels,grid)
+    # Fit each detector separately, all spectra at once
+    cont= numpy.empty_like(tspec)
+    for detSlice in grid.aspcapSlices:
+        # Rescale wavelengths
+        npix= detSlice.stop-detSlice.start
+        wav= numpy.arange(npix)/(npix-1.)*2.-1.
         if type.lower() == 'aspcap':
-            cont[ii,5320:]= _fit_aspcap(redwav,
-                                        tspec[ii,5320:],
-                                        tspecerr[ii,5320:],
-                                        deg,
-                                        niter,usigma,lsigma)
+            cont[:,detSlice]= _fit_aspcap(wav,
+                                          tspec[:,detSlice],
+                                          tspecerr[:,detSlice],
+                                          deg,
+                                          niter,usigma,lsigma)
         else:
-            cont[ii,5320:]= _fit_cannonpixels(redwav,
-                                              tspec[ii,5320:],
-                                              tspecerr[ii,5320:],
-                                              deg,
-                                              red_pixels)
+            cont[:,detSlice]= _fit_cannonpixels(wav,
+                                                tspec[:,detSlice],
+                                                tspecerr[:,detSlice],
+                                                deg,
+                                                cont_pixels[detSlice])
     if (len(spec.shape) == 1 and spec.shape[0] == 8575) \
             or (len(spec.shape) == 2 and spec.shape[1] == 8575):
         cont= toApStarGrid(cont)
@@ -104,34 +80,65 @@ def fit(spec,specerr,type='aspcap',
     return cont
 
 def _fit_aspcap(wav,spec,specerr,deg,niter,usigma,lsigma):
-    """Fit the continuum with an iterative upper/lower rejection"""
-    # Initial fit
-    chpoly= numpy.polynomial.Chebyshev.fit(wav,spec,deg,w=1./specerr)
-    tcont= chpoly(wav)
-    tres= spec-tcont
-    sig= numpy.std(tres)
-    mask= (tres < usigma*sig)*(tres > -lsigma*sig)
-    spec[True-mask]= chpoly(wav[True-mask])
-    for ii in range(niter):
-        chpoly= numpy.polynomial.Chebyshev.fit(wav,
-                                               spec,
-                                               deg,
-                                               w=1./specerr)
-        tcont= chpoly(wav)
+    """Fit the continuum of spectra (nspec,nwav) with an iterative upper/lower rejection; spec is overwritten"""
+    vander= numpy.polynomial.chebyshev.chebvander(wav,deg)
+    ivar= 1./specerr**2.
+    # The weights do not change between iterations, so neither do the
+    # normal matrices; only the rejected pixels of spec do
+    normal= _chebyshev_normal(vander,ivar)
+    # Initial fit + niter iterations
+    for ii in range(niter+1):
+        tcont= numpy.dot(_chebyshev_coeffs(vander,normal,ivar,spec),
+                         vander.T)
         tres= spec-tcont
-        sig= numpy.std(tres)
+        sig= numpy.std(tres,axis=1)[:,numpy.newaxis]
         mask= (tres < usigma*sig)*(tres > -lsigma*sig)
-        spec[True-mask]= chpoly(wav[True-mask])
-    return chpoly(wav)
+        spec[~mask]= tcont[~mask]
+    return tcont
 
 def _fit_cannonpixels(wav,spec,specerr,deg,cont_pixels):
-    """Fit the continuum to a set of continuum pixels"""
-    chpoly= numpy.polynomial.Chebyshev.fit(wav[cont_pixels],
-                                           spec[cont_pixels],
-                                           deg,
-                                           w=1./specerr[cont_pixels])
-    return chpoly(wav)
+    """Fit the continuum of spectra (nspec,nwav) to a set of continuum pixels"""
+    vander= numpy.polynomial.chebyshev.chebvander(wav,deg)
+    ivar= 1./specerr[:,cont_pixels]**2.
+    coeffs= _chebyshev_coeffs(vander[cont_pixels],
+                              _chebyshev_normal(vander[cont_pixels],ivar),
+                              ivar,spec[:,cont_pixels])
+    return numpy.dot(coeffs,vander.T)
+
+def _chebyshev_normal(vander,ivar):
+    """Normal matrices (nspec,deg+1,deg+1) of weighted least-squares fits with the Chebyshev pseudo-Vandermonde matrix vander (nwav,deg+1)"""
+    ncoeff= vander.shape[1]
+    outer= (vander[:,:,numpy.newaxis]*vander[:,numpy.newaxis,:])\
+        .reshape(vander.shape[0],ncoeff**2)
+    return numpy.dot(ivar,outer).reshape(ivar.shape[0],ncoeff,ncoeff)
+
+def _chebyshev_coeffs(vander,normal,ivar,spec):
+    """Coefficients (nspec,deg+1) of the weighted least-squares Chebyshev fits to spec (nspec,nwav); NaN for spectra with a singular normal matrix"""
+    rhs= numpy.dot(ivar*spec,vander)
+    try:
+        return numpy.linalg.solve(normal,rhs[:,:,numpy.newaxis])[:,:,0]
+    except numpy.linalg.LinAlgError:
+        # Solve spectrum by spectrum, such that one singular fit does not
+        # abort the whole batch
+        out= numpy.empty_like(rhs)
+        for ii in range(len(rhs)):
+            try:
+                out[ii]= numpy.linalg.solve(normal[ii],rhs[ii])
+            except numpy.linalg.LinAlgError:
+                out[ii]= numpy.nan
+        return out
 
+def _cont_pixels_on_grid(cont_pixels,grid):
+    """Map a boolean continuum-pixel index on an ASPCAP or the apStar grid onto the ASPCAP grid grid"""
+    cont_pixels= numpy.asarray(cont_pixels,dtype='bool')
+    if len(cont_pixels) == grid.npix: return cont_pixels
+    if len(cont_pixels) != apwavegrid._NLAMBDA:
+        try:
+            contGrid= apwavegrid.aspcapWavegrid(npix=len(cont_pixels))
+        except ValueError:
+            raise ValueError("cont_pixels with %i pixels is not on an ASPCAP or the apStar wavelength grid" % len(cont_pixels))
+        cont_pixels= contGrid.toApStar(cont_pixels,fill=False)
+    return grid.toAspcap(cont_pixels)
 
 def pixels_cannon(*args,**kwargs):
     """
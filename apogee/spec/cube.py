@@ -0,0 +1,199 @@
+###############################################################################
+# apogee.spec.cube: memory-mapped cubes of the spectra of many stars
+###############################################################################
+import os, os.path
+import sys
+import shutil
+import json
+from multiprocessing.pool import ThreadPool
+import numpy
+from numpy.lib.format import open_memmap
+from apogee.tools import path
+import apogee.spec.wavegrid as apwavegrid
+from apogee.tools.download import _loc_id
+from apogee.tools.read import _spec_exts
+_ERASESTR= "                                                                                "
+class SpecCube(object):
+    """SpecCube: spectra, errors, and masks of many stars stored as contiguous, memory-mapped (nspec,nwave) arrays"""
+    def __init__(self,filename):
+        """
+        NAME:
+           __init__
+        PURPOSE:
+           load a spectral cube created with build
+        INPUT:
+           filename - directory that holds the cube
+        OUTPUT:
+           instance; attributes spec, specerr, and mask (None for aspcapStar cubes) are read-only (nspec,nwave) memory-mapped arrays and index is an array with the LOCATION_ID (or FIELD), APOGEE_ID, and FOUND (False if the star's file could not be read; spectra and errors are NaN) of each spectrum; ftype, dr, and aspcapWavegrid are the inputs to build that the cube was built with (None for cubes built without them)
+        HISTORY:
+           2026-10-18 - Written - Bovy (IAS)
+           2026-10-18 - Load the file type, data release, and wavelength grid of the cube - Bovy (IAS)
+        """
+        self._filename= filename
+        self.spec= numpy.load(os.path.join(filename,'spec.npy'),
+                              mmap_mode='r')
+        self.specerr= numpy.load(os.path.join(filename,'specerr.npy'),
+                                 mmap_mode='r')
+        if os.path.exists(os.path.join(filename,'mask.npy')):
+            self.mask= numpy.load(os.path.join(filename,'mask.npy'),
+                                  mmap_mode='r')
+        else:
+            self.mask= None
+        self.index= numpy.load(os.path.join(filename,'index.npy'))
+        metaFilename= os.path.join(filename,'meta.json')
+        if os.path.exists(metaFilename):
+            with open(metaFilename,'r') as metaFile:
+                meta= json.load(metaFile)
+        else:
+            meta= {}
+        self.ftype= meta.get('ftype')
+        self.dr= meta.get('dr')
+        self.aspcapWavegrid= meta.get('aspcapWavegrid')
+        return None
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self,key):
+        """
+        NAME:
+           __getitem__
+        PURPOSE:
+           return a spectral cube with a subset of the stars
+        INPUT:
+           key - index or slice into the stars (slices do not copy the data)
+        OUTPUT:
+           SpecCube instance
+        HISTORY:
+           2026-10-18 - Written - Bovy (IAS)
+        """
+        if isinstance(key,(int,numpy.integer)): key= slice(key,key+1)
+        out= SpecCube.__new__(SpecCube)
+        out._filename= self._filename
+        out.ftype= self.ftype
+        out.dr= self.dr
+        out.aspcapWavegrid= self.aspcapWavegrid
+        out.spec= self.spec[key]
+        out.specerr= self.specerr[key]
+        if self.mask is None: out.mask= None
+        else: out.mask= self.mask[key]
+        out.index= self.index[key]
+        return out
+
+    def indx(self,loc_id,apogee_id):
+        """
+        NAME:
+           indx
+        PURPOSE:
+           return the index of a star in the cube
+        INPUT:
+           loc_id - location ID (field for 1m targets)
+           apogee_id - APOGEE ID of the star
+        OUTPUT:
+           index
+        HISTORY:
+           2026-10-18 - Written - Bovy (IAS)
+        """
+        out= numpy.flatnonzero((self.index['LOCATION_ID'] \
+                                    == str(loc_id).strip())
+                               *(self.index['APOGEE_ID'] \
+                                     == apogee_id.strip()))
+        if len(out) == 0:
+            raise KeyError('Star %s in %s not found in the cube' \
+                               % (apogee_id.strip(),str(loc_id).strip()))
+        return out[0]
+
+def build(filename,loc_ids,apogee_ids,ftype='aspcapStar',aspcapWavegrid=True,
+          dr=None,nthreads=1):
+    """
+    NAME:
+       build
+    PURPOSE:
+       read the spectra, errors, and masks of many stars into a spectral cube: contiguous float32 arrays on disk that can be memory-mapped
+    INPUT:
+       filename - directory to store the cube in; if a cube with the same stars, ftype, aspcapWavegrid, and dr already exists there, it is re-used (otherwise it is rebuilt)
+       loc_ids - location IDs (fields for 1m targets)
+       apogee_ids - APOGEE IDs of the stars
+       ftype= ('aspcapStar') read aspcapStar (spectra and errors) or apStar files (spectra, errors, and masks; the combined spectrum is used)
+       aspcapWavegrid= (True) if True, store the spectra on the ASPCAP wavelength grid of the data release (nspec,7214) or (nspec,7514), otherwise on the apStar grid (nspec,8575; aspcapStar spectra are zero outside of the ASPCAP grid)
+       dr= read the files corresponding to this data release (general default)
+       nthreads= (1) number of files to read (and download if necessary) in parallel
+    OUTPUT:
+       SpecCube instance
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+       2026-10-18 - Use the ASPCAP grid of the data release; convert aspcapStar spectra explicitly to the apStar grid - Bovy (IAS)
+       2026-10-18 - Only re-use an existing cube built with the same ftype, aspcapWavegrid, and dr - Bovy (IAS)
+    """
+    if dr is None: dr= path._default_dr()
+    grid= apwavegrid.aspcapWavegrid(dr=dr)
+    index= numpy.empty(len(loc_ids),dtype=[('LOCATION_ID','S30'),
+                                           ('APOGEE_ID','S30'),
+                                           ('FOUND',bool)])
+    index['LOCATION_ID']= [str(loc_id).strip() for loc_id in loc_ids]
+    index['APOGEE_ID']= [apogee_id.strip() for apogee_id in apogee_ids]
+    index['FOUND']= False
+    ftype= ftype.lower()
+    aspcapWavegrid= bool(aspcapWavegrid)
+    nwave= grid.npix if aspcapWavegrid else apwavegrid._NLAMBDA
+    if os.path.exists(os.path.join(filename,'index.npy')):
+        out= SpecCube(filename)
+        if len(out.index) == len(index) \
+                and numpy.all(out.index['LOCATION_ID'] == index['LOCATION_ID']) \
+                and numpy.all(out.index['APOGEE_ID'] == index['APOGEE_ID']) \
+                and out.ftype == ftype \
+                and out.aspcapWavegrid == aspcapWavegrid \
+                and out.dr == dr \
+                and out.spec.shape[1] == nwave:
+            return out
+    if ftype == 'aspcapstar': exts= [1,2]
+    else: exts= [1,2,3]
+    # Build in a temporary directory, such that a cube is never left in an
+    # inconsistent state
+    tmpFilename= filename.rstrip(os.sep)+'.tmp'
+    if os.path.exists(tmpFilename): shutil.rmtree(tmpFilename)
+    os.makedirs(tmpFilename)
+    out= [open_memmap(os.path.join(tmpFilename,'%s.npy' % name),mode='w+',
+                      dtype=dtype,shape=(len(index),nwave))
+          for name,dtype in zip(['spec','specerr','mask'][:len(exts)],
+                                ['float32','float32','int32'])]
+    def read_one(ii):
+        try:
+            data= _spec_exts(_loc_id(loc_ids[ii]),apogee_ids[ii].strip(),
+                             exts,dr=dr,ftype=ftype)
+        except (IOError,OSError):
+            return (ii,None)
+        # Combined spectrum for apStar files with multiple visits
+        data= [d[0] if len(d.shape) == 2 else d for d in data]
+        if aspcapWavegrid: data= [grid.toAspcap(d) for d in data]
+        else: data= [grid.toApStar(d) for d in data]
+        return (ii,data)
+    pool= ThreadPool(nthreads)
+    try:
+        for jj,(ii,data) in enumerate(pool.imap_unordered(read_one,
+                                                          range(len(index)))):
+            if data is None:
+                out[0][ii]= numpy.nan
+                out[1][ii]= numpy.nan
+                if len(out) > 2: out[2][ii]= 0
+            else:
+                for arr,d in zip(out,data): arr[ii]= d
+                index['FOUND'][ii]= True
+            if (jj+1) % 100 == 0:
+                print_str= "Building spectral cube: %i / %i ..." \
+                    % (jj+1,len(index))
+                sys.stdout.write('\r'+print_str+'\r')
+                sys.stdout.flush()
+    finally:
+        pool.terminate()
+        sys.stdout.write('\r'+_ERASESTR+'\r')
+        sys.stdout.flush()
+    for arr in out: arr.flush()
+    del out
+    numpy.save(os.path.join(tmpFilename,'index.npy'),index)
+    with open(os.path.join(tmpFilename,'meta.json'),'w') as metaFile:
+        json.dump({'ftype':ftype,'dr':dr,'aspcapWavegrid':aspcapWavegrid},
+                  metaFile)
+    if os.path.exists(filename): shutil.rmtree(filename)
+    os.rename(tmpFilename,filename)
+    return SpecCube(filename)
@@ -1,26 +1,41 @@
 ###############################################################################
 # apogee.spec.lsf: Utilities to work with APOGEE LSFs
 ###############################################################################
+import sys
 import os, os.path
+import hashlib
 from functools import wraps
+from collections import OrderedDict
 import warnings
+import threading
 import math
+from multiprocessing.pool import ThreadPool
 import numpy
-from scipy import special, interpolate, sparse, ndimage
-import scipy.sparse.linalg
+from scipy import special, interpolate, sparse, ndimage, linalg
+from numpy.lib.format import open_memmap
 import fitsio
 import apogee.tools.read as apread
 import apogee.tools.path as appath
+import apogee.tools.download as download
 from apogee.tools.download import _download_file
-from apogee.spec.plot import apStarWavegrid
+from apogee.spec.wavegrid import apStarWavegrid
 _SQRTTWO= numpy.sqrt(2.)
-# Load wavelength solutions
-_WAVEPIX_A= apread.apWave('a',ext=2)
-_WAVEPIX_B= apread.apWave('b',ext=2)
-_WAVEPIX_C= apread.apWave('c',ext=2)
+# Wavelength solutions, loaded when first needed; keys are (chip,dr)
+_WAVEPIX= {}
+# Interpolants of the wavelength solutions of the most recently used fibers;
+# keys are (chip,fiber,dr,inverse); the lock guards the LRU bookkeeping when
+# the LSF is evaluated in multiple threads
+_MAX_WAVESOLUTIONS= 32
+_WAVESOLUTIONS= OrderedDict()
+_WAVESOLUTIONS_LOCK= threading.Lock()
+# HermiteE-to-polynomial conversion matrices; keys are the number of terms
+_HERME2POLY= {}
+# Memory-mapped LSF banks; keys are the paths of the banks
+_BANKS= {}
+_ERASESTR= "                                                                                "
 def convolve(wav,spec,
              lsf=None,xlsf=None,dxlsf=None,fiber='combo',
-             vmacro=6.):
+             vmacro=6.,cache=False,bank=False):
     """
     NAME:
        convolve
@@ -33,24 +48,17 @@ def convolve(wav,spec,
        Either:
           xlsf= (None) 1/integer equally-spaced pixel offsets at which the lsf=lsf input is calculated
           dxlsf= (None) spacing of pixel offsets
-       fiber= if lsf is None, the LSF is calculated for this fiber
+       fiber= if lsf is None, the LSF is calculated for this fiber (or list of fibers)
        vmacro= (6.) Gaussian macroturbulence smoothing to apply as well (FWHM or a [sparse] matrix like lsf on the same x grid; can be computed with apogee.modelspec.vmacro)
+       cache= (False) if True and lsf is None, cache the LSF calculated for fiber on disk (see apogee.spec.lsf.eval)
+       bank= (False) if True and lsf is None, look up the LSF of fiber in the LSF bank built with apogee.spec.lsf.build_bank instead of calculating it (float32 precision; each fiber of a list is evaluated on its own wavelength solution, see apogee.spec.lsf.eval_bank)
     OUTPUT:
        spectrum on apStar wavelength grid
     HISTORY:
        2015-03-14 - Written - Bovy (IAS)
     """
     # Parse LSF input
-    if lsf is None:
-        xlsf= numpy.linspace(-7.,7.,43)
-        lsf= eval(xlsf,fiber=fiber)
-    if not isinstance(lsf,sparse.dia_matrix):
-        lsf= sparsify(lsf)
-    if dxlsf is None:
-        dx= xlsf[1]-xlsf[0]
-    else:
-        dx= dxlsf
-    hires= int(round(1./dx))
+    lsf, hires= _parse_lsf(lsf,xlsf,dxlsf,fiber,cache=cache,bank=bank)
     l10wav= numpy.log10(apStarWavegrid())
     dowav= l10wav[1]-l10wav[0]
     tmpwav= 10.**numpy.arange(l10wav[0],l10wav[-1]+dowav/hires,dowav/hires)
@@ -61,14 +69,7 @@ def convolve(wav,spec,
             /2./numpy.sqrt(2.*numpy.log(2.))
     # Interpolate the input spectrum, starting from a polynomial baseline
     if len(spec.shape) == 1: spec= numpy.reshape(spec,(1,len(spec)))
-    nspec= spec.shape[0]
-    tmp= numpy.empty((nspec,len(tmpwav)))
-    for ii in range(nspec):
-        baseline= numpy.polynomial.Polynomial.fit(wav,spec[ii],4)
-        ip= interpolate.InterpolatedUnivariateSpline(wav,
-                                                     spec[ii]/baseline(wav),
-                                                     k=3)
-        tmp[ii]= baseline(tmpwav)*ip(tmpwav)
+    tmp= resample(wav,spec,tmpwav)
     # Add macroturbulence
     if not vmacro is None and isinstance(vmacro,float):
         tmp= ndimage.gaussian_filter1d(tmp,sigvm,mode='constant',axis=1)
@@ -83,6 +84,111 @@ def convolve(wav,spec,
         tmp= sparse.csr_matrix(tmp)
     return lsf.dot(tmp.T).T.toarray()[:,::hires]
 
+def convolve_operator(wav,
+                      lsf=None,xlsf=None,dxlsf=None,fiber='combo',
+                      vmacro=6.,cache=False,bank=False):
+    """
+    NAME:
+       convolve_operator
+    PURPOSE:
+       compute a sparse matrix that resamples spectra on a fixed wavelength grid to the hi-res apStar grid, convolves them with macroturbulence and the APOGEE LSF, and resamples them to the apStar wavelength grid, i.e., a re-usable version of apogee.spec.lsf.convolve
+    INPUT:
+       wav - wavelength array (linear in wavelength in \AA)
+       lsf= (None) pre-calculated LSF array from apogee.spec.lsf.eval
+       Either:
+          xlsf= (None) 1/integer equally-spaced pixel offsets at which the lsf=lsf input is calculated
+          dxlsf= (None) spacing of pixel offsets
+       fiber= if lsf is None, the LSF is calculated for this fiber (like for apogee.spec.lsf.convolve)
+       vmacro= (6.) Gaussian macroturbulence smoothing to apply as well (FWHM or a [sparse] matrix like lsf on the same x grid; can be computed with apogee.modelspec.vmacro)
+       cache= (False) if True and lsf is None, cache the LSF calculated for fiber on disk (see apogee.spec.lsf.eval)
+       bank= (False) if True and lsf is None, look up the LSF of fiber in the LSF bank (like for apogee.spec.lsf.convolve)
+    OUTPUT:
+       sparse (CSR) matrix [8575,len(wav)]; operator.dot(spec.T).T convolves spectra [nspec,len(wav)] like apogee.spec.lsf.convolve (except that the resampling uses local cubic interpolation rather than a spline fit to each spectrum)
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    lsf, hires= _parse_lsf(lsf,xlsf,dxlsf,fiber,cache=cache,bank=bank)
+    l10wav= numpy.log10(apStarWavegrid())
+    dowav= l10wav[1]-l10wav[0]
+    tmpwav= 10.**numpy.arange(l10wav[0],l10wav[-1]+dowav/hires,dowav/hires)
+    # Work from the output backwards, such that all products stay sparse
+    out= sparse.csr_matrix(lsf)[::hires]
+    if not vmacro is None and isinstance(vmacro,float):
+        sigvm= vmacro/3./10.**5./numpy.log(10.)*hires/dowav\
+            /2./numpy.sqrt(2.*numpy.log(2.))
+        out= out.dot(_gaussian_operator(len(tmpwav),sigvm))
+    elif not vmacro is None:
+        if isinstance(vmacro,numpy.ndarray):
+            vmacro= sparsify(vmacro)
+        out= out.dot(vmacro)
+    return out.dot(_interp_operator(wav,tmpwav)).tocsr()
+
+def _parse_lsf(lsf,xlsf,dxlsf,fiber,cache=False,bank=False):
+    """Return the LSF as a sparse matrix (calculating it for fiber if lsf is None, cached on disk if cache, or looked up in the LSF bank if bank) and the number of LSF centers per apStar pixel"""
+    if lsf is None:
+        xlsf= numpy.linspace(-7.,7.,43)
+        if bank:
+            lsf= eval_bank(fiber=fiber,x=xlsf)
+        else:
+            lsf= eval(xlsf,fiber=fiber,sparse=True,cache=cache)
+    if not isinstance(lsf,sparse.dia_matrix):
+        lsf= sparsify(lsf)
+    if dxlsf is None:
+        dx= xlsf[1]-xlsf[0]
+    else:
+        dx= dxlsf
+    return (lsf,int(round(1./dx)))
+
+def _interp_operator(wav,newwav):
+    """Sparse matrix that interpolates from wav to newwav using local, 4-point cubic (Lagrange) interpolation"""
+    # First point of the 4-point stencil around each new wavelength
+    start= numpy.clip(numpy.searchsorted(wav,newwav)-2,0,len(wav)-4)
+    stencil= start[:,None]+numpy.arange(4)
+    xs= wav[stencil]
+    weights= numpy.ones((len(newwav),4))
+    for ii in range(4):
+        for jj in range(4):
+            if ii == jj: continue
+            weights[:,ii]*= (newwav-xs[:,jj])/(xs[:,ii]-xs[:,jj])
+    rows= numpy.repeat(numpy.arange(len(newwav)),4)
+    return sparse.csr_matrix((weights.flatten(),(rows,stencil.flatten())),
+                             shape=(len(newwav),len(wav)))
+
+def _gaussian_operator(n,sigma,truncate=4.):
+    """Sparse matrix that applies a Gaussian filter with standard deviation sigma (in pixels), like scipy.ndimage.gaussian_filter1d with mode='constant'"""
+    radius= int(truncate*sigma+0.5)
+    offsets= numpy.arange(-radius,radius+1)
+    kernel= numpy.exp(-0.5*offsets**2./sigma**2.)
+    kernel/= numpy.sum(kernel)
+    return sparse.diags([kernel[ii]*numpy.ones(n-abs(offset))
+                         for ii,offset in enumerate(offsets)],
+                        offsets,shape=(n,n),format='csr')
+
+def resample(wav,spec,newwav,deg=4):
+    """
+    NAME:
+       resample
+    PURPOSE:
+       resample spectra that share a wavelength grid to a new wavelength grid, by interpolating each spectrum divided by a polynomial baseline with a cubic spline
+    INPUT:
+       wav - wavelength array (increasing)
+       spec - spectrum on wav wavelength grid [nspec,nwave] or [nwave]
+       newwav - new wavelength array
+       deg= (4) degree of the polynomial baseline
+    OUTPUT:
+       spectrum on newwav wavelength grid [nspec,len(newwav)] or [len(newwav)]
+    HISTORY:
+       2026-10-18 - Written based on the per-spectrum version in apogee.spec.lsf.convolve - Bovy (IAS)
+    """
+    # The least-squares fit of the baseline and the spline interpolation
+    # are solved once for all spectra, which share the same design matrices
+    off, scl= numpy.polynomial.polyutils.mapparms([wav[0],wav[-1]],[-1.,1.])
+    coef= numpy.polynomial.polynomial.polyfit(off+scl*wav,spec.T,deg)
+    baseline= numpy.polynomial.polynomial.polyval(off+scl*wav,coef)
+    ip= interpolate.make_interp_spline(wav,spec/baseline,k=3,axis=-1)
+    return numpy.polynomial.polynomial.polyval(off+scl*newwav,coef)\
+        *ip(newwav)
+
 def sparsify(lsf):
     """
     NAME:
@@ -135,7 +241,7 @@ def dummy(dx=1./3.,sparse=False):
     if sparse: out= sparsify(out)
     return out
 
-def eval(x,fiber='combo',sparse=False):
+def eval(x,fiber='combo',sparse=False,dr=None,cache=False):
     """
     NAME:
        eval
@@ -143,50 +249,183 @@ def eval(x,fiber='combo',sparse=False):
        evaluate the LSF for a given fiber
     INPUT:
        x - Array of X values for which to compute the LSF, in pixel offset relative to pixel centers; the LSF is calculated at the x offsets for each pixel center; x need to be 1/integer equally-spaced pixel offsets
-       fiber= ('combo') fiber number or 'combo' for an average LSF (uses the same one-based indexing as the APOGEE fibers [i.e., fibers range from 1 to 300])
+       fiber= ('combo') fiber number or list of fiber numbers or 'combo' for an average LSF (uses the same one-based indexing as the APOGEE fibers [i.e., fibers range from 1 to 300])
        sparse= (False) if True, return a sparse representation that can be passed to apogee.spec.lsf.convolve for easy convolution
+       dr= (None) use the LSF and wavelength solution of this data release (general default)
+       cache= (False) if True, store the LSF on disk in the directory of the apLSF files and re-use it on subsequent calls with the same x, fiber, and dr
     OUTPUT:
        LSF(x|pixel center);
        pixel centers are apStarWavegrid if dx=1, and denser 1/integer versions if dx=1/integer
     HISTORY:
        2015-03-12 - Written based on Jon H's code (based on David N's code) - Bovy (IAS)
+       2026-10-18 - Added on-disk cache and lists of fibers - Bovy (IAS)
     """
-    # Parse fiber input
+    fiber= _parse_fiber(fiber)
+    if cache:
+        if dr is None: dr= appath._default_dr()
+        out= _eval_cached(x,fiber,dr)
+    else:
+        out= _eval(x,fiber,dr)
+    if sparse: out= sparsify(out)
+    return out
+
+def _parse_fiber(fiber):
+    """Parse the fiber input to eval into a list of fiber numbers"""
     if isinstance(fiber,str) and fiber.lower() == 'combo':
-        fiber= [50,100,150,200,250,300]
-    elif isinstance(fiber,int):
-        fiber= [fiber]
-    elif not isinstance(fiber,list) and isinstance(fiber[0],int):
-        raise ValueError('fiber input to apogee.spec.lsf.eval not understood ...')
+        return [50,100,150,200,250,300]
+    elif isinstance(fiber,(int,numpy.integer)):
+        return [int(fiber)]
+    elif _is_fiber(fiber):
+        return [int(fib) for fib in fiber]
+    raise ValueError('fiber input to apogee.spec.lsf.eval not understood ...')
+
+def _is_fiber(fiber):
+    """Whether fiber is a fiber number or a list of fiber numbers (rather than an LSF)"""
+    if isinstance(fiber,(int,numpy.integer)): return True
+    return isinstance(fiber,(list,tuple)) and len(fiber) > 0 \
+        and all([isinstance(fib,(int,numpy.integer)) for fib in fiber])
+
+def _eval_cached(x,fiber,dr):
+    """Evaluate the LSF or load it from the on-disk cache"""
+    key= hashlib.md5(numpy.ascontiguousarray(x,dtype='f8').tostring())
+    if fiber == _parse_fiber('combo'): fibstr= 'combo'
+    else: fibstr= '-'.join(['%i' % fib for fib in fiber])
+    fileDir= os.path.dirname(appath.apLSFPath('a',dr=dr))
+    filePath= os.path.join(fileDir,'apogee-lsf-dr%s-%s-%s.npy' \
+                               % (dr,fibstr,key.hexdigest()[:16]))
+    if os.path.exists(filePath): return numpy.load(filePath)
+    # Only one process evaluates the LSF, the others wait and load it
+    with download._file_lock(filePath):
+        if os.path.exists(filePath): return numpy.load(filePath)
+        out= _eval(x,fiber,dr)
+        # Write to a temporary file first, such that a partially written
+        # LSF is never read
+        with open(filePath+'.tmp','wb') as lsfFile:
+            numpy.save(lsfFile,out)
+        os.rename(filePath+'.tmp',filePath)
+    return out
+
+def _eval(x,fiber,dr):
+    """Evaluate the LSF for a list of fibers"""
+    out= _eval_unnormalized(x,fiber,dr)
+    out[out<0.]= 0.
+    out/= numpy.sum(out,axis=1)[:,None]
+    return out
+
+def _eval_unnormalized(x,fiber,dr,lsfpars=None):
+    """Sum of the raw LSFs of a list of fibers, evaluated on the wavelength solution of the first fiber; lsfpars= dictionary with the apLSF parameters of each chip (read if None)"""
     # Are the x unit pixels or a fraction 1/hires thereof?
     hires= int(round(1./(x[1]-x[0])))
-    # Setup output
-    wav= apStarWavegrid()
-    l10wav= numpy.log10(wav)
-    dowav= l10wav[1]-l10wav[0]
     # Hi-res wavelength for output
-    hireswav= 10.**numpy.arange(l10wav[0],l10wav[-1]+dowav/hires,dowav/hires)
+    hireswav= _hireswav(hires)
     out= numpy.zeros((len(hireswav),len(x)))
     for chip in ['a','b','c']:
         # Get pixel array for this chip, use fiber[0] for consistency if >1 fib
-        pix= wave2pix(hireswav,chip,fiber[0])
+        pix= wave2pix(hireswav,chip,fiber[0],dr=dr)
         dx= numpy.roll(pix,-hires,)-pix
         dx[-1]= dx[-1-hires]
         dx[-2]= dx[-2-hires]
         dx[-3]= dx[-3-hires]
-        xs= numpy.tile(x,(len(hireswav),1))\
-            *numpy.tile(dx,(len(x),1)).T # nwav,nx       
+        xs= numpy.outer(dx,x) # nwav,nx
         gd= True-numpy.isnan(pix)
         # Read LSF file for this chip
-        lsfpars= apread.apLSF(chip,ext=0)
+        if lsfpars is None: chippars= apread.apLSF(chip,ext=0,dr=dr)
+        else: chippars= lsfpars[chip]
         # Loop through the fibers
         for fib in fiber:
-            out[gd]+= raw(xs[gd],pix[gd],lsfpars[:,300-fib])
+            out[gd]+= raw(xs[gd],pix[gd],chippars[:,300-fib])
+    return out
+
+def _hireswav(hires):
+    """The apStar wavelength grid subdivided hires times"""
+    l10wav= numpy.log10(apStarWavegrid())
+    dowav= l10wav[1]-l10wav[0]
+    return 10.**numpy.arange(l10wav[0],l10wav[-1]+dowav/hires,dowav/hires)
+
+def build_bank(x=None,dr=None):
+    """
+    NAME:
+       build_bank
+    PURPOSE:
+       evaluate the LSF of all 300 fibers and store it in a memory-mapped LSF bank on disk (in the directory of the apLSF files), for fast look-up with apogee.spec.lsf.eval_bank
+    INPUT:
+       x= (numpy.linspace(-7.,7.,43)) pixel offsets at which to evaluate the LSF (see apogee.spec.lsf.eval)
+       dr= (None) use the LSF and wavelength solution of this data release (general default)
+    OUTPUT:
+       path of the LSF bank (a .npy file with a float32 [300,ncen,npixoff] array, the LSF of each fiber in the same diagonal layout as eval's output)
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    if x is None: x= numpy.linspace(-7.,7.,43)
+    if dr is None: dr= appath._default_dr()
+    filePath= _bank_path(x,dr)
+    if os.path.exists(filePath): return filePath
+    # Only one process builds the bank, the others wait for it
+    with download._file_lock(filePath):
+        if os.path.exists(filePath): return filePath
+        lsfpars= dict((chip,apread.apLSF(chip,ext=0,dr=dr))
+                      for chip in ['a','b','c'])
+        hires= int(round(1./(x[1]-x[0])))
+        out= open_memmap(filePath+'.tmp',mode='w+',dtype='float32',
+                         shape=(300,len(_hireswav(hires)),len(x)))
+        for fib in range(1,301):
+            sys.stdout.write('\r'+"Evaluating the LSF of fiber %i ...\r" % fib)
+            sys.stdout.flush()
+            out[fib-1]= _eval_unnormalized(x,[fib],dr,lsfpars=lsfpars)
+        out.flush()
+        del out
+        # Only move the bank into place when all fibers have been written
+        os.rename(filePath+'.tmp',filePath)
+    sys.stdout.write('\r'+_ERASESTR+'\r')
+    sys.stdout.flush()
+    return filePath
+
+def eval_bank(fiber='combo',x=None,weights=None,sparse=True,dr=None):
+    """
+    NAME:
+       eval_bank
+    PURPOSE:
+       look up the LSF of a fiber or the weighted average LSF of a list of fibers in the LSF bank built by apogee.spec.lsf.build_bank
+    INPUT:
+       fiber= ('combo') fiber number or list of fiber numbers or 'combo' (like apogee.spec.lsf.eval)
+       x= (numpy.linspace(-7.,7.,43)) pixel offsets at which the LSF bank was evaluated
+       weights= (None) weights of the fibers (default: equal weights)
+       sparse= (True) if True, return a sparse representation that can be passed to apogee.spec.lsf.convolve for easy convolution
+       dr= (None) use the LSF bank of this data release (general default)
+    OUTPUT:
+       LSF(x|pixel center), like apogee.spec.lsf.eval (except that each fiber's LSF is evaluated on its own wavelength solution rather than on that of the first fiber in the list)
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    if x is None: x= numpy.linspace(-7.,7.,43)
+    if dr is None: dr= appath._default_dr()
+    fiber= _parse_fiber(fiber)
+    if weights is None: weights= numpy.ones(len(fiber))
+    bank= _load_bank(x,dr)
+    out= numpy.zeros(bank.shape[1:])
+    for fib,weight in zip(fiber,weights):
+        out+= weight*bank[fib-1]
     out[out<0.]= 0.
-    out/= numpy.tile(numpy.sum(out,axis=1),(len(x),1)).T
+    out/= numpy.sum(out,axis=1)[:,None]
     if sparse: out= sparsify(out)
     return out
 
+def _bank_path(x,dr):
+    """Path of the LSF bank for pixel offsets x and data release dr"""
+    key= hashlib.md5(numpy.ascontiguousarray(x,dtype='f8').tostring())
+    fileDir= os.path.dirname(appath.apLSFPath('a',dr=dr))
+    return os.path.join(fileDir,'apogee-lsf-bank-dr%s-%s.npy' \
+                            % (dr,key.hexdigest()[:16]))
+
+def _load_bank(x,dr):
+    """Memory-map the LSF bank, raises IOError if it has not been built"""
+    filePath= _bank_path(x,dr)
+    if not filePath in _BANKS:
+        if not os.path.exists(filePath):
+            raise IOError("LSF bank for DR%s has not been built yet, run apogee.spec.lsf.build_bank" % dr)
+        _BANKS[filePath]= numpy.load(filePath,mmap_mode='r')
+    return _BANKS[filePath]
+
 def raw(x,xcenter,params):
     """
     NAME:
@@ -202,9 +441,6 @@ def raw(x,xcenter,params):
     HISTORY:
        2015-02-26 - Written based on Nidever's code in apogeereduce - Bovy (IAS)
     """
-    # Parse x
-    if len(x.shape) == 1:
-        x= numpy.tile(x,(len(xcenter),1))
     # Unpack the LSF parameters
     params= unpack_lsf_params(params)
     # Get the wing parameters at each x
@@ -230,41 +466,49 @@ def raw(x,xcenter,params):
     return out
 
 def _gausshermitebin(x,params,binsize):
-    """Evaluate the integrated Gauss-Hermite function"""
-    ncenter= params.shape[1]
-    out= numpy.empty((ncenter,x.shape[1]))
-    integ= numpy.empty((params.shape[0]-1,x.shape[1]))
-    for ii in range(ncenter):
-        poly= numpy.polynomial.HermiteE(params[1:,ii])
-        # Convert to regular polynomial basis for easy integration
-        poly= poly.convert(kind=numpy.polynomial.Polynomial)
-        # Integrate and add up
-        w1= (x[ii]-0.5*binsize)/params[0,ii]
-        w2= (x[ii]+0.5*binsize)/params[0,ii]
-        eexp1= numpy.exp(-0.5*w1**2.)
-        eexp2= numpy.exp(-0.5*w2**2.)
-        integ[0]= numpy.sqrt(numpy.pi/2.)\
-            *(special.erf(w2/_SQRTTWO)-special.erf(w1/_SQRTTWO))
-        out[ii]= poly.coef[0]*integ[0]
-        if params.shape[0] > 1:
-            integ[1]= -eexp2+eexp1
-            out[ii]+= poly.coef[1]*integ[1]
-        for jj in range(2,params.shape[0]-1):
-            integ[jj]= (-w2**(jj-1)*eexp2+w1**(jj-1)*eexp1)\
-                +(jj-1)*integ[jj-2]
-            out[ii]+= poly.coef[jj]*integ[jj]
+    """Evaluate the integrated Gauss-Hermite function for all centers at once; x is (ncenter,nx) or (nx)"""
+    # Convert to regular polynomial basis for easy integration
+    coef= numpy.dot(_herme2poly_matrix(params.shape[0]-1),params[1:]) # nh,ncenter
+    # Integrate and add up
+    w1= (x-0.5*binsize)/params[0,:,None]
+    w2= (x+0.5*binsize)/params[0,:,None]
+    eexp1= numpy.exp(-0.5*w1**2.)
+    eexp2= numpy.exp(-0.5*w2**2.)
+    integ= [numpy.sqrt(numpy.pi/2.)\
+                *(special.erf(w2/_SQRTTWO)-special.erf(w1/_SQRTTWO))]
+    out= coef[0,:,None]*integ[0]
+    if params.shape[0] > 2:
+        integ.append(-eexp2+eexp1)
+        out+= coef[1,:,None]*integ[1]
+    # Only the last two integrals are needed for the recursion
+    w1pow= w1.copy()
+    w2pow= w2.copy()
+    for jj in range(2,params.shape[0]-1):
+        integ= [integ[1],(-w2pow*eexp2+w1pow*eexp1)+(jj-1)*integ[0]]
+        out+= coef[jj,:,None]*integ[1]
+        w1pow*= w1
+        w2pow*= w2
     return out
 
+def _herme2poly_matrix(n):
+    """Matrix that converts the n coefficients of a HermiteE series to the coefficients of the equivalent polynomial"""
+    if not n in _HERME2POLY:
+        out= numpy.zeros((n,n))
+        for ii in range(n):
+            unit= numpy.zeros(n)
+            unit[ii]= 1.
+            out[:ii+1,ii]= numpy.polynomial.hermite_e.herme2poly(unit)[:ii+1]
+        _HERME2POLY[n]= out
+    return _HERME2POLY[n]
+
 def _wingsbin(x,params,binsize,Wproftype):
-    """Evaluate the wings of the LSF"""
-    ncenter= params.shape[1]
-    out= numpy.empty((ncenter,x.shape[1]))
-    for ii in range(ncenter):
-        if Wproftype == 1: # Gaussian
-            w1=(x[ii]-0.5*binsize)/params[1,ii]
-            w2=(x[ii]+0.5*binsize)/params[1,ii]
-            out[ii]= params[0,ii]/2.*(special.erf(w2/_SQRTTWO)\
-                                          -special.erf(w1/_SQRTTWO))
+    """Evaluate the wings of the LSF for all centers at once; x is (ncenter,nx) or (nx)"""
+    out= numpy.zeros(numpy.broadcast(x,params[0,:,None]).shape)
+    if Wproftype == 1: # Gaussian
+        w1=(x-0.5*binsize)/params[1,:,None]
+        w2=(x+0.5*binsize)/params[1,:,None]
+        out+= params[0,:,None]/2.*(special.erf(w2/_SQRTTWO)\
+                                       -special.erf(w1/_SQRTTWO))
     return out
 
 def unpack_lsf_params(lsfarr):
@@ -330,23 +574,14 @@ def scalarDecorator(func):
     """Decorator to return scalar outputs for wave2pix and pix2wave"""
     @wraps(func)
     def scalar_wrapper(*args,**kwargs):
-        if numpy.array(args[0]).shape == ():
-            scalarOut= True
-            newargs= (numpy.array([args[0]]),)
-            for ii in range(1,len(args)):
-                newargs= newargs+(args[ii],)
-            args= newargs
+        if numpy.ndim(args[0]) == 0:
+            return func(numpy.array([args[0]]),*args[1:],**kwargs)[0]
         else:
-            scalarOut= False
-        result= func(*args,**kwargs)
-        if scalarOut:
-            return result[0]
-        else:
-            return result
+            return func(*args,**kwargs)
     return scalar_wrapper
 
 @scalarDecorator
-def wave2pix(wave,chip,fiber=300):
+def wave2pix(wave,chip,fiber=300,dr=None):
     """
     NAME:
        wave2pix
@@ -356,34 +591,18 @@ def wave2pix(wave,chip,fiber=300):
        wavelength - wavelength (\AA)
        chip - chip to use ('a', 'b', or 'c')
        fiber= (300) fiber to use the wavelength solution of
+       dr= (None) use the wavelength solution of this data release (general default)
     OUTPUT:
        pixel in the chip
     HISTORY:
         2015-02-27 - Written - Bovy (IAS)
+        2026-10-18 - Re-use the interpolant for each chip, fiber, and dr - Bovy (IAS)
     """
-    if chip == 'a':
-        wave0= _WAVEPIX_A[300-fiber]
-    if chip == 'b':
-        wave0= _WAVEPIX_B[300-fiber]
-    if chip == 'c':
-        wave0= _WAVEPIX_C[300-fiber]
-    pix0= numpy.arange(len(wave0))
-    # Need to sort into ascending order
-    sindx= numpy.argsort(wave0)
-    wave0= wave0[sindx]
-    pix0= pix0[sindx]
-    # Start from a linear baseline
-    baseline= numpy.polynomial.Polynomial.fit(wave0,pix0,1)
-    ip= interpolate.InterpolatedUnivariateSpline(wave0,pix0/baseline(wave0),
-                                                 k=3)
-    out= baseline(wave)*ip(wave)
-    # NaN for out of bounds
-    out[wave > wave0[-1]]= numpy.nan
-    out[wave < wave0[0]]= numpy.nan
-    return out
+    return _eval_wavesolution(wave,
+                              _wavesolution(chip,fiber,dr,inverse=True))
 
 @scalarDecorator
-def pix2wave(pix,chip,fiber=300):
+def pix2wave(pix,chip,fiber=300,dr=None):
     """
     NAME:
        pix2wave
@@ -393,32 +612,60 @@ def pix2wave(pix,chip,fiber=300):
        pix - pixel
        chip - chip to use ('a', 'b', or 'c')
        fiber= (300) fiber to use the wavelength solution of
+       dr= (None) use the wavelength solution of this data release (general default)
     OUTPUT:
        wavelength in \AA
     HISTORY:
         2015-02-27 - Written - Bovy (IAS)
+        2026-10-18 - Re-use the interpolant for each chip, fiber, and dr - Bovy (IAS)
     """
-    if chip == 'a':
-        wave0= _WAVEPIX_A[300-fiber]
-    if chip == 'b':
-        wave0= _WAVEPIX_B[300-fiber]
-    if chip == 'c':
-        wave0= _WAVEPIX_C[300-fiber]
+    return _eval_wavesolution(pix,
+                              _wavesolution(chip,fiber,dr,inverse=False))
+
+def _wavesolution(chip,fiber,dr,inverse=False):
+    """Return the interpolant (baseline,spline,xmin,xmax) of the pixel->wavelength (or, if inverse, the wavelength->pixel) solution of a fiber, set up the first time it is needed"""
+    if dr is None: dr= appath._default_dr()
+    key= (chip,fiber,dr,inverse)
+    with _WAVESOLUTIONS_LOCK:
+        if key in _WAVESOLUTIONS:
+            out= _WAVESOLUTIONS.pop(key)
+            _WAVESOLUTIONS[key]= out # most recently used
+            return out
+    wave0= _wavepix(chip,dr=dr)[300-fiber]
     pix0= numpy.arange(len(wave0))
+    if inverse: x, y= wave0, pix0
+    else: x, y= pix0, wave0
     # Need to sort into ascending order
-    sindx= numpy.argsort(pix0)
-    wave0= wave0[sindx]
-    pix0= pix0[sindx]
+    sindx= numpy.argsort(x)
+    x= x[sindx]
+    y= y[sindx]
     # Start from a linear baseline
-    baseline= numpy.polynomial.Polynomial.fit(pix0,wave0,1)
-    ip= interpolate.InterpolatedUnivariateSpline(pix0,wave0/baseline(pix0),
-                                                 k=3)
-    out= baseline(pix)*ip(pix)
-    # NaN for out of bounds
-    out[pix < 0]= numpy.nan
-    out[pix > 2047]= numpy.nan
+    baseline= numpy.polynomial.Polynomial.fit(x,y,1)
+    ip= interpolate.InterpolatedUnivariateSpline(x,y/baseline(x),k=3)
+    out= (baseline,ip,x[0],x[-1])
+    # Another thread may have set up the same interpolant in the meantime
+    with _WAVESOLUTIONS_LOCK:
+        _WAVESOLUTIONS.pop(key,None)
+        if len(_WAVESOLUTIONS) >= _MAX_WAVESOLUTIONS:
+            _WAVESOLUTIONS.popitem(last=False)
+        _WAVESOLUTIONS[key]= out
+    return out
+
+def _eval_wavesolution(x,wavesolution):
+    """Evaluate an interpolant from _wavesolution, NaN for out of bounds"""
+    baseline, ip, xmin, xmax= wavesolution
+    x= numpy.asarray(x)
+    out= baseline(x)*ip(x)
+    out[(x < xmin)+(x > xmax)]= numpy.nan
     return out
 
+def _wavepix(chip,dr=None):
+    """Return the wavelength solution for a chip, loaded the first time it is needed for each data release"""
+    if dr is None: dr= appath._default_dr()
+    if not (chip,dr) in _WAVEPIX:
+        _WAVEPIX[(chip,dr)]= apread.apWave(chip,ext=2,dr=dr)
+    return _WAVEPIX[(chip,dr)]
+
 def _load_precomp(dr=None,fiber='combo',sparse=True):
     """Load a precomputed LSF"""
     if dr is None: dr= appath._default_dr()
@@ -456,54 +703,120 @@ def deconvolve(spec,specerr,
        high-resolution deconvolved spectrum or smoothed deconvolved spectrum on apStar wavelength grid is smooth= is set
     HISTORY:
        2015-04-24 - Written - Bovy (IAS)
+       2026-10-18 - Solve the banded system directly instead of with bicg - Bovy (IAS)
     """
-    # Parse LSF input
+    lsf, hires= _parse_deconvolve_lsf(lsf)
+    detectors= _deconvolve_setup(lsf,hires,eps)
+    # Setup output
+    out= numpy.zeros(lsf.shape[0])
+    # Loop through the detectors and analyze each one separately
+    for detector in detectors:
+        tmp= _deconvolve_detector(spec,specerr,detector,hires)
+        if tmp is None:
+            raise RuntimeError("Deconvolution did not converge")
+        out[detector[0]*hires:detector[1]*hires]= tmp
+    if not smooth is None:
+        out= _deconvolve_smooth(out,hires,smooth)
+    return out
+
+def deconvolve_batch(spec,specerr,
+                     lsf=None,eps=2500.,smooth=None,nthreads=8):
+    """
+    NAME:
+       deconvolve_batch
+    PURPOSE:
+       deconvolve the LSF from many spectra, re-using the LSF and smoothness matrices of each detector and solving for the detectors and spectra in parallel
+    INPUT:
+       spec - spectra (nspec,nwave)
+       specerr - spectrum uncertainty arrays (nspec,nwave)
+       lsf= (None) LSF to deconvolve, needs to be specified in non-sparse format
+       eps= (2500.) smoothness parameter
+       smooth= (None) if set to a resolution, smooth with a FWHM resolution of 'smooth' and return the spectra on the apStar wavelength grid
+       nthreads= (8) number of detectors/spectra to deconvolve in parallel
+    OUTPUT:
+       high-resolution deconvolved spectra or smoothed deconvolved spectra on apStar wavelength grid is smooth= is set (nspec,nwave); detectors for which the deconvolution fails are NaN
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    spec= numpy.atleast_2d(spec)
+    specerr= numpy.atleast_2d(specerr)
+    lsf, hires= _parse_deconvolve_lsf(lsf)
+    detectors= _deconvolve_setup(lsf,hires,eps)
+    out= numpy.zeros((spec.shape[0],lsf.shape[0]))
+    def deconvolve_one(args):
+        ii, detector= args
+        tmp= _deconvolve_detector(spec[ii],specerr[ii],detector,hires)
+        if tmp is None: tmp= numpy.nan
+        out[ii,detector[0]*hires:detector[1]*hires]= tmp
+        return None
+    # The banded solver releases the GIL, so threads run in parallel
+    pool= ThreadPool(nthreads)
+    try:
+        pool.map(deconvolve_one,[(ii,detector)
+                                 for ii in range(spec.shape[0])
+                                 for detector in detectors])
+    finally:
+        pool.terminate()
+    if not smooth is None:
+        out= _deconvolve_smooth(out,hires,smooth)
+    return out
+
+def _parse_deconvolve_lsf(lsf):
+    """Check the LSF input to deconvolve, return the LSF without NaNs and how much higher resolution the LSF is than the data"""
     if lsf is None:
         raise ValueError("lsf= keyword with LSF in non-sparse format required for apogee.spec.lsf.deconvolve")
     if isinstance(lsf,sparse.dia_matrix):
         raise ValueError("lsf= keyword with LSF needs to be in non-sparse format")
-    lsf[numpy.isnan(lsf)]= 0.
-    # How much higher resolution is the LSF than the data?
-    hires= int(round(lsf.shape[0]/8575.))
-    # Setup output
-    out= numpy.zeros(lsf.shape[0])
-    # Loop through the detectors and analyze each one separately
+    lsf= numpy.where(numpy.isnan(lsf),0.,lsf)
+    return (lsf,int(round(lsf.shape[0]/8575.)))
+
+def _deconvolve_setup(lsf,hires,eps):
+    """Set up the LSF and smoothness matrices of each detector: list of (start,end,L,L^T,eps P^T P), where L only has the rows of the LSF at the data pixels (the other rows have zero weight)"""
+    out= []
     for sindx, eindx in zip([140,3450,6250],[3370,6200,8450]):
         # Get the LSF for this detector
-        slsf= sparsify(lsf[hires*sindx:hires*eindx])
-        # Parse the spectrum and its error for this detector, normalize
-        tspec= numpy.ones((eindx-sindx)*hires)
-        tinvspecerr= numpy.zeros((eindx-sindx)*hires)
-        norm= numpy.nanmean(spec[sindx:eindx])
-        tspec[::hires]= spec[sindx:eindx]/norm
-        tinvspecerr[::hires]= norm/specerr[sindx:eindx]
-        # Deal with NaNs
-        tinvspecerr[numpy.isnan(tspec)]= 0.
-        tspec[numpy.isnan(tspec)]= 1.
-        # Set up the necessary sparse matrices
-        Cinv= sparse.diags([tinvspecerr**2.],[0])
-        CinvL= Cinv.dot(slsf)
-        LTCinvL= (slsf.T).dot(CinvL)
+        slsf= sparsify(lsf[hires*sindx:hires*eindx]).tocsr()[::hires]
         # P smoothness matrix
         diags1= -numpy.ones(slsf.shape[1])
         diags1[-1]= 0.
         diags2= numpy.ones(slsf.shape[1]-1)
         P= sparse.diags([diags1,diags2],[0,1])
-        A= LTCinvL+eps*(P.T).dot(P)
-        # b
-        Cinvs= Cinv.dot(tspec)
-        b= (slsf.T).dot(Cinvs)
-        tmp= scipy.sparse.linalg.bicg(A,b)
-        if tmp[1] == 0:
-            tmp= tmp[0]
-        else:
-            raise RuntimeError("Deconvolution did not converge")
-        out[sindx*hires:eindx*hires]= tmp*norm
-    if not smooth is None:
-        wav= apStarWavegrid()
-        l10wav= numpy.log10(wav)
-        dowav= l10wav[1]-l10wav[0]
-        sigvm= hires/dowav/smooth/numpy.log(10.)\
-            /2./numpy.sqrt(2.*numpy.log(2.))
-        out= ndimage.gaussian_filter1d(out,sigvm,mode='constant')[::hires]
+        out.append((sindx,eindx,slsf,slsf.T.tocsr(),
+                    (eps*(P.T).dot(P)).tocsr()))
     return out
+
+def _deconvolve_detector(spec,specerr,detector,hires):
+    """Deconvolve a single detector of a spectrum; None if the system cannot be solved"""
+    sindx, eindx, slsf, slsfT, epsPTP= detector
+    # Parse the spectrum and its error for this detector, normalize
+    norm= numpy.nanmean(spec[sindx:eindx])
+    tspec= spec[sindx:eindx]/norm
+    tinvspecerr= norm/specerr[sindx:eindx]
+    # Deal with NaNs
+    tinvspecerr[numpy.isnan(tspec)]= 0.
+    tspec[numpy.isnan(tspec)]= 1.
+    # Set up the necessary sparse matrices
+    Cinv= sparse.diags([tinvspecerr**2.],[0])
+    A= slsfT.dot(Cinv.dot(slsf))+epsPTP
+    # b
+    b= slsfT.dot(tinvspecerr**2.*tspec)
+    # A is symmetric, positive-definite, and banded: Cholesky solve
+    A= A.tocoo()
+    upper= A.row <= A.col
+    nband= numpy.amax(A.col[upper]-A.row[upper])
+    ab= numpy.zeros((nband+1,A.shape[0]))
+    ab[nband+A.row[upper]-A.col[upper],A.col[upper]]= A.data[upper]
+    try:
+        return linalg.solveh_banded(ab,b)*norm
+    except (linalg.LinAlgError,ValueError):
+        return None
+
+def _deconvolve_smooth(out,hires,smooth):
+    """Smooth deconvolved spectra to a FWHM resolution smooth and return them on the apStar wavelength grid"""
+    wav= apStarWavegrid()
+    l10wav= numpy.log10(wav)
+    dowav= l10wav[1]-l10wav[0]
+    sigvm= hires/dowav/smooth/numpy.log(10.)\
+        /2./numpy.sqrt(2.*numpy.log(2.))
+    return ndimage.gaussian_filter1d(out,sigvm,mode='constant',
+                                     axis=-1)[...,::hires]
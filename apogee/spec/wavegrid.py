@@ -0,0 +1,147 @@
+###############################################################################
+# apogee.spec.wavegrid: the APOGEE wavelength grids
+#
+# This module only depends on numpy (and on apogee.tools.path for the default
+# data release), such that modules that need the wavelength grid do not need
+# to import the plotting code in apogee.spec.plot
+#
+# The ASPCAP wavelength grid is the apStar grid without the pixels that fall
+# outside of the three detectors; which pixels these are depends on the data
+# release (7214 pixels for DR10-12, 7514 pixels for DR13 and later). The
+# mapping between the two grids for each data release is held by an
+# AspcapWavegrid instance, obtained with aspcapWavegrid
+###############################################################################
+import numpy
+_LOG10LAMBDA0= 4.179
+_DLOG10LAMBDA= 6.*10.**-6.
+_NLAMBDA= 8575
+def apStarWavegrid():
+    """
+    NAME:
+       apStarWavegrid
+    PURPOSE:
+       return the apStar wavelength grid
+    INPUT:
+       (none)
+    OUTPUT:
+       wavelength array (\AA)
+    HISTORY:
+       2026-10-18 - Moved here from apogee.spec.plot - Bovy (IAS)
+    """
+    return 10.**numpy.arange(_LOG10LAMBDA0,
+                             _LOG10LAMBDA0+_NLAMBDA*_DLOG10LAMBDA,
+                             _DLOG10LAMBDA)
+
+class AspcapWavegrid(object):
+    """AspcapWavegrid: mapping between the apStar wavelength grid and an ASPCAP wavelength grid"""
+    def __init__(self,apStarRanges):
+        """
+        NAME:
+           __init__
+        PURPOSE:
+           set up the mapping between the apStar and an ASPCAP wavelength grid
+        INPUT:
+           apStarRanges - list of (start,end) apStar pixel ranges of the blue, green, and red detectors
+        OUTPUT:
+           instance; npix is the number of pixels on the ASPCAP grid and apStarSlices and aspcapSlices are the slices of the three detectors on both grids
+        HISTORY:
+           2026-10-18 - Written - Bovy (IAS)
+        """
+        self.apStarSlices= [slice(start,end) for start,end in apStarRanges]
+        edges= numpy.cumsum([0]+[end-start for start,end in apStarRanges])
+        self.aspcapSlices= [slice(start,end)
+                            for start,end in zip(edges[:-1],edges[1:])]
+        self.npix= int(edges[-1])
+        # apStar pixels that are not on the ASPCAP grid
+        self._gapSlices= [slice(start,end) for start,end in
+                          zip([0]+[end for _,end in apStarRanges],
+                              [start for start,_ in apStarRanges]+[_NLAMBDA])
+                          if end > start]
+        return None
+
+    def toAspcap(self,spec,out=None):
+        """
+        NAME:
+           toAspcap
+        PURPOSE:
+           convert spectra from the apStar grid to the ASPCAP grid
+        INPUT:
+           spec - spectra (or whatever) on the apStar grid, wavelength along the last axis: (nwave) or (nspec,nwave); spectra that are already on the ASPCAP grid are returned as is (not copied)
+           out= (None) if set, array of shape (...,npix) to write the output into
+        OUTPUT:
+           spectra on the ASPCAP grid (out if given)
+        HISTORY:
+           2026-10-18 - Written - Bovy (IAS)
+        """
+        spec= numpy.asarray(spec)
+        if spec.shape[-1] == self.npix:
+            if out is None: return spec
+            out[...]= spec
+            return out
+        if out is None:
+            out= numpy.empty(spec.shape[:-1]+(self.npix,),dtype=spec.dtype)
+        for aspcapSlice,apStarSlice in zip(self.aspcapSlices,
+                                           self.apStarSlices):
+            out[...,aspcapSlice]= spec[...,apStarSlice]
+        return out
+
+    def toApStar(self,spec,out=None,fill=0.):
+        """
+        NAME:
+           toApStar
+        PURPOSE:
+           convert spectra from the ASPCAP grid to the apStar grid
+        INPUT:
+           spec - spectra (or whatever) on the ASPCAP grid, wavelength along the last axis: (nwave) or (nspec,nwave); spectra that are already on the apStar grid are returned as is (not copied)
+           out= (None) if set, array of shape (...,8575) to write the output into
+           fill= (0.) value of the apStar pixels that are not on the ASPCAP grid
+        OUTPUT:
+           spectra on the apStar grid (out if given)
+        HISTORY:
+           2026-10-18 - Written - Bovy (IAS)
+        """
+        spec= numpy.asarray(spec)
+        if spec.shape[-1] == _NLAMBDA:
+            if out is None: return spec
+            out[...]= spec
+            return out
+        if out is None:
+            out= numpy.empty(spec.shape[:-1]+(_NLAMBDA,),dtype=spec.dtype)
+        for gapSlice in self._gapSlices:
+            out[...,gapSlice]= fill
+        for aspcapSlice,apStarSlice in zip(self.aspcapSlices,
+                                           self.apStarSlices):
+            out[...,apStarSlice]= spec[...,aspcapSlice]
+        return out
+
+_DR12GRID= AspcapWavegrid([(322,3242),(3648,6048),(6412,8306)])
+_DR13GRID= AspcapWavegrid([(246,3274),(3585,6080),(6344,8335)])
+_ASPCAP_GRIDS= {'10':_DR12GRID,'11':_DR12GRID,'12':_DR12GRID,
+                '13':_DR13GRID,'current':_DR13GRID}
+def aspcapWavegrid(dr=None,npix=None):
+    """
+    NAME:
+       aspcapWavegrid
+    PURPOSE:
+       return the mapping between the apStar and the ASPCAP wavelength grid of a data release
+    INPUT:
+       dr= (None) data release (default: the data release set by the environment, as for the data files)
+       npix= (None) alternatively, number of pixels of the ASPCAP grid (7214 or 7514)
+    OUTPUT:
+       AspcapWavegrid instance
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+       2026-10-18 - Default to the grid of the default data release - Bovy (IAS)
+    """
+    if not npix is None:
+        for grid in [_DR12GRID,_DR13GRID]:
+            if grid.npix == npix: return grid
+        raise ValueError("No ASPCAP wavelength grid with %i pixels" % npix)
+    if dr is None:
+        # apogee.tools.path needs the environment to be set up at import
+        from apogee.tools import path
+        dr= path._default_dr()
+    try:
+        return _ASPCAP_GRIDS[str(dr)]
+    except KeyError:
+        raise ValueError("No ASPCAP wavelength grid known for DR%s" % dr)
@@ -1,5 +1,12 @@
+import os, os.path
+import shutil
+import tempfile
 import functools
+import numpy
+import fitsio
 import nose
+from apogee.tools import path as appath
+from apogee.spec import wavegrid
 # Decorator for known failure
 def known_failure(test):
     @functools.wraps(test)
@@ -12,3 +19,83 @@ def known_failure(test):
             raise AssertionError('Test is expected to fail, but passed instead')
     return inner
 
+# Decorator to run a test with the SAS mirror in a temporary directory
+def with_tmp_mirror(test):
+    @functools.wraps(test)
+    def inner(*args, **kwargs):
+        tmpdir= tempfile.mkdtemp()
+        apogee_data= appath._APOGEE_DATA
+        appath._APOGEE_DATA= tmpdir
+        try:
+            return test(*args, **kwargs)
+        finally:
+            appath._APOGEE_DATA= apogee_data
+            shutil.rmtree(tmpdir)
+    return inner
+
+# Write synthetic aspcapStar and apStar files of nstar stars to the SAS mirror
+# (use with with_tmp_mirror); star ii has ii%3+1 visits and some of its
+# pixels have bits of bitmask.BADPIXMASK set
+def write_spec_fixtures(nstar,dr='12',seed=1):
+    rng= numpy.random.RandomState(seed)
+    npix= wavegrid.aspcapWavegrid(dr=dr).npix
+    loc_ids= numpy.array([4000+ii//2 for ii in range(nstar)])
+    apogee_ids= numpy.array(['2M%08i+%07i' % (ii,ii) for ii in range(nstar)])
+    for ii,(loc_id,apogee_id) in enumerate(zip(loc_ids,apogee_ids)):
+        filePath= appath.aspcapStarPath(int(loc_id),apogee_id,dr=dr)
+        if not os.path.exists(os.path.dirname(filePath)):
+            os.makedirs(os.path.dirname(filePath))
+        with fitsio.FITS(filePath,'rw',clobber=True) as fits:
+            fits.write(numpy.zeros(1))
+            fits.write(rng.uniform(0.5,1.,size=npix).astype('float32'))
+            fits.write(rng.uniform(0.01,0.02,size=npix).astype('float32'))
+        nvisit= ii % 3+1
+        shape= (8575,) if nvisit == 1 else (nvisit+2,8575)
+        mask= numpy.zeros(shape,dtype='int32')
+        mask[rng.uniform(size=shape) < 0.05]|= 2**0 # BADPIX
+        mask[rng.uniform(size=shape) < 0.05]|= 2**1 # CRPIX
+        mask[rng.uniform(size=shape) < 0.05]|= 2**12 # SIG_SKYLINE, not bad
+        filePath= appath.apStarPath(int(loc_id),apogee_id,dr=dr)
+        if not os.path.exists(os.path.dirname(filePath)):
+            os.makedirs(os.path.dirname(filePath))
+        with fitsio.FITS(filePath,'rw',clobber=True) as fits:
+            fits.write(numpy.zeros(1))
+            fits.write(rng.uniform(100.,200.,size=shape).astype('float32'))
+            fits.write(rng.uniform(1.,2.,size=shape).astype('float32'))
+            fits.write(mask)
+    return (loc_ids,apogee_ids)
+
+# Write synthetic apLSF and apWave files to the SAS mirror (use with
+# with_tmp_mirror): wavelength solutions that decrease with pixel and shift
+# slightly from fiber to fiber and Gauss-Hermite LSFs with Gaussian wings
+# whose width varies along the detector and from fiber to fiber
+def write_lsf_fixtures(dr='12'):
+    pix= numpy.arange(2048)/2047.
+    fiber= 300-numpy.arange(300) # row/column ii holds fiber 300-ii
+    for chip,(wave0,wave1) in zip(['a','b','c'],[(16955.,16475.),
+                                                 (16430.,15860.),
+                                                 (15800.,15145.)]):
+        wave= wave0+(wave1-wave0)*pix+2.*pix*(1.-pix)\
+            +0.01*(300-fiber)[:,None]
+        filePath= appath.apWavePath(chip,dr=dr)
+        if not os.path.exists(os.path.dirname(filePath)):
+            os.makedirs(os.path.dirname(filePath))
+        with fitsio.FITS(filePath,'rw',clobber=True) as fits:
+            fits.write(numpy.zeros(1))
+            fits.write(numpy.zeros(1))
+            fits.write(wave)
+        # binsize, Xoffset, Horder, Porder, GH coefficients, Wproftype,
+        # nWpar, WPorder, wing coefficients
+        lsfarr= numpy.empty((17,300))
+        lsfarr[:6]= numpy.array([1.,-1024.,2.,1.,0.,1.])[:,None]
+        lsfarr[6]= 1.+0.001*fiber
+        lsfarr[7]= 1e-4
+        lsfarr[8]= 0.03
+        lsfarr[9]= -0.02
+        lsfarr[10]= 1e-5
+        lsfarr[11:]= numpy.array([1.,2.,0.,0.,0.05,2.5])[:,None]
+        filePath= appath.apLSFPath(chip,dr=dr)
+        if not os.path.exists(os.path.dirname(filePath)):
+            os.makedirs(os.path.dirname(filePath))
+        fitsio.write(filePath,lsfarr,clobber=True)
+    return None
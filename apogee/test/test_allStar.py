@@ -205,3 +205,40 @@ def test_elem_calib_outsiderange_dwarfs():
         else:
             assert numpy.all(numpy.fabs(calibDiff[indx][_DATA['FPARAM'][indx,paramIndx('teff')] > TeffMax]-calibDiff[indx][hiTIndx]) < 10.**-2.), 'Calibration offset does not saturate above the maximum calibration temperature of %i for element %s' % (TeffMax,elem)
     return None
+
+def test_columns():
+    #Test that reading a subset of columns through the column cache gives the same result as reading the full file
+    data= apread.allStar(main=True,exclude_star_bad=True)
+    cdata= apread.allStar(main=True,exclude_star_bad=True,
+                          columns=['RA','DEC','FPARAM'])
+    assert len(data) == len(cdata), 'allStar read with columns= does not have the same length as the full allStar read'
+    for col in ['RA','DEC','FPARAM','H0','METALS']:
+        assert numpy.all(data[col] == cdata[col]), 'Column %s read with columns= does not agree with the full allStar read' % col
+    assert not 'TEFF' in cdata.dtype.names, 'allStar read with columns= contains a column that was not requested'
+    return None
+
+def test_chunksize():
+    #Test that reading the allStar file in chunks gives the same result as reading it all at once
+    data= apread.allStar(main=True,exclude_star_bad=True,rmdups=True)
+    chunks= list(apread.allStar(main=True,exclude_star_bad=True,rmdups=True,
+                                chunksize=10000))
+    assert numpy.all([len(chunk) <= 10000 for chunk in chunks]), 'allStar read with chunksize= returns chunks larger than chunksize'
+    cdata= numpy.concatenate(chunks)
+    assert len(data) == len(cdata), 'allStar read with chunksize= does not have the same length as the full allStar read'
+    for col in ['APSTAR_ID','FPARAM','H0','METALS']:
+        assert numpy.all(data[col] == cdata[col]), 'Column %s read with chunksize= does not agree with the full allStar read' % col
+    return None
+
+def test_lazy():
+    #Test that the derived columns of a lazy allStar read agree with those of a regular read, also after boolean slicing
+    data= apread.allStar(main=True)
+    ldata= apread.allStar(main=True,lazy=True)
+    assert len(data) == len(ldata), 'allStar read with lazy= does not have the same length as the regular allStar read'
+    for col in ['APSTAR_ID','J0','H0','K0','METALS','ALPHAFE']:
+        assert numpy.all(data[col] == ldata[col]), 'Column %s read with lazy= does not agree with the regular allStar read' % col
+    indx= data['H0'] < 11.
+    sdata= ldata[ldata['H0'] < 11.]
+    for col in ['APSTAR_ID','J0','METALS']:
+        assert numpy.all(data[col][indx] == sdata[col]), 'Column %s of a slice of a lazy allStar read does not agree with the regular allStar read' % col
+    assert ldata.as_array().dtype.names == data.dtype.names, 'Lazy allStar read converted to an array does not have the same columns as the regular allStar read'
+    return None
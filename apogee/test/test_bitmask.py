@@ -0,0 +1,57 @@
+# Tests of the vectorized bitmask tools against the per-value tools
+import numpy
+from apogee.tools import bitmask
+_BITS= numpy.random.RandomState(1).randint(-2**31,2**31-1,size=1000)\
+    .astype('int32')
+
+def test_decode():
+    decoded= bitmask.decode(_BITS)
+    assert decoded.shape == (len(_BITS),32), 'decode does not return an (N,nbits) array'
+    for ii in range(100):
+        assert list(numpy.flatnonzero(decoded[ii])) \
+            == bitmask.bits_set(int(_BITS[ii]) & 0xffffffff), 'decode does not agree with bits_set'
+        for bit in [0,11,30]:
+            assert decoded[ii,bit] == bitmask.bit_set(bit,_BITS[ii]), 'decode does not agree with bit_set'
+    # Also works for arrays of any shape, like PIXMASK
+    pixmask= _BITS.reshape((10,100)) % 2**15
+    decoded= bitmask.decode(pixmask,nbits=15)
+    assert decoded.shape == (10,100,15), 'decode does not return a (...,nbits) array for multi-dimensional input'
+    assert numpy.all(decoded[...,2] == ((pixmask & 4) != 0)), 'decode does not work for multi-dimensional input'
+    return None
+
+def test_count():
+    counts= bitmask.count(_BITS,bitmask='APOGEE_TARGET1')
+    for bit,name in bitmask.APOGEE_TARGET1.items():
+        assert counts[name] == numpy.sum((_BITS >> bit) & 1), 'count does not return the correct number of entries with %s set' % name
+    return None
+
+def test_compile_mask_main():
+    # The main-survey selection, compiled and by hand
+    mask= bitmask.compile_mask('anyof APOGEE_SHORT|APOGEE_INTERMEDIATE|APOGEE_LONG, noneof APOGEE_WASH_GIANT|APOGEE_WASH_DWARF')
+    decoded= bitmask.decode(_BITS)
+    indx= (decoded[:,11]+decoded[:,12]+decoded[:,13])\
+        *(True-decoded[:,7])*(True-decoded[:,8])
+    assert numpy.all(mask(_BITS) == indx), 'compiled mask does not agree with the mask computed by hand'
+    return None
+
+def test_compile_mask_allof():
+    mask= bitmask.compile_mask('all of BADPIX|CRPIX; none of SATPIX',
+                               bitmask='APOGEE_PIXMASK')
+    mask2= bitmask.compile_mask(allof=['BADPIX','CRPIX'],noneof='SATPIX',
+                                bitmask='APOGEE_PIXMASK')
+    pixmask= _BITS % 2**15
+    indx= ((pixmask & 3) == 3)*((pixmask & 4) == 0)
+    assert numpy.all(mask(pixmask) == indx), 'compiled mask does not agree with the mask computed by hand'
+    assert numpy.all(mask2(pixmask) == indx), 'compiled mask given as keywords does not agree with the mask computed by hand'
+    return None
+
+def test_compile_mask_errors():
+    try:
+        bitmask.compile_mask('anyof NOT_A_FLAG')
+    except KeyError: pass
+    else: raise AssertionError('compile_mask with an unknown flag name should raise KeyError')
+    try:
+        bitmask.compile_mask('someof APOGEE_SHORT')
+    except ValueError: pass
+    else: raise AssertionError('compile_mask with an unknown clause should raise ValueError')
+    return None
@@ -0,0 +1,122 @@
+# Tests of the continuum fitting in apogee.spec.continuum
+import numpy
+from apogee.spec import continuum
+from apogee.spec import wavegrid
+_RNG= numpy.random.RandomState(2)
+_NSPEC= 4
+_WAV= numpy.linspace(0.,1.,8575)
+_TRUE= 1.+0.1*numpy.sin(3.*_WAV)+0.05*_RNG.randn(_NSPEC,1)*_WAV
+_ERR= 0.01+0.02*_RNG.uniform(size=(_NSPEC,8575))
+_SPEC= _TRUE*(1.-0.3*(_RNG.uniform(size=(_NSPEC,8575)) < 0.2)\
+                  *_RNG.uniform(size=(_NSPEC,8575)))\
+                  +_ERR*_RNG.randn(_NSPEC,8575)
+
+def _fit_aspcap_loop(wav,spec,specerr,deg,niter,usigma,lsigma):
+    # Reference implementation: one Chebyshev.fit per iteration
+    spec= numpy.copy(spec)
+    for ii in range(niter+1):
+        chpoly= numpy.polynomial.Chebyshev.fit(wav,spec,deg,w=1./specerr)
+        tcont= chpoly(wav)
+        tres= spec-tcont
+        sig= numpy.std(tres)
+        mask= (tres < usigma*sig)*(tres > -lsigma*sig)
+        spec[~mask]= tcont[~mask]
+    return tcont
+
+def test_fit_aspcap_batch():
+    grid= wavegrid.aspcapWavegrid(dr='12')
+    cont= continuum.fit(_SPEC,_ERR,type='aspcap')
+    assert cont.shape == _SPEC.shape, 'continuum.fit does not return an (nspec,nwave) array'
+    aspcapCont= grid.toAspcap(cont)
+    aspcapSpec= grid.toAspcap(_SPEC)
+    aspcapErr= grid.toAspcap(_ERR)
+    for ii in range(_NSPEC):
+        for detSlice in grid.aspcapSlices:
+            npix= detSlice.stop-detSlice.start
+            wav= numpy.arange(npix)/(npix-1.)*2.-1.
+            tcont= _fit_aspcap_loop(wav,aspcapSpec[ii,detSlice],
+                                    aspcapErr[ii,detSlice],4,10,3.,0.1)
+            assert numpy.all(numpy.fabs(aspcapCont[ii,detSlice]-tcont) < 10.**-10.), 'Batched ASPCAP-style continuum fit does not agree with the spectrum-by-spectrum fit'
+    # A single spectrum gives the same continuum
+    assert numpy.all(numpy.fabs(continuum.fit(_SPEC[1],_ERR[1])-cont[1]) < 10.**-10.), 'continuum.fit of a single spectrum does not agree with the batched fit'
+    # Input is not modified
+    assert numpy.all(grid.toAspcap(_SPEC) == aspcapSpec), 'continuum.fit modifies its input'
+    return None
+
+def test_fit_cannon_batch():
+    grid= wavegrid.aspcapWavegrid(dr='12')
+    cont_pixels= _RNG.uniform(size=grid.npix) < 0.3
+    cont= grid.toAspcap(continuum.fit(_SPEC,_ERR,type='cannon',
+                                      cont_pixels=cont_pixels))
+    aspcapSpec= grid.toAspcap(_SPEC)
+    aspcapErr= grid.toAspcap(_ERR)
+    for ii in range(_NSPEC):
+        for detSlice in grid.aspcapSlices:
+            npix= detSlice.stop-detSlice.start
+            wav= numpy.arange(npix)/(npix-1.)*2.-1.
+            indx= cont_pixels[detSlice]
+            chpoly= numpy.polynomial.Chebyshev.fit(\
+                wav[indx],aspcapSpec[ii,detSlice][indx],2,
+                w=1./aspcapErr[ii,detSlice][indx])
+            assert numpy.all(numpy.fabs(cont[ii,detSlice]-chpoly(wav)) < 10.**-10.), 'Batched Cannon-style continuum fit does not agree with the spectrum-by-spectrum fit'
+    return None
+
+def test_fit_dr13grid():
+    grid= wavegrid.aspcapWavegrid(dr='13')
+    cont= continuum.fit(grid.toAspcap(_SPEC),grid.toAspcap(_ERR))
+    assert cont.shape == (_NSPEC,grid.npix), 'continuum.fit does not return a spectrum on the DR13 ASPCAP grid'
+    assert numpy.all(numpy.fabs(cont/grid.toAspcap(_TRUE)-1.) < 0.05), 'continuum.fit on the DR13 ASPCAP grid does not recover the continuum'
+    return None
+
+def test_fit_cannon_dr13grid():
+    # Continuum pixels on the DR12 grid, spectra on the DR13 grid
+    grid12= wavegrid.aspcapWavegrid(dr='12')
+    grid= wavegrid.aspcapWavegrid(dr='13')
+    cont_pixels12= _RNG.uniform(size=grid12.npix) < 0.3
+    cont_pixels= grid.toAspcap(grid12.toApStar(cont_pixels12,fill=False))
+    aspcapSpec= grid.toAspcap(_SPEC)
+    aspcapErr= grid.toAspcap(_ERR)
+    cont= continuum.fit(aspcapSpec,aspcapErr,type='cannon',
+                        cont_pixels=cont_pixels12)
+    assert cont.shape == (_NSPEC,grid.npix), 'Cannon-style continuum fit does not return a spectrum on the DR13 ASPCAP grid'
+    for ii in range(_NSPEC):
+        for detSlice in grid.aspcapSlices:
+            npix= detSlice.stop-detSlice.start
+            wav= numpy.arange(npix)/(npix-1.)*2.-1.
+            indx= cont_pixels[detSlice]
+            chpoly= numpy.polynomial.Chebyshev.fit(\
+                wav[indx],aspcapSpec[ii,detSlice][indx],2,
+                w=1./aspcapErr[ii,detSlice][indx])
+            assert numpy.all(numpy.fabs(cont[ii,detSlice]-chpoly(wav)) < 10.**-10.), 'Cannon-style continuum fit with continuum pixels on the DR12 grid does not agree with the fit to the same pixels on the DR13 grid'
+    # Continuum pixels on the apStar grid
+    assert numpy.all(continuum.fit(aspcapSpec,aspcapErr,type='cannon',
+                                   cont_pixels=grid12.toApStar(cont_pixels12,fill=False)) == cont), 'Cannon-style continuum fit with continuum pixels on the apStar grid does not agree with the fit with continuum pixels on an ASPCAP grid'
+    try:
+        continuum.fit(aspcapSpec,aspcapErr,type='cannon',
+                      cont_pixels=numpy.ones(1000,dtype='bool'))
+    except ValueError: pass
+    else: raise AssertionError('Cannon-style continuum fit with continuum pixels on an unknown grid does not raise ValueError')
+    return None
+
+def test_fit_float32():
+    # float32 input, like spectral cubes, is fit in float64
+    spec= _SPEC.astype('float32')
+    err= _ERR.astype('float32')
+    for type in ['aspcap','cannon']:
+        cont= continuum.fit(spec,err,type=type)
+        assert numpy.all(cont == continuum.fit(spec.astype('float64'),
+                                               err.astype('float64'),
+                                               type=type)), 'Continuum fit of float32 spectra is not done in float64 for type %s' % type
+    return None
+
+def test_fit_singular():
+    # One spectrum that cannot be fit does not affect the others
+    grid= wavegrid.aspcapWavegrid(dr='12')
+    err= numpy.copy(_ERR)
+    err[2]= numpy.inf
+    for type in ['aspcap','cannon']:
+        cont= continuum.fit(_SPEC,err,type=type)
+        assert numpy.all(numpy.isnan(grid.toAspcap(cont[2]))), 'Continuum of a spectrum with infinite errors is not NaN for type %s' % type
+        indx= numpy.array([0,1,3])
+        assert numpy.all(numpy.fabs(cont[indx]-continuum.fit(_SPEC[indx],_ERR[indx],type=type)) < 10.**-10.), 'Continuum of other spectra is affected by a spectrum that cannot be fit for type %s' % type
+    return None
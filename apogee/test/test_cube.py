@@ -0,0 +1,90 @@
+# Tests of the spectral cubes in apogee.spec.cube, built from synthetic files
+import os, os.path
+import numpy
+import fitsio
+from apogee.tools import path as appath
+from apogee.spec import cube, wavegrid
+from _util import with_tmp_mirror, write_spec_fixtures
+_NSTAR= 7
+
+@with_tmp_mirror
+def test_build_aspcapStar():
+    loc_ids, apogee_ids= write_spec_fixtures(_NSTAR)
+    filename= os.path.join(appath._APOGEE_DATA,'test-cube')
+    grid= wavegrid.aspcapWavegrid(dr='12')
+    scube= cube.build(filename,loc_ids,apogee_ids,dr='12',nthreads=2)
+    assert len(scube) == _NSTAR, 'Spectral cube does not have the right number of spectra'
+    assert scube.spec.shape == (_NSTAR,grid.npix), 'aspcapStar cube is not on the ASPCAP grid'
+    assert scube.mask is None, 'aspcapStar cube has a mask'
+    assert numpy.all(scube.index['FOUND']), 'Not all spectra were found'
+    for ii in range(_NSTAR):
+        filePath= appath.aspcapStarPath(int(loc_ids[ii]),apogee_ids[ii],
+                                        dr='12')
+        assert numpy.all(scube.spec[ii] == fitsio.read(filePath,1)), 'Spectrum in the cube differs from the spectrum in the file'
+        assert numpy.all(scube.specerr[ii] == fitsio.read(filePath,2)), 'Error in the cube differs from the error in the file'
+        assert scube.indx(loc_ids[ii],apogee_ids[ii]) == ii, 'SpecCube.indx does not return the index of the star'
+    try:
+        scube.indx(loc_ids[0],'2M99999999+9999999')
+    except KeyError: pass
+    else: raise AssertionError('SpecCube.indx of a star that is not in the cube does not raise KeyError')
+    # Slices and single stars
+    sub= scube[2:5]
+    assert len(sub) == 3 and numpy.all(sub.spec == scube.spec[2:5]), 'Slice of a spectral cube does not contain the right spectra'
+    assert sub.indx(loc_ids[3],apogee_ids[3]) == 1, 'SpecCube.indx of a slice does not return the index in the slice'
+    assert scube[4].spec.shape == (1,grid.npix), 'Single star of a spectral cube is not a cube with one spectrum'
+    # Re-loading and re-building re-uses the cube
+    assert numpy.all(cube.SpecCube(filename).spec == scube.spec), 'Re-loaded spectral cube differs'
+    os.remove(appath.aspcapStarPath(int(loc_ids[0]),apogee_ids[0],dr='12'))
+    assert numpy.all(cube.build(filename,loc_ids,apogee_ids,dr='12').spec == scube.spec), 'Existing spectral cube is not re-used'
+    # On the apStar grid, zero outside of the ASPCAP grid
+    acube= cube.build(filename+'-apStar',loc_ids[1:],apogee_ids[1:],
+                      dr='12',aspcapWavegrid=False)
+    assert acube.spec.shape == (_NSTAR-1,8575), 'aspcapStar cube is not on the apStar grid when aspcapWavegrid=False'
+    assert numpy.all(grid.toAspcap(acube.spec) == scube.spec[1:]), 'aspcapStar cube on the apStar grid does not contain the spectra'
+    assert numpy.all(acube.spec[:,:grid.apStarSlices[0].start] == 0.), 'aspcapStar cube on the apStar grid is not zero outside of the ASPCAP grid'
+    return None
+
+@with_tmp_mirror
+def test_build_apStar():
+    loc_ids, apogee_ids= write_spec_fixtures(_NSTAR)
+    filename= os.path.join(appath._APOGEE_DATA,'test-cube')
+    scube= cube.build(filename,loc_ids,apogee_ids,ftype='apStar',
+                      aspcapWavegrid=False,dr='12')
+    assert scube.spec.shape == (_NSTAR,8575), 'apStar cube is not on the apStar grid'
+    for ii in range(_NSTAR):
+        filePath= appath.apStarPath(int(loc_ids[ii]),apogee_ids[ii],dr='12')
+        for ext,arr in zip([1,2,3],[scube.spec,scube.specerr,scube.mask]):
+            data= fitsio.read(filePath,ext)
+            if len(data.shape) == 2: data= data[0] # combined spectrum
+            assert numpy.all(arr[ii] == data), 'apStar cube does not contain the combined spectrum, error, and mask'
+    return None
+
+@with_tmp_mirror
+def test_build_rebuild():
+    # Building a cube with the same stars but different inputs in the same
+    # directory rebuilds it
+    loc_ids, apogee_ids= write_spec_fixtures(_NSTAR)
+    filename= os.path.join(appath._APOGEE_DATA,'test-cube')
+    grid= wavegrid.aspcapWavegrid(dr='12')
+    scube= cube.build(filename,loc_ids,apogee_ids,dr='12')
+    assert scube.ftype == 'aspcapstar' and scube.dr == '12' \
+        and scube.aspcapWavegrid, 'Spectral cube does not record the inputs it was built with'
+    acube= cube.build(filename,loc_ids,apogee_ids,ftype='apStar',
+                      aspcapWavegrid=False,dr='12')
+    assert acube.spec.shape == (_NSTAR,8575), 'Existing cube with a different ftype and wavelength grid is re-used'
+    assert not acube.mask is None, 'apStar cube built over an aspcapStar cube does not have a mask'
+    assert acube.ftype == 'apstar' and not acube.aspcapWavegrid, 'Rebuilt spectral cube does not record the inputs it was built with'
+    acube= cube.build(filename,loc_ids,apogee_ids,ftype='apStar',dr='12')
+    assert acube.spec.shape == (_NSTAR,grid.npix), 'Existing cube on a different wavelength grid is re-used'
+    filePath= appath.apStarPath(int(loc_ids[0]),apogee_ids[0],dr='12')
+    data= fitsio.read(filePath,1)
+    if len(data.shape) == 2: data= data[0]
+    assert numpy.all(acube.spec[0] == grid.toAspcap(data)), 'Rebuilt spectral cube does not contain the apStar spectrum on the ASPCAP grid'
+    assert numpy.all(cube.build(filename,loc_ids,apogee_ids,ftype='apStar',
+                                dr='12').spec == acube.spec), 'Cube with the same inputs is not re-used'
+    # Cubes built without the inputs recorded are rebuilt
+    os.remove(os.path.join(filename,'meta.json'))
+    assert cube.SpecCube(filename).ftype is None, 'Cube without recorded inputs has an ftype'
+    scube= cube.build(filename,loc_ids,apogee_ids,dr='12')
+    assert scube.mask is None and scube.ftype == 'aspcapstar', 'Cube without recorded inputs is re-used'
+    return None
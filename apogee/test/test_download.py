@@ -0,0 +1,273 @@
+# Tests of the bulk downloader against a local stand-in for the SAS
+import os, os.path
+import shutil
+import tempfile
+import threading
+import multiprocessing
+import time
+import json
+import BaseHTTPServer
+import SocketServer
+from apogee.tools import path as appath
+from apogee.tools import download as apdownload
+_FILES= {} # path on the server -> content
+_FAILONCE= set() # paths for which the first request fails
+_DROPONCE= set() # paths for which the first transfer is dropped halfway
+_DROPAFTER= {} # path -> number of bytes after which each transfer is dropped
+_REDIRECTS= {} # path -> path that it redirects to
+_REQUESTS= [] # (client port, path) of all requests
+_RANGES= [] # Range headers of all requests
+class _SASHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version= 'HTTP/1.1' # keep-alive
+    def do_GET(self,head=False):
+        _REQUESTS.append((self.client_address[1],self.path))
+        _RANGES.append(self.headers.get('Range'))
+        if self.path in _FAILONCE:
+            _FAILONCE.remove(self.path)
+            self._respond(500,'')
+        elif self.path in _REDIRECTS:
+            self.send_response(302)
+            self.send_header('Location',_REDIRECTS[self.path])
+            self.send_header('Content-Length','0')
+            self.end_headers()
+        elif self.path in _DROPAFTER:
+            content= _FILES[self.path]
+            if self.headers.get('Range') is None:
+                self.send_response(200)
+            else:
+                self.send_response(206)
+                content= content[int(self.headers.get('Range')[6:-1]):]
+            self.send_header('Content-Length','%i' % len(content))
+            self.end_headers()
+            self.wfile.write(content[:_DROPAFTER[self.path]])
+            self.close_connection= 1
+        elif self.path in _FILES:
+            content= _FILES[self.path]
+            if not self.headers.get('Range') is None:
+                offset= int(self.headers.get('Range')[6:-1])
+                self._respond(206,content[offset:],head=head)
+            elif self.path in _DROPONCE:
+                _DROPONCE.remove(self.path)
+                self.send_response(200)
+                self.send_header('Content-Length','%i' % len(content))
+                self.end_headers()
+                self.wfile.write(content[:len(content)//2])
+                self.close_connection= 1
+            else:
+                self._respond(200,content,head=head)
+        else:
+            self._respond(404,'')
+        return None
+    def do_HEAD(self):
+        return self.do_GET(head=True)
+    def _respond(self,status,content,head=False):
+        self.send_response(status)
+        self.send_header('Content-Length','%i' % len(content))
+        self.end_headers()
+        if not head: self.wfile.write(content)
+        return None
+    def log_message(self,*args): pass
+
+class _SASServer(SocketServer.ThreadingMixIn,BaseHTTPServer.HTTPServer):
+    daemon_threads= True
+
+def _stand_in(test):
+    """Run test with a local stand-in server for the DR12 SAS and a temporary local data directory"""
+    def wrapped():
+        server= _SASServer(('127.0.0.1',0),_SASHandler)
+        thread= threading.Thread(target=server.serve_forever)
+        thread.daemon= True
+        thread.start()
+        tmpdir= tempfile.mkdtemp()
+        oldData, oldUrl= appath._APOGEE_DATA, apdownload._DR12_URL
+        appath._APOGEE_DATA= tmpdir
+        apdownload._DR12_URL= 'http://127.0.0.1:%i/sas/dr12' \
+            % server.server_address[1]
+        try:
+            test(tmpdir)
+        finally:
+            appath._APOGEE_DATA, apdownload._DR12_URL= oldData, oldUrl
+            server.shutdown()
+            server.server_close()
+            shutil.rmtree(tmpdir)
+            _FILES.clear()
+            _FAILONCE.clear()
+            _DROPONCE.clear()
+            _DROPAFTER.clear()
+            _REDIRECTS.clear()
+            del _REQUESTS[:]
+            del _RANGES[:]
+    wrapped.__name__= test.__name__
+    return wrapped
+
+def _server_path(filePath):
+    return filePath.replace(appath._APOGEE_DATA,'/sas')
+
+@_stand_in
+def test_bulk_aspcapStar(tmpdir):
+    loc_ids= [4240,4240,4241,4241]
+    apogee_ids= ['2M0001','2M0002','2M0003','2M0004']
+    filePaths= [appath.aspcapStarPath(loc_id,apogee_id,dr='12')
+                for loc_id,apogee_id in zip(loc_ids,apogee_ids)]
+    # First and second on the server, third already downloaded, fourth missing
+    for filePath in filePaths[:3]:
+        _FILES[_server_path(filePath)]= 'content of %s' \
+            % os.path.basename(filePath)
+    os.makedirs(os.path.dirname(filePaths[2]))
+    with open(filePaths[2],'w') as existingFile:
+        existingFile.write('local')
+    manifest= os.path.join(tmpdir,'manifest.json')
+    failed= apdownload.bulk_aspcapStar(loc_ids,apogee_ids,dr='12',
+                                       nthreads=1,manifest=manifest)
+    assert failed == filePaths[3:], 'bulk_aspcapStar should report the file that does not exist on the server as failed'
+    for filePath in filePaths[:2]:
+        with open(filePath,'r') as downloadedFile:
+            assert downloadedFile.read() == _FILES[_server_path(filePath)], 'bulk_aspcapStar did not download the correct content'
+    with open(filePaths[2],'r') as existingFile:
+        assert existingFile.read() == 'local', 'bulk_aspcapStar overwrote an existing file'
+    assert not _server_path(filePaths[2]) in [p for c,p in _REQUESTS], 'bulk_aspcapStar requested a file that already exists'
+    assert len(set([c for c,p in _REQUESTS])) == 1, 'bulk_aspcapStar with a single thread should re-use a single connection'
+    with open(manifest,'r') as manifestFile:
+        status= json.load(manifestFile)
+    assert [status[filePath] for filePath in filePaths] \
+        == ['done','done','done','missing'], 'manifest does not contain the correct status of each file'
+    # Restarting with the manifest should not try the missing file again
+    del _REQUESTS[:]
+    failed= apdownload.bulk_aspcapStar(loc_ids,apogee_ids,dr='12',
+                                       nthreads=1,manifest=manifest)
+    assert failed == filePaths[3:], 'bulk_aspcapStar should report the file that does not exist on the server as failed'
+    assert len(_REQUESTS) == 0, 'bulk_aspcapStar re-tried a file that does not exist on the server'
+    # No lock files or per-file thread locks are left behind
+    for filePath in filePaths[:3]:
+        assert not os.path.exists(filePath+'.lock'), 'bulk_aspcapStar left a lock file next to the downloaded file'
+    assert os.listdir(appath.cachePath('locks')) == [], 'bulk_aspcapStar left lock files behind'
+    assert len(apdownload._THREAD_LOCKS) == 0, 'bulk_aspcapStar left per-file thread locks behind'
+    return None
+
+@_stand_in
+def test_bulk_apStar_retry(tmpdir):
+    loc_ids= [4240+ii for ii in range(10)]
+    apogee_ids= ['2M%04i' % ii for ii in range(10)]
+    filePaths= [appath.apStarPath(loc_id,apogee_id,dr='12')
+                for loc_id,apogee_id in zip(loc_ids,apogee_ids)]
+    for filePath in filePaths:
+        _FILES[_server_path(filePath)]= 'content of %s' \
+            % os.path.basename(filePath)
+    # Some downloads fail on the first attempt
+    _FAILONCE.update([_server_path(filePath) for filePath in filePaths[::3]])
+    failed= apdownload.bulk_apStar(loc_ids,apogee_ids,dr='12',nthreads=4)
+    assert failed == [], 'bulk_apStar did not retry failed downloads'
+    for filePath in filePaths:
+        with open(filePath,'r') as downloadedFile:
+            assert downloadedFile.read() == _FILES[_server_path(filePath)], 'bulk_apStar did not download the correct content'
+    assert len(set([c for c,p in _REQUESTS])) <= 4, 'bulk_apStar should re-use one connection per thread'
+    return None
+
+@_stand_in
+def test_download_resume(tmpdir):
+    # Interrupted downloads should be resumed, not restarted
+    filePath= appath.apStarPath(4240,'2M0001',dr='12')
+    _FILES[_server_path(filePath)]= 'x'*100000
+    _DROPONCE.add(_server_path(filePath))
+    apdownload.apStar(4240,'2M0001',dr='12')
+    with open(filePath,'r') as downloadedFile:
+        assert downloadedFile.read() == _FILES[_server_path(filePath)], 'resumed download does not have the correct content'
+    assert _RANGES == [None,'bytes=50000-'], 'interrupted download was not resumed from where it was interrupted'
+    assert not os.path.exists(filePath+'.part'), 'partial download was not removed'
+    return None
+
+@_stand_in
+def test_download_resume_bounded(tmpdir):
+    # A server that drops every transfer is only resumed a bounded number of
+    # times, with a wait before each resume
+    max_nresumes= apdownload._MAX_NRESUMES
+    resume_backoff= apdownload._RESUME_BACKOFF
+    apdownload._RESUME_BACKOFF= 0.01
+    try:
+        filePath= appath.apStarPath(4240,'2M0001',dr='12')
+        _FILES[_server_path(filePath)]= 'x'*3000
+        _DROPAFTER[_server_path(filePath)]= 300
+        apdownload._MAX_NRESUMES= 2
+        start= time.time()
+        try:
+            apdownload.apStar(4240,'2M0001',dr='12')
+        except IOError: pass
+        else: raise AssertionError('Download from a server that keeps dropping the connection did not fail when the resumes ran out')
+        assert len(_REQUESTS) == 2+apdownload._MAX_NTRIES+1, 'Download from a server that keeps dropping the connection was not resumed a bounded number of times'
+        assert time.time()-start >= 0.01+0.02, 'Interrupted download was resumed without waiting'
+        assert not os.path.exists(filePath), 'Failed download was moved into place'
+        # With enough resumes, the download completes, starting from the
+        # 1500 bytes downloaded by the five failed attempts
+        del _REQUESTS[:]
+        del _RANGES[:]
+        apdownload._MAX_NRESUMES= 20
+        apdownload.apStar(4240,'2M0001',dr='12')
+        with open(filePath,'r') as downloadedFile:
+            assert downloadedFile.read() == _FILES[_server_path(filePath)], 'resumed download does not have the correct content'
+        assert _RANGES == ['bytes=%i-' % offset for offset in range(1500,3000,300)], 'Interrupted download was not resumed from where it was interrupted'
+    finally:
+        apdownload._MAX_NRESUMES= max_nresumes
+        apdownload._RESUME_BACKOFF= resume_backoff
+    return None
+
+@_stand_in
+def test_download_redirect_spider(tmpdir):
+    filePath= appath.apStarPath(4240,'2M0001',dr='12')
+    _FILES['/elsewhere.fits']= 'content'
+    _REDIRECTS[_server_path(filePath)]= '/elsewhere.fits'
+    # Spider only checks whether the file exists
+    downloadPath= filePath.replace(os.path.join(appath._APOGEE_DATA,'dr12'),
+                                   apdownload._DR12_URL)
+    apdownload._download_file(downloadPath,filePath,'12',spider=True)
+    assert not os.path.exists(filePath), 'spider download should not download the file'
+    apdownload.apStar(4240,'2M0001',dr='12')
+    with open(filePath,'r') as downloadedFile:
+        assert downloadedFile.read() == 'content', 'redirected download does not have the correct content'
+    try:
+        apdownload.apStar(4240,'2M0002',dr='12')
+    except IOError: pass
+    else:
+        raise AssertionError('downloading a file that does not exist should raise IOError')
+    return None
+
+def _try_lock(filePath,queue):
+    # Try to acquire the lock on filePath in another process
+    apdownload._THREAD_LOCKS.clear()
+    try:
+        with apdownload._file_lock(filePath,timeout=0.2):
+            queue.put(True)
+    except IOError:
+        queue.put(False)
+
+@_stand_in
+def test_file_lock(tmpdir):
+    filePath= os.path.join(tmpdir,'locked.fits')
+    # Threads exclude each other
+    inside= []
+    overlap= []
+    def locked(ii):
+        with apdownload._file_lock(filePath):
+            inside.append(ii)
+            if len(inside) > 1: overlap.append(ii)
+            time.sleep(0.01)
+            inside.remove(ii)
+    threads= [threading.Thread(target=locked,args=(ii,)) for ii in range(8)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert len(overlap) == 0, '_file_lock does not exclude other threads'
+    assert len(apdownload._THREAD_LOCKS) == 0, '_file_lock leaves per-file thread locks behind'
+    assert os.listdir(appath.cachePath('locks')) == [], '_file_lock leaves lock files behind'
+    # Processes exclude each other
+    queue= multiprocessing.Queue()
+    with apdownload._file_lock(filePath):
+        process= multiprocessing.Process(target=_try_lock,
+                                         args=(filePath,queue))
+        process.start()
+        assert not queue.get(), '_file_lock does not exclude other processes'
+        process.join()
+    process= multiprocessing.Process(target=_try_lock,args=(filePath,queue))
+    process.start()
+    assert queue.get(), 'Released _file_lock cannot be acquired by another process'
+    process.join()
+    assert os.listdir(appath.cachePath('locks')) == [], '_file_lock leaves lock files behind'
+    return None
@@ -0,0 +1,349 @@
+# Tests of apogee.spec.lsf
+import os, os.path
+import glob
+import functools
+from multiprocessing.pool import ThreadPool
+import numpy
+from scipy import interpolate, sparse
+from apogee.tools import path as appath
+from apogee.spec import lsf
+from _util import with_tmp_mirror, write_lsf_fixtures
+_RNG= numpy.random.RandomState(7)
+
+# Synthetic LSF parameters in the format of the apLSF files: binsize,
+# Xoffset, Horder, Porder, GH coefficients, Wproftype, nWpar, WPorder, wing
+# coefficients
+def _lsfarr(Horder):
+    Porder= [1]+[Horder % 2]*Horder
+    ghpar= [1.1,1e-4]+[0.02*_RNG.normal() for ii in range(Horder+sum(Porder[1:]))]
+    return numpy.array([1.,-1024.,Horder]+Porder+ghpar+[1.,2.,0.,0.,0.05,2.5])
+
+def _with_lsf_fixtures(test):
+    # Run the test with synthetic apLSF and apWave files in a temporary
+    # SAS mirror, clearing the wavelength solutions and LSF banks loaded from
+    # other mirrors
+    @functools.wraps(test)
+    def inner():
+        for cache in [lsf._WAVEPIX,lsf._WAVESOLUTIONS,lsf._BANKS]:
+            cache.clear()
+        try:
+            write_lsf_fixtures(dr='12')
+            test()
+        finally:
+            for cache in [lsf._WAVEPIX,lsf._WAVESOLUTIONS,lsf._BANKS]:
+                cache.clear()
+    return with_tmp_mirror(inner)
+
+def _equal(a,b):
+    # Equality, treating NaN as equal to NaN
+    return numpy.all((a == b)+(numpy.isnan(a)*numpy.isnan(b)))
+
+def _quad(func,w1,w2,n=40):
+    # Gauss-Legendre quadrature of func over [w1,w2] for each pixel
+    xi,wi= numpy.polynomial.legendre.leggauss(n)
+    w= 0.5*(w2-w1)[...,None]*xi+0.5*(w2+w1)[...,None]
+    return 0.5*(w2-w1)*numpy.sum(wi*func(w),axis=-1)
+
+def _gausshermitebin_reference(x,params,binsize):
+    # Integrate the Gauss-Hermite function pixel by pixel
+    out= numpy.empty((params.shape[1],x.shape[-1]))
+    for ii in range(params.shape[1]):
+        xx= x[ii] if len(x.shape) == 2 else x
+        w1= (xx-0.5*binsize)/params[0,ii]
+        w2= (xx+0.5*binsize)/params[0,ii]
+        out[ii]= _quad(lambda w: numpy.polynomial.hermite_e.hermeval(w,params[1:,ii])*numpy.exp(-0.5*w**2.),w1,w2)
+    return out
+
+def _wingsbin_reference(x,params,binsize):
+    # Integrate the Gaussian wings pixel by pixel
+    out= numpy.empty((params.shape[1],x.shape[-1]))
+    for ii in range(params.shape[1]):
+        xx= x[ii] if len(x.shape) == 2 else x
+        w1= (xx-0.5*binsize)/params[1,ii]
+        w2= (xx+0.5*binsize)/params[1,ii]
+        out[ii]= params[0,ii]/numpy.sqrt(2.*numpy.pi)\
+            *_quad(lambda w: numpy.exp(-0.5*w**2.),w1,w2)
+    return out
+
+def test_herme2poly_matrix():
+    for n in range(1,7):
+        coef= _RNG.normal(size=n)
+        assert numpy.allclose(numpy.dot(lsf._herme2poly_matrix(n),coef),
+                              numpy.polynomial.hermite_e.herme2poly(coef)), 'HermiteE to polynomial conversion matrix is wrong for n = %i' % n
+    return None
+
+def test_gausshermitebin():
+    x= numpy.linspace(-7.,7.,43)
+    for Horder in range(5):
+        params= numpy.empty((Horder+2,5))
+        params[0]= _RNG.uniform(0.8,1.5,size=5)
+        params[1:]= _RNG.normal(size=(Horder+1,5))
+        for xx in [x,x+_RNG.uniform(-0.5,0.5,size=(5,1))]:
+            assert numpy.allclose(lsf._gausshermitebin(xx,params,1.),
+                                  _gausshermitebin_reference(xx,params,1.),
+                                  rtol=1e-8,atol=1e-12), 'Integrated Gauss-Hermite function does not agree with the pixel-by-pixel integral for Horder = %i' % Horder
+    return None
+
+def test_wingsbin():
+    x= numpy.linspace(-7.,7.,43)
+    params= numpy.array([_RNG.uniform(0.01,0.1,size=5),
+                         _RNG.uniform(2.,4.,size=5)])
+    for xx in [x,x+_RNG.uniform(-0.5,0.5,size=(5,1))]:
+        assert numpy.allclose(lsf._wingsbin(xx,params,1.,1),
+                              _wingsbin_reference(xx,params,1.),
+                              rtol=1e-8,atol=1e-12), 'Integrated wings do not agree with the pixel-by-pixel integral'
+    return None
+
+def test_raw():
+    x= numpy.linspace(-7.,7.,43)
+    xcenter= numpy.array([10.,500.3,1024.,1500.7,2040.])
+    for Horder in range(4):
+        lsfarr= _lsfarr(Horder)
+        out= lsf.raw(x,xcenter,lsfarr)
+        # Each center separately
+        for ii in range(len(xcenter)):
+            assert numpy.allclose(out[ii],lsf.raw(x,xcenter[ii:ii+1],
+                                                  lsfarr)[0],
+                                  rtol=1e-12,atol=1e-15), 'raw LSF for multiple centers does not agree with raw LSF for a single center for Horder = %i' % Horder
+        # Unit normalization (the x are spaced by 1/3 pixel)
+        assert numpy.all(numpy.fabs(numpy.sum(out,axis=1)*(x[1]-x[0])-1.) < 0.01), 'raw LSF is not approximately normalized for Horder = %i' % Horder
+    return None
+
+@_with_lsf_fixtures
+def test_eval_cache():
+    x= numpy.linspace(-3.,3.,19)
+    fibers= [5,[5,120],'combo']
+    for fiber in fibers:
+        nocache= lsf.eval(x,fiber=fiber,dr='12',cache=False)
+        # The LSF is NaN in the gaps between the chips
+        assert numpy.sum(numpy.isfinite(nocache[:,0])) > 0.8*len(nocache), 'LSF evaluated on the synthetic apLSF files is not finite'
+        # First call computes and caches, second call reads from disk
+        for ii in range(2):
+            cached= lsf.eval(x,fiber=fiber,dr='12',cache=True)
+            assert _equal(cached,nocache), 'LSF with cache=True differs from LSF with cache=False for fiber %s' % str(fiber)
+    cacheDir= os.path.dirname(appath.apLSFPath('a',dr='12'))
+    assert len(glob.glob(os.path.join(cacheDir,'apogee-lsf-dr12-*.npy'))) == len(fibers), 'LSFs of different fibers were not cached separately'
+    assert len(glob.glob(os.path.join(cacheDir,'*.tmp'))) == 0, 'Temporary files were left behind by the LSF cache'
+    # Different x are cached separately
+    cached= lsf.eval(numpy.linspace(-2.,2.,5),fiber=5,dr='12',cache=True)
+    assert _equal(cached,lsf.eval(numpy.linspace(-2.,2.,5),fiber=5,dr='12',
+                                  cache=False)), 'LSF with cache=True differs from LSF with cache=False for different x'
+    assert len(glob.glob(os.path.join(cacheDir,'apogee-lsf-dr12-*.npy'))) == len(fibers)+1, 'LSFs for different x were not cached separately'
+    return None
+
+@_with_lsf_fixtures
+def test_eval_bank():
+    x= numpy.linspace(-2.,2.,5)
+    try:
+        lsf.eval_bank(5,x=x,dr='12')
+    except IOError: pass
+    else: raise AssertionError('eval_bank does not raise IOError when the LSF bank has not been built')
+    bankPath= lsf.build_bank(x=x,dr='12')
+    assert os.path.exists(bankPath), 'build_bank did not write the LSF bank'
+    assert lsf.build_bank(x=x,dr='12') == bankPath, 'build_bank does not re-use the LSF bank'
+    # The bank is stored in float32
+    for fiber in [1,5,120,300]:
+        assert numpy.allclose(lsf.eval_bank(fiber,x=x,sparse=False,dr='12'),
+                              lsf.eval(x,fiber=fiber,dr='12'),
+                              rtol=1e-5,atol=1e-7,equal_nan=True), 'LSF from the bank differs from the directly evaluated LSF for fiber %i' % fiber
+    # Weighted average of fibers, each on its own wavelength solution
+    unnorm= lsf._eval_unnormalized(x,[5],'12')\
+        +3.*lsf._eval_unnormalized(x,[120],'12')
+    unnorm[unnorm<0.]= 0.
+    assert numpy.allclose(lsf.eval_bank([5,120],x=x,weights=[1.,3.],
+                                        sparse=False,dr='12'),
+                          unnorm/numpy.sum(unnorm,axis=1)[:,None],
+                          rtol=1e-5,atol=1e-7,equal_nan=True), 'Weighted LSF from the bank differs from the weighted sum of the directly evaluated LSFs'
+    # Sparse output
+    assert numpy.allclose(lsf.eval_bank(5,x=x,sparse=True,dr='12').toarray(),
+                          lsf.eval(x,fiber=5,sparse=True,dr='12').toarray(),
+                          rtol=1e-5,atol=1e-7,equal_nan=True), 'Sparse LSF from the bank differs from the directly evaluated sparse LSF'
+    return None
+
+def _gaussian_lsf(x,hires):
+    # Gaussian LSF whose width increases along the hi-res apStar grid
+    sigma= numpy.linspace(1.,1.5,len(lsf._hireswav(hires)))
+    out= numpy.exp(-0.5*x**2./sigma[:,None]**2.)
+    return out/numpy.sum(out,axis=1)[:,None]
+
+def test_convolve_operator():
+    wav= numpy.linspace(15000.,17100.,30001)
+    lines= numpy.linspace(15050.,17050.,80)
+    spec= numpy.array([1.+0.1*numpy.sin(wav/300.)\
+                           -numpy.sum(depth*numpy.exp(-0.5*(wav[:,None]-lines)**2./0.5**2.),axis=1)
+                       for depth in [0.3,0.5]])
+    x= numpy.linspace(-7.,7.,43)
+    elsf= _gaussian_lsf(x,3)
+    for vmacro in [6.,None]:
+        op= lsf.convolve_operator(wav,lsf=elsf,xlsf=x,vmacro=vmacro)
+        conv= lsf.convolve(wav,spec,lsf=elsf,xlsf=x,vmacro=vmacro)
+        assert op.shape == (8575,len(wav)), 'convolve_operator does not return an [8575,nwave] matrix'
+        # The operator interpolates locally rather than with a spline fit
+        assert numpy.amax(numpy.fabs(op.dot(spec.T).T-conv)) < 1e-4, 'convolve_operator applied to a spectrum differs from convolve for vmacro = %s' % str(vmacro)
+    return None
+
+def _resample_reference(wav,spec,newwav):
+    # Previous per-spectrum resampling in convolve
+    baseline= numpy.polynomial.Polynomial.fit(wav,spec,4)
+    ip= interpolate.InterpolatedUnivariateSpline(wav,spec/baseline(wav),k=3)
+    return baseline(newwav)*ip(newwav)
+
+def test_resample():
+    wav= numpy.sort(_RNG.uniform(15000.,17100.,size=3000))
+    spec= 1.+0.2*numpy.sin(wav/50.+_RNG.uniform(size=(3,1))*numpy.pi)\
+        +0.1*((wav-16000.)/1000.)**2.
+    newwav= numpy.linspace(15010.,17090.,5001)
+    out= lsf.resample(wav,spec,newwav)
+    assert out.shape == (3,len(newwav)), 'resample of 2-D input does not return [nspec,nnewwav] output'
+    for ii in range(3):
+        ref= _resample_reference(wav,spec[ii],newwav)
+        assert numpy.allclose(out[ii],ref,rtol=1e-10,atol=1e-10), 'resample differs from the per-spectrum polynomial and spline resampling'
+        out1d= lsf.resample(wav,spec[ii],newwav)
+        assert out1d.shape == newwav.shape, 'resample of 1-D input does not return 1-D output'
+        assert numpy.allclose(out1d,ref,rtol=1e-10,atol=1e-10), 'resample of 1-D input differs from the polynomial and spline resampling'
+    return None
+
+def _deconvolve_reference(spec,specerr,elsf,eps):
+    # Deconvolve each detector by solving the dense normal equations
+    out= numpy.zeros(len(spec))
+    for sindx, eindx in zip([140,3450,6250],[3370,6200,8450]):
+        L= lsf.sparsify(elsf[sindx:eindx]).tocsr()
+        norm= numpy.nanmean(spec[sindx:eindx])
+        tspec= spec[sindx:eindx]/norm
+        tinvspecerr= norm/specerr[sindx:eindx]
+        tinvspecerr[numpy.isnan(tspec)]= 0.
+        tspec[numpy.isnan(tspec)]= 1.
+        P= -numpy.eye(eindx-sindx)+numpy.eye(eindx-sindx,k=1)
+        P[-1,-1]= 0.
+        P= sparse.csr_matrix(P)
+        A= L.T.dot(L.multiply(tinvspecerr[:,None]**2.)).toarray()\
+            +eps*P.T.dot(P).toarray()
+        b= L.T.dot(tinvspecerr**2.*tspec)
+        out[sindx:eindx]= numpy.linalg.solve(A,b)*norm
+    return out
+
+def test_deconvolve_batch():
+    # LSF sampled at the apStar pixels, to keep the dense reference small
+    x= numpy.linspace(-3.,3.,7)
+    elsf= _gaussian_lsf(x,1)
+    wav= numpy.log10(lsf.apStarWavegrid())
+    spec= numpy.array([1.-numpy.sum(depth*numpy.exp(-0.5*(wav[:,None]-numpy.linspace(wav[0],wav[-1],300))**2./(2.*(wav[1]-wav[0]))**2.),axis=1) for depth in [0.2,0.3,0.4]])
+    spec= lsf.sparsify(elsf).dot(spec.T).T
+    specerr= 0.01*numpy.ones_like(spec)
+    spec+= specerr*_RNG.normal(size=spec.shape)
+    spec[1,[500,4000,7000]]= numpy.nan
+    batch= lsf.deconvolve_batch(spec,specerr,lsf=elsf,nthreads=2)
+    smoothed= lsf.deconvolve_batch(spec,specerr,lsf=elsf,smooth=22500.)
+    for ii in range(len(spec)):
+        single= lsf.deconvolve(spec[ii],specerr[ii],lsf=elsf)
+        assert numpy.allclose(batch[ii],single,rtol=1e-10,atol=1e-12), 'deconvolve_batch differs from deconvolve for spectrum %i' % ii
+        assert numpy.allclose(batch[ii],
+                              _deconvolve_reference(spec[ii],specerr[ii],
+                                                    elsf,2500.),
+                              rtol=1e-6,atol=1e-8), 'deconvolve_batch differs from the dense solution for spectrum %i' % ii
+        assert numpy.allclose(smoothed[ii],
+                              lsf.deconvolve(spec[ii],specerr[ii],lsf=elsf,
+                                             smooth=22500.),
+                              rtol=1e-10,atol=1e-12), 'deconvolve_batch with smooth= differs from deconvolve for spectrum %i' % ii
+    return None
+
+def _wave2pix_reference(wave,chip,fiber,dr):
+    # Previous wave2pix, which set up the interpolant on each call
+    wave0= lsf._wavepix(chip,dr=dr)[300-fiber]
+    pix0= numpy.arange(len(wave0))
+    sindx= numpy.argsort(wave0)
+    wave0= wave0[sindx]
+    pix0= pix0[sindx]
+    baseline= numpy.polynomial.Polynomial.fit(wave0,pix0,1)
+    ip= interpolate.InterpolatedUnivariateSpline(wave0,pix0/baseline(wave0),
+                                                 k=3)
+    out= baseline(wave)*ip(wave)
+    out[wave > wave0[-1]]= numpy.nan
+    out[wave < wave0[0]]= numpy.nan
+    return out
+
+def _pix2wave_reference(pix,chip,fiber,dr):
+    # Previous pix2wave, which set up the interpolant on each call
+    wave0= lsf._wavepix(chip,dr=dr)[300-fiber]
+    pix0= numpy.arange(len(wave0))
+    baseline= numpy.polynomial.Polynomial.fit(pix0,wave0,1)
+    ip= interpolate.InterpolatedUnivariateSpline(pix0,wave0/baseline(pix0),
+                                                 k=3)
+    out= baseline(pix)*ip(pix)
+    out[pix < 0]= numpy.nan
+    out[pix > 2047]= numpy.nan
+    return out
+
+@_with_lsf_fixtures
+def test_wavesolution():
+    wave= numpy.linspace(15100.,17000.,3001)
+    pix= numpy.linspace(-10.,2057.,3001)
+    max_wavesolutions= lsf._MAX_WAVESOLUTIONS
+    lsf._MAX_WAVESOLUTIONS= 4
+    try:
+        args= [(chip,fiber) for chip in ['a','b','c']
+               for fiber in [1,150,300]]*3
+        def compare(arg):
+            chip, fiber= arg
+            # Re-used and evicted interpolants agree with new ones
+            return (_equal(lsf.wave2pix(wave,chip,fiber=fiber,dr='12'),
+                           _wave2pix_reference(wave,chip,fiber,'12')),
+                    _equal(lsf.pix2wave(pix,chip,fiber=fiber,dr='12'),
+                           _pix2wave_reference(pix,chip,fiber,'12')),
+                    lsf.pix2wave(1000.,chip,fiber=fiber,dr='12') \
+                        == _pix2wave_reference(numpy.array([1000.]),
+                                               chip,fiber,'12')[0])
+        for ii,result in enumerate(map(compare,args)):
+            assert numpy.all(result), 'Memoised wave2pix or pix2wave differs from the interpolant set up on each call for chip %s, fiber %i' % args[ii]
+        assert len(lsf._WAVESOLUTIONS) <= 4, 'Number of memoised wavelength solutions exceeds _MAX_WAVESOLUTIONS'
+        # Many threads that share the memoised interpolants
+        pool= ThreadPool(8)
+        try:
+            results= pool.map(compare,args*4)
+        finally:
+            pool.terminate()
+        assert numpy.all(results), 'Memoised wave2pix or pix2wave differs from the interpolant set up on each call when used in multiple threads'
+        assert len(lsf._WAVESOLUTIONS) <= 4, 'Number of memoised wavelength solutions exceeds _MAX_WAVESOLUTIONS when used in multiple threads'
+    finally:
+        lsf._MAX_WAVESOLUTIONS= max_wavesolutions
+    return None
+
+@_with_lsf_fixtures
+def test_convolve_cache():
+    # convolve only caches the LSF that it evaluates when asked to
+    wav= numpy.linspace(15000.,17100.,20001)
+    spec= 1.+0.1*numpy.sin(wav/3.)
+    cacheDir= os.path.dirname(appath.apLSFPath('a',dr='12'))
+    nocache= lsf.convolve(wav,spec,fiber=[5,120])
+    assert len(glob.glob(os.path.join(cacheDir,'apogee-lsf-*.npy'))) == 0, 'convolve caches the LSF on disk when cache=False'
+    for ii in range(2):
+        cached= lsf.convolve(wav,spec,fiber=[5,120],cache=True)
+        assert _equal(cached,nocache), 'convolve with cache=True differs from convolve with cache=False'
+    assert len(glob.glob(os.path.join(cacheDir,'apogee-lsf-*.npy'))) == 1, 'convolve does not cache the LSF on disk when cache=True'
+    return None
+
+@_with_lsf_fixtures
+def test_convolve_bank():
+    # convolve only looks up the LSF in the bank when asked to, also when
+    # the bank exists
+    wav= numpy.linspace(15000.,17100.,20001)
+    spec= 1.+0.1*numpy.sin(wav/3.)
+    nobank= lsf.convolve(wav,spec,fiber=5)
+    x= numpy.linspace(-7.,7.,43)
+    numpy.save(lsf._bank_path(x,'12'),numpy.zeros((300,1,len(x)),
+                                                   dtype='float32'))
+    calls= []
+    eval_bank= lsf.eval_bank
+    def eval_bank_spy(fiber='combo',x=None,**kwargs):
+        # Record the call and return the directly evaluated LSF
+        calls.append(fiber)
+        return lsf.eval(x,fiber=fiber,sparse=True)
+    lsf.eval_bank= eval_bank_spy
+    try:
+        assert _equal(lsf.convolve(wav,spec,fiber=5),nobank), 'convolve changes when an LSF bank exists'
+        assert len(calls) == 0, 'convolve looks up the LSF in the bank when bank=False'
+        assert _equal(lsf.convolve(wav,spec,fiber=5,bank=True),nobank), 'convolve with bank=True does not use the LSF from the bank'
+        assert calls == [5], 'convolve does not look up the LSF in the bank when bank=True'
+    finally:
+        lsf.eval_bank= eval_bank
+    return None
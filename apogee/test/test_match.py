@@ -0,0 +1,64 @@
+# Tests of the cached cross-match in apogee.tools.match
+import os, os.path
+import shutil
+import tempfile
+import numpy
+from apogee.tools import path as appath
+from apogee.tools import match
+_RNG= numpy.random.RandomState(4)
+_RA2= _RNG.uniform(size=500)
+_DEC2= _RNG.uniform(size=500)
+_RA1= _RA2[::3]+_RNG.normal(size=len(_RA2[::3]))/3600.
+_DEC1= _DEC2[::3]+_RNG.normal(size=len(_DEC2[::3]))/3600.
+
+def _with_tmp_cache(test):
+    # Run the test with the cache directory in a temporary directory
+    def inner():
+        tmpdir= tempfile.mkdtemp()
+        apogee_data= appath._APOGEE_DATA
+        appath._APOGEE_DATA= tmpdir
+        try:
+            test()
+        finally:
+            appath._APOGEE_DATA= apogee_data
+            match.clear_cache()
+            shutil.rmtree(tmpdir)
+    inner.__name__= test.__name__
+    return inner
+
+@_with_tmp_cache
+def test_match_cache():
+    for maxmatch in [1,0]:
+        nocache= match.match(_RA1,_DEC1,_RA2,_DEC2,3./3600.,
+                             maxmatch=maxmatch,cache=False)
+        assert len(nocache[0]) > 0, 'No matches found'
+        # First call computes and caches, second call reads from disk
+        for ii in range(2):
+            cached= match.match(_RA1,_DEC1,_RA2,_DEC2,3./3600.,
+                                maxmatch=maxmatch,cache=True)
+            for a,b in zip(nocache,cached):
+                assert numpy.all(a == b), 'Cached match differs from uncached match'
+    assert len(match._cached_matches()) == 2, 'Matches with different maxmatch were not cached separately'
+    match.clear_cache(disk=True)
+    assert len(match._cached_matches()) == 0, 'clear_cache(disk=True) does not remove the matches cached on disk'
+    return None
+
+@_with_tmp_cache
+def test_match_cache_max():
+    max_cached= match._MAX_CACHED_MATCHES
+    match._MAX_CACHED_MATCHES= 3
+    try:
+        newFilenames= []
+        for ii in range(5):
+            # Age the existing matches, such that the new one is the newest
+            for cacheFilename in match._cached_matches():
+                mtime= os.path.getmtime(cacheFilename)-10.
+                os.utime(cacheFilename,(mtime,mtime))
+            before= set(match._cached_matches())
+            match.match(_RA1,_DEC1,_RA2,_DEC2,(ii+1.)/3600.)
+            newFilenames.extend(set(match._cached_matches())-before)
+        assert len(newFilenames) == 5, 'Each match was not cached'
+        assert sorted(match._cached_matches()) == sorted(newFilenames[2:]), 'The least recently used matches are not the ones removed from the disk cache'
+    finally:
+        match._MAX_CACHED_MATCHES= max_cached
+    return None
@@ -0,0 +1,86 @@
+# Tests of apogee.modelspec
+import numpy
+from scipy import special
+import apogee.tools.read as apread
+from apogee.tools import path as appath
+from apogee.spec import lsf
+from apogee.spec.wavegrid import apStarWavegrid
+from apogee import modelspec
+from _util import with_tmp_mirror, write_spec_fixtures
+
+def _vmacro_reference(x,vmacro=6.,sparse=False,norm=True):
+    # Previous vmacro, which computed the kernel for each pixel center
+    sigvm= vmacro/3./10.**5./2./numpy.sqrt(2.*numpy.log(2.))
+    hires= int(round(1./(x[1]-x[0])))
+    l10wav= numpy.log10(apStarWavegrid())
+    dowav= l10wav[1]-l10wav[0]
+    hireswav= 10.**numpy.arange(l10wav[0],l10wav[-1]+dowav/hires,dowav/hires)
+    lam= numpy.tile(hireswav,(len(x),1)).T
+    dlam= 10.**(numpy.tile(numpy.log10(hireswav),(len(x),1)).T\
+                    +numpy.tile(x,(len(hireswav),1))*dowav)/lam-1.
+    u= numpy.fabs(dlam/sigvm)
+    out= 2./numpy.sqrt(numpy.pi)*u\
+        *(numpy.exp(-u**2.)/u-numpy.sqrt(numpy.pi)*special.erfc(u))
+    out[dlam == 0.]= 2./numpy.sqrt(numpy.pi)
+    out*= (1.+dlam)*numpy.log(10.)/sigvm
+    if norm: out/= numpy.tile(numpy.sum(out,axis=1),(len(x),1)).T
+    if sparse: out= lsf.sparsify(out)
+    return out
+
+def test_vmacro():
+    modelspec._VMACRO_CACHE.clear()
+    for x in [numpy.linspace(-7.,7.,43),numpy.linspace(-3.,3.,7)]:
+        for vm in [3.,6.]:
+            for norm in [True,False]:
+                ref= _vmacro_reference(x,vmacro=vm,norm=norm)
+                out= modelspec.vmacro(x,vmacro=vm,norm=norm)
+                assert numpy.allclose(out,ref,rtol=1e-8,atol=1e-10*numpy.amax(ref)), 'vmacro differs from the kernel computed for each pixel center for vmacro = %g, norm = %s' % (vm,norm)
+                out= modelspec.vmacro(x,vmacro=vm,norm=norm,sparse=True)
+                diff= (out-lsf.sparsify(ref)).tocsr().data
+                assert numpy.all(numpy.fabs(diff) < 1e-10*numpy.amax(ref)), 'Sparse vmacro differs from the sparsified kernel computed for each pixel center for vmacro = %g, norm = %s' % (vm,norm)
+    assert len(modelspec._VMACRO_CACHE) == modelspec._MAX_VMACRO_CACHE, 'vmacro cache does not hold the most recently used kernels'
+    return None
+
+def test_vmacro_cache():
+    modelspec._VMACRO_CACHE.clear()
+    x= numpy.linspace(-7.,7.,43)
+    dense= modelspec.vmacro(x)
+    expected= dense.copy()
+    dense2= modelspec.vmacro(x)
+    assert len(modelspec._VMACRO_CACHE) == 1, 'vmacro does not cache the dense kernel once'
+    assert numpy.all(dense2 == dense), 'Cached dense vmacro kernel differs from the first one'
+    # Modifying a returned dense kernel does not change the cached one
+    dense[0,0]= -1.
+    dense2*= 2.
+    assert numpy.all(modelspec.vmacro(x) == expected), 'Modifying the returned dense vmacro kernel changes the cached kernel'
+    sp= modelspec.vmacro(x,sparse=True)
+    expected= sp.copy()
+    assert len(modelspec._VMACRO_CACHE) == 2, 'vmacro does not cache the sparse kernel'
+    sp2= modelspec.vmacro(x,sparse=True)
+    assert len(modelspec._VMACRO_CACHE) == 2, 'vmacro does not re-use the cached sparse kernel'
+    assert (sp != sp2).nnz == 0, 'Cached sparse vmacro kernel differs from the first one'
+    # Modifying a returned sparse kernel does not change the cached one
+    sp.data*= 2.
+    sp2.data*= 3.
+    assert (modelspec.vmacro(x,sparse=True) != expected).nnz == 0, 'Modifying the returned sparse vmacro kernel changes the cached kernel'
+    return None
+
+@with_tmp_mirror
+def test_specFitInput_ids():
+    # Spectra given by ID are read on the ASPCAP grid of the default DR
+    @modelspec.specFitInput
+    def parsed(spec,specerr): return (spec,specerr)
+    redux= appath._APOGEE_REDUX
+    try:
+        for dr,tredux,npix in [('12',appath._DR12REDUX,7214),
+                               ('current',appath._CURRENTREDUX,7514)]:
+            appath._APOGEE_REDUX= tredux
+            loc_ids, apogee_ids= write_spec_fixtures(3,dr=dr)
+            spec, specerr= parsed(loc_ids,apogee_ids)
+            assert spec.shape == (3,npix) and specerr.shape == (3,npix), 'specFitInput does not read spectra given by ID on the ASPCAP grid of DR%s' % dr
+            for ii,(loc_id,apogee_id) in enumerate(zip(loc_ids,apogee_ids)):
+                assert numpy.all(spec[ii] == apread.aspcapStar(loc_id,apogee_id,ext=1,dr=dr,header=False)), 'specFitInput spectrum differs from that read by aspcapStar'
+                assert numpy.all(specerr[ii] == apread.aspcapStar(loc_id,apogee_id,ext=2,dr=dr,header=False)), 'specFitInput error differs from that read by aspcapStar'
+    finally:
+        appath._APOGEE_REDUX= redux
+    return None
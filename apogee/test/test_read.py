@@ -0,0 +1,204 @@
+# Tests of apogee.tools.read that do not require any downloaded data
+import os, os.path
+import shutil
+import tempfile
+import numpy
+import esutil
+import fitsio
+import apogee.tools.read as apread
+from apogee.tools.catalog import CatalogArray
+from apogee.tools import bitmask
+from apogee.spec import wavegrid
+from _util import with_tmp_mirror, write_spec_fixtures
+_RNG= numpy.random.RandomState(5)
+
+def _allStar_with_duplicates(ngroup=200):
+    # Synthetic allStar data with groups of 1 to 4 entries that are within
+    # 1 arcsec of each other; groups are far apart
+    ndup= _RNG.randint(1,5,size=ngroup)
+    out= numpy.zeros(numpy.sum(ndup),
+                     dtype=[('APSTAR_ID','S30'),('RA','f8'),('DEC','f8'),
+                            ('SNR','f4'),('AK_TARG','f8')])
+    group= numpy.repeat(numpy.arange(ngroup),ndup)
+    out['RA']= (group*0.01+_RNG.uniform(size=len(out))*0.5/3600.)
+    out['DEC']= (group*0.01+_RNG.uniform(size=len(out))*0.5/3600.)
+    out['SNR']= _RNG.permutation(len(out))+1.
+    out['APSTAR_ID']= numpy.where(_RNG.uniform(size=len(out)) < 0.3,
+                                  'apogee.n.c.s3.x','apogee.n.s.s3.x')
+    out['AK_TARG']= _RNG.uniform(size=len(out))
+    out['AK_TARG'][_RNG.uniform(size=len(out)) < 0.2]= -9999.
+    out['AK_TARG'][_RNG.uniform(size=len(out)) < 0.1]= numpy.nan
+    return out
+
+def _duplicate_keep_index_loop(data):
+    # Reference implementation: one match per duplicate
+    tdata= numpy.copy(data)
+    h=esutil.htm.HTM()
+    m1,m2,d12 = h.match(data['RA'],data['DEC'],
+                        data['RA'],data['DEC'],
+                        2./3600.,maxmatch=0)
+    sm1= numpy.sort(m1)
+    dup= sm1[1:] == sm1[:-1]
+    for d in sm1[:-1][dup]:
+        nm1,nm2,nd12= h.match(data['RA'][d],data['DEC'][d],
+                              data['RA'],data['DEC'],
+                              2./3600.,maxmatch=0)
+        comindx= numpy.array(['apogee.n.c' in s for s in data['APSTAR_ID'][nm2]])
+        comindx+= numpy.array(['apogee.s.c' in s for s in data['APSTAR_ID'][nm2]])
+        goodak= (True-numpy.isnan(data['AK_TARG'][nm2]))\
+            *(data['AK_TARG'][nm2] > -50.)
+        hisnr= numpy.argmax(data['SNR'][nm2]*(True-comindx)*goodak)
+        if numpy.amax(data['SNR'][nm2]*(True-comindx)*goodak) == 0.:
+            hisnr= numpy.argmax(data['SNR'][nm2])
+        tindx= numpy.ones(len(nm2),dtype='bool')
+        tindx[hisnr]= False
+        tdata['RA'][nm2[tindx]]= -9999
+    return tdata['RA'] != -9999
+
+def test_remove_duplicates():
+    data= _allStar_with_duplicates()
+    keep= apread._duplicate_keep_index(data)
+    assert numpy.sum(True-keep) > 0, 'Synthetic data does not contain any duplicates'
+    assert numpy.all(keep == _duplicate_keep_index_loop(data)), 'Vectorized removal of duplicates does not keep the same entries as the loop over duplicates'
+    assert numpy.all(apread.remove_duplicates(data)['SNR'] == data['SNR'][keep]), 'remove_duplicates does not return the entries kept by _duplicate_keep_index'
+    # The cached index gives the same result and is re-used
+    tmpdir= tempfile.mkdtemp()
+    try:
+        filePath= os.path.join(tmpdir,'allStar-test.fits')
+        fitsio.write(filePath,data)
+        assert numpy.all(apread._duplicate_keep_index_cached(filePath) == keep), 'Cached index of duplicates differs from the direct computation'
+        assert os.path.exists(filePath.replace('.fits','-dups.npz')), 'Index of duplicates was not cached'
+        assert numpy.all(apread._duplicate_keep_index_cached(filePath) == keep), 'Index of duplicates read from the cache differs from the direct computation'
+    finally:
+        shutil.rmtree(tmpdir)
+    return None
+
+@with_tmp_mirror
+def test_spec_cache():
+    loc_ids, apogee_ids= write_spec_fixtures(3)
+    spec= [apread.aspcapStar(loc_id,apogee_id,dr='12',header=False)
+           for loc_id,apogee_id in zip(loc_ids,apogee_ids)]
+    apread.enable_spec_cache(maxsize=2.5*spec[0].nbytes/2.**20)
+    try:
+        # Positional, keyword, and mixed calls share the same entry
+        out= apread.aspcapStar(loc_ids[0],apogee_ids[0],1,'12',False)
+        assert numpy.all(out == spec[0]), 'Cached read returns a different spectrum'
+        assert not out.flags.writeable, 'Spectrum returned by the cache is writeable'
+        assert apread.aspcapStar(loc_id=loc_ids[0],apogee_id=apogee_ids[0],
+                                 dr='12',header=False) is out, 'Keyword call does not hit the cache'
+        assert apread.aspcapStar(loc_ids[0],apogee_id=apogee_ids[0],ext=1,
+                                 header=False,dr='12') is out, 'Mixed positional/keyword call does not hit the cache'
+        info= apread.spec_cache_info()
+        assert info['hits'] == 2 and info['misses'] == 1 and info['nentries'] == 1, 'spec_cache_info does not count hits and misses correctly'
+        # Different arguments are different entries
+        err= apread.aspcapStar(loc_ids[0],apogee_ids[0],ext=2,dr='12',
+                               header=False)
+        assert not numpy.all(err == out), 'Different extension hits the cache entry of another extension'
+        assert apread.spec_cache_info()['misses'] == 2, 'Different extension does not miss the cache'
+        # Least recently used entry is evicted: the cache holds two spectra
+        apread.aspcapStar(loc_ids[0],apogee_ids[0],dr='12',header=False)
+        apread.aspcapStar(loc_ids[1],apogee_ids[1],dr='12',header=False)
+        info= apread.spec_cache_info()
+        assert info['nentries'] == 2 and info['size'] <= info['maxsize'], 'Cache is not limited to its maximum size'
+        apread.aspcapStar(loc_ids[1],apogee_ids[1],dr='12',header=False)
+        apread.aspcapStar(loc_ids[0],apogee_ids[0],dr='12',header=False)
+        assert apread.spec_cache_info()['misses'] == 3, 'Most recently used entries were evicted from the cache'
+        apread.aspcapStar(loc_ids[0],apogee_ids[0],ext=2,dr='12',
+                          header=False)
+        assert apread.spec_cache_info()['misses'] == 4, 'Least recently used entry was not evicted from the cache'
+        # Header is cached along with the data
+        data,hdr= apread.aspcapStar(loc_ids[2],apogee_ids[2],dr='12')
+        assert numpy.all(data == spec[2]) and not data.flags.writeable, 'Cached read with header does not return the read-only spectrum'
+        assert apread.aspcapStar(loc_ids[2],apogee_ids[2],dr='12')[0] is data, 'Read with header does not hit the cache'
+    finally:
+        apread.disable_spec_cache()
+    assert apread.spec_cache_info()['nentries'] == 0, 'disable_spec_cache does not empty the cache'
+    return None
+
+def test_dereddened():
+    data= numpy.zeros(100,dtype=[('J','f4'),('H','f4'),('K','f4'),
+                                 ('AK_TARG','f8'),('AK_WISE','f4')])
+    for band in 'JHK': data[band]= _RNG.uniform(8.,12.,size=len(data))
+    for aktag in ['AK_TARG','AK_WISE']:
+        data[aktag]= _RNG.uniform(0.,1.,size=len(data))
+        data[aktag][::7]= -9999.
+    for aktag in ['AK_TARG','AK_WISE']:
+        # Reference: float64 columns filled like the original allStar
+        ref= numpy.zeros(len(data),dtype='f8')
+        for band,fac in zip('JHK',[2.5,1.55,1.]):
+            ref[:]= data[band]-data[aktag]*fac
+            ref[data[aktag] <= -50.]= -9999.9999
+            for lazy in [False,True]:
+                if lazy: tdata= CatalogArray(data)
+                else: tdata= data
+                out= apread._add_dereddened(tdata,aktag)['%s0' % band]
+                assert out.dtype == numpy.dtype('f8'), 'Dereddened %s magnitude is not float64' % band
+                assert numpy.all(out == ref), 'Dereddened %s magnitude differs from the float64 computation (%s)' % (band,aktag)
+                assert numpy.all(out[::7] == -9999.9999), 'Dereddened %s magnitude for bad AK is not -9999.9999' % band
+    return None
+
+def _combined(data):
+    # Combined spectrum of an apStar file with one or more visits
+    if len(data.shape) == 2: return data[0]
+    else: return data
+
+@with_tmp_mirror
+def test_specBatch():
+    loc_ids, apogee_ids= write_spec_fixtures(5)
+    grid= wavegrid.aspcapWavegrid(dr='12')
+    for aspcapWavegrid in [False,True]:
+        for maskmode in ['inflate','nan']:
+            # apStar
+            spec,specerr,mask= apread.apStarBatch(loc_ids,apogee_ids,dr='12',
+                                                  maskmode=maskmode,
+                                                  aspcapWavegrid=aspcapWavegrid,
+                                                  nthreads=2)
+            for ii,(loc_id,apogee_id) in enumerate(zip(loc_ids,apogee_ids)):
+                tspec, terr, tmask= [_combined(apread.apStar(loc_id,apogee_id,
+                                                             ext=ext,dr='12',
+                                                             header=False,
+                                                             aspcapWavegrid=aspcapWavegrid))
+                                     for ext in [1,2,3]]
+                masked= (tmask & bitmask.BADPIXMASK) != 0
+                assert numpy.sum(masked) > 0 and numpy.sum(True-masked) > 0, 'Synthetic mask does not contain masked and unmasked pixels'
+                assert numpy.all(mask[ii] == tmask), 'apStarBatch mask differs from that read by apStar'
+                assert numpy.all(spec[ii][True-masked] == tspec[True-masked]), 'apStarBatch spectrum differs from that read by apStar'
+                assert numpy.all(specerr[ii][True-masked] == terr[True-masked]), 'apStarBatch error differs from that read by apStar'
+                if maskmode == 'inflate':
+                    assert numpy.all(specerr[ii][masked] == apread._BIGERR), 'apStarBatch does not inflate the errors of masked pixels'
+                    assert numpy.all(spec[ii][masked] == tspec[masked]), 'apStarBatch changes the spectrum of masked pixels when inflating errors'
+                else:
+                    assert numpy.all(numpy.isnan(specerr[ii][masked])) and numpy.all(numpy.isnan(spec[ii][masked])), 'apStarBatch does not set masked pixels to NaN'
+            # aspcapStar, masked using the apStar mask
+            spec,specerr= apread.aspcapStarBatch(loc_ids,apogee_ids,dr='12',
+                                                 pixmask=bitmask.BADPIXMASK,
+                                                 maskmode=maskmode,
+                                                 aspcapWavegrid=aspcapWavegrid,
+                                                 nthreads=2)
+            for ii,(loc_id,apogee_id) in enumerate(zip(loc_ids,apogee_ids)):
+                tspec, terr= [apread.aspcapStar(loc_id,apogee_id,ext=ext,
+                                                dr='12',header=False)
+                              for ext in [1,2]]
+                tmask= _combined(apread.apStar(loc_id,apogee_id,ext=3,
+                                               dr='12',header=False))
+                if aspcapWavegrid:
+                    tmask= grid.toAspcap(tmask)
+                else:
+                    tspec= grid.toApStar(tspec,fill=numpy.nan)
+                    terr= grid.toApStar(terr,fill=apread._BIGERR)
+                masked= (tmask & bitmask.BADPIXMASK) != 0
+                good= (True-masked)*(True-numpy.isnan(tspec))
+                assert numpy.all(spec[ii][good] == tspec[good]), 'aspcapStarBatch spectrum differs from that read by aspcapStar'
+                assert numpy.all(specerr[ii][good] == terr[good]), 'aspcapStarBatch error differs from that read by aspcapStar'
+                if maskmode == 'inflate':
+                    assert numpy.all(specerr[ii][masked] == apread._BIGERR), 'aspcapStarBatch does not inflate the errors of masked pixels'
+                else:
+                    assert numpy.all(numpy.isnan(specerr[ii][masked])), 'aspcapStarBatch does not set masked pixels to NaN'
+                if not aspcapWavegrid:
+                    assert numpy.all(numpy.isnan(spec[ii][:grid.apStarSlices[0].start])), 'aspcapStarBatch spectrum on the apStar grid is not NaN outside of the ASPCAP grid'
+    # Unmasked aspcapStar batch is just the spectra
+    spec,specerr= apread.aspcapStarBatch(loc_ids,apogee_ids,dr='12',
+                                         aspcapWavegrid=True)
+    for ii,(loc_id,apogee_id) in enumerate(zip(loc_ids,apogee_ids)):
+        assert numpy.all(spec[ii] == apread.aspcapStar(loc_id,apogee_id,dr='12',header=False)), 'Unmasked aspcapStarBatch spectrum differs from that read by aspcapStar'
+    return None
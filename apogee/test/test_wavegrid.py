@@ -0,0 +1,49 @@
+# Tests of the conversion between the apStar and ASPCAP wavelength grids
+import numpy
+from apogee.spec import wavegrid
+_SPEC= numpy.random.RandomState(1).uniform(size=(5,8575))
+
+def test_toAspcap():
+    for dr,npix in [('12',7214),('13',7514)]:
+        grid= wavegrid.aspcapWavegrid(dr=dr)
+        assert grid.npix == npix, 'ASPCAP grid for DR%s does not have %i pixels' % (dr,npix)
+        out= grid.toAspcap(_SPEC)
+        assert out.shape == (5,npix), 'toAspcap does not return an (nspec,npix) array'
+        assert numpy.all(out[1] == grid.toAspcap(_SPEC[1])), 'toAspcap does not give the same result for a single spectrum'
+        assert numpy.all(out == numpy.hstack([_SPEC[:,s] for s in grid.apStarSlices])), 'toAspcap does not concatenate the detectors'
+        assert grid.toAspcap(out) is out, 'toAspcap does not return a spectrum that is already on the ASPCAP grid as is'
+        buf= numpy.empty((5,npix))
+        assert grid.toAspcap(_SPEC,out=buf) is buf, 'toAspcap does not write into out='
+        assert numpy.all(buf == out), 'toAspcap does not write the correct spectrum into out='
+    return None
+
+def test_toApStar():
+    for npix in [7214,7514]:
+        grid= wavegrid.aspcapWavegrid(npix=npix)
+        out= grid.toApStar(grid.toAspcap(_SPEC),fill=numpy.nan)
+        assert out.shape == _SPEC.shape, 'toApStar does not return an (nspec,8575) array'
+        ongrid= numpy.zeros(8575,dtype='bool')
+        for s in grid.apStarSlices: ongrid[s]= True
+        assert numpy.all(out[:,ongrid] == _SPEC[:,ongrid]), 'toApStar does not put the spectrum back in the right pixels'
+        assert numpy.all(numpy.isnan(out[:,True-ongrid])), 'toApStar does not fill the detector gaps'
+    try:
+        wavegrid.aspcapWavegrid(npix=7000)
+    except ValueError: pass
+    else: raise AssertionError('aspcapWavegrid with an unknown number of pixels should raise ValueError')
+    return None
+
+def test_default_dr():
+    # Without dr or npix, the grid of the default data release is used
+    from apogee.tools import path, toAspcapGrid, toApStarGrid
+    redux= path._APOGEE_REDUX
+    try:
+        for tredux,npix in [(path._DR12REDUX,7214),(path._DR13REDUX,7514)]:
+            path._APOGEE_REDUX= tredux
+            assert wavegrid.aspcapWavegrid().npix == npix, 'aspcapWavegrid does not default to the grid of the default data release'
+            out= toAspcapGrid(_SPEC)
+            assert out.shape == (5,npix), 'toAspcapGrid does not default to the grid of the default data release'
+            assert numpy.all(toApStarGrid(out) \
+                                 == wavegrid.aspcapWavegrid().toApStar(out)), 'toApStarGrid does not map back onto the grid of the default data release'
+    finally:
+        path._APOGEE_REDUX= redux
+    return None
@@ -3,6 +3,7 @@ import numpy
 from scipy import optimize
 import path as appath
 import download as download
+import apogee.spec.wavegrid as apwavegrid
 import fitsio
 from periodictable import elements
 try:
@@ -119,35 +120,29 @@ def air2vac(wave,sdssweb=False):
     return optimize.brentq(lambda x: vac2air(x,sdssweb=sdssweb)-wave,
                            wave-20,wave+20.)
 
-def toAspcapGrid(spec):
+def toAspcapGrid(spec,dr=None,out=None):
     """
     NAME:
        toAspcapGrid
     PURPOSE:
        convert a spectrum from apStar grid to the ASPCAP grid (w/o the detector gaps)
     INPUT:
-       spec - spectrum (or whatever) on the apStar grid; either (nwave) or (nspec,nwave)
+       spec - spectrum (or whatever) on the apStar grid; either (nwave) or (nspec,nwave); a spectrum that is already on an ASPCAP grid is returned as is
+       dr= (None) data release, which sets the ASPCAP grid (default: the default data release for spectra on the apStar grid)
+       out= (None) if set, array of shape (...,npix) to write the output into
     OUTPUT:
        spectrum (or whatever) on the ASPCAP grid
     HISTORY:
        2015-02-17 - Written - Bovy (IAS)
+       2026-10-18 - Use the precomputed grid mapping in apogee.spec.wavegrid; added dr and out keywords - Bovy (IAS)
     """
-    if len(spec.shape) == 2: # (nspec,nwave)
-        out= numpy.zeros((spec.shape[0],7214),dtype=spec.dtype)
-        oneSpec= False
-    else:
-        oneSpec= True
-        out= numpy.zeros((1,7214),dtype=spec.dtype)
-        spec= numpy.reshape(spec,(1,len(spec)))
-    out[:,:2920]= spec[:,322:3242]
-    out[:,2920:5320]= spec[:,3648:6048]
-    out[:,5320:]= spec[:,6412:8306]
-    if oneSpec:
-        return out[0]
-    else:
-        return out
+    spec= numpy.asarray(spec)
+    if dr is None and spec.shape[-1] != apwavegrid._NLAMBDA:
+        return apwavegrid.aspcapWavegrid(npix=spec.shape[-1])\
+            .toAspcap(spec,out=out)
+    return apwavegrid.aspcapWavegrid(dr=dr).toAspcap(spec,out=out)
 
-def toApStarGrid(spec):
+def toApStarGrid(spec,dr=None,out=None):
     """
     NAME:
        toApStarGrid
@@ -155,22 +150,20 @@ def toApStarGrid(spec):
        convert a spectrum from the ASPCAP grid (w/o the detector gaps) to the apStar grid
     INPUT:
        spec - spectrum (or whatever) on the ASPCAP grid; either (nwave) or (nspec,nwave)
+       dr= (None) data release, which sets the ASPCAP grid (default: determined from the length of the spectrum; the default data release for spectra that are already on the apStar grid)
+       out= (None) if set, array of shape (...,8575) to write the output into
     OUTPUT:
-       spectrum (or whatever) on the apStar grid
+       spectrum (or whatever) on the apStar grid (zero in the detector gaps)
     HISTORY:
        2015-02-17 - Written - Bovy (IAS)
+       2026-10-18 - Use the precomputed grid mapping in apogee.spec.wavegrid; added dr and out keywords - Bovy (IAS)
     """
-    if len(spec.shape) == 2: # (nspec,nwave)
-        out= numpy.zeros((spec.shape[0],8575),dtype=spec.dtype)
-        oneSpec= False
-    else:
-        oneSpec= True
-        out= numpy.zeros((1,8575),dtype=spec.dtype)
-        spec= numpy.reshape(spec,(1,len(spec)))
-    out[:,322:3242]= spec[:,:2920]
-    out[:,3648:6048]= spec[:,2920:5320]
-    out[:,6412:8306]= spec[:,5320:]
-    if oneSpec:
-        return out[0]
+    spec= numpy.asarray(spec)
+    if dr is None:
+        if spec.shape[-1] == apwavegrid._NLAMBDA:
+            grid= apwavegrid.aspcapWavegrid()
+        else:
+            grid= apwavegrid.aspcapWavegrid(npix=spec.shape[-1])
     else:
-        return out
+        grid= apwavegrid.aspcapWavegrid(dr=dr)
+    return grid.toApStar(spec,out=out)
@@ -3,6 +3,8 @@
 #   apogee.tools.bitmask: tools to work with APOGEE bitmasks
 #
 ###############################################################################
+import re
+import numpy
 APOGEE_TARGET1={0:"APOGEE_FAINT",
                 1:"APOGEE_MEDIUM",
                 2:"APOGEE_BRIGHT",
@@ -63,13 +65,44 @@ APOGEE_PIXMASK={0:"BADPIX",
                 12:"SIG_SKYLINE",
                 13:"SIG_TELLURIC",
                 14:"NOT_ENOUGH_PSF"}
+APOGEE_ASPCAPFLAG={0:"TEFF_WARN",
+                   1:"LOGG_WARN",
+                   2:"VMICRO_WARN",
+                   3:"M_H_WARN",
+                   4:"ALPHA_M_WARN",
+                   5:"C_M_WARN",
+                   6:"N_M_WARN",
+                   7:"STAR_WARN",
+                   8:"CHI2_WARN",
+                   9:"COLORTE_WARN",
+                   10:"ROTATION_WARN",
+                   11:"SN_WARN",
+                   16:"TEFF_BAD",
+                   17:"LOGG_BAD",
+                   18:"VMICRO_BAD",
+                   19:"M_H_BAD",
+                   20:"ALPHA_M_BAD",
+                   21:"C_M_BAD",
+                   22:"N_M_BAD",
+                   23:"STAR_BAD",
+                   24:"CHI2_BAD",
+                   25:"COLORTE_BAD",
+                   26:"ROTATION_BAD",
+                   27:"SN_BAD",
+                   31:"NO_ASPCAP_RESULT"}
 APOGEE_TARGET1_STR= dict((value, key) for key, value in APOGEE_TARGET1.iteritems())
 APOGEE_TARGET2_STR= dict((value, key) for key, value in APOGEE_TARGET2.iteritems())
 APOGEE_PIXMASK_STR= dict((value, key) for key, value in APOGEE_PIXMASK.iteritems())
+APOGEE_ASPCAPFLAG_STR= dict((value, key) for key, value in APOGEE_ASPCAPFLAG.iteritems())
 BADPIXMASK= 2**APOGEE_PIXMASK_STR["BADPIX"]+2**APOGEE_PIXMASK_STR["CRPIX"]\
     +2**APOGEE_PIXMASK_STR["SATPIX"]+2**APOGEE_PIXMASK_STR["UNFIXABLE"]\
     +2**APOGEE_PIXMASK_STR["BADDARK"]+2**APOGEE_PIXMASK_STR["BADFLAT"]\
     +2**APOGEE_PIXMASK_STR["BADERR"]+2**APOGEE_PIXMASK_STR["NOSKY"]
+_BITMASKS= {'APOGEE_TARGET1':(APOGEE_TARGET1,APOGEE_TARGET1_STR),
+            'APOGEE_TARGET2':(APOGEE_TARGET2,APOGEE_TARGET2_STR),
+            'APOGEE_PIXMASK':(APOGEE_PIXMASK,APOGEE_PIXMASK_STR),
+            'APOGEE_ASPCAPFLAG':(APOGEE_ASPCAPFLAG,APOGEE_ASPCAPFLAG_STR)}
+_CLAUSE_RE= re.compile(r'^(any|all|none)\s*of\s+(.+)$',re.IGNORECASE)
 def apogee_target1_string(bit):
     """
     NAME:
@@ -124,6 +157,24 @@ def apogee_pixmask_string(bit):
     except KeyError:
         raise KeyError("bit %i not recognized as an apogee_pixmask bit" % bit)
 
+def apogee_aspcapflag_string(bit):
+    """
+    NAME:
+       apogee_aspcapflag_string
+    PURPOSE:
+       return the string name of an APOGEE_ASPCAPFLAG bit
+    INPUT:
+       bit - the bit (integer between 0 and 31)
+    OUTPUT:
+       string name
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    try:
+        return APOGEE_ASPCAPFLAG[bit]
+    except KeyError:
+        raise KeyError("bit %i not recognized as an apogee_aspcapflag bit" % bit)
+
 def apogee_target1_int(bitname):
     """
     NAME:
@@ -178,6 +229,24 @@ def apogee_pixmask_int(bitname):
     except KeyError:
         raise KeyError("bit name %s not recognized as an apogee_pixmask bit" % bitname)
 
+def apogee_aspcapflag_int(bitname):
+    """
+    NAME:
+       apogee_aspcapflag_int
+    PURPOSE:
+       return the bit of an APOGEE_ASPCAPFLAG string
+    INPUT:
+       bitname - name of the bit (like 'STAR_BAD')
+    OUTPUT:
+       the bit (integer between 0 and 31)
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    try:
+        return APOGEE_ASPCAPFLAG_STR[bitname]
+    except KeyError:
+        raise KeyError("bit name %s not recognized as an apogee_aspcapflag bit" % bitname)
+
 def bits_set(bits):
     """
     NAME:
@@ -190,10 +259,9 @@ def bits_set(bits):
        list of bits set
     HISTORY:
        2014-08-19 - Written - Bovy (IAS)
+       2026-10-18 - Use bit shifts rather than the binary string - Bovy (IAS)
     """
-    bin= bitmask_to_binary(bits,32)
-    bin= [int(i) for i in list(bin)]
-    return [b for ii,b in enumerate(range(31,-1,-1)) if bin[ii] == 1][::-1]
+    return [b for b in range(32) if (bits >> b) & 1]
 
 def bit_set(bit,bits):
     """
@@ -240,3 +308,102 @@ def badpixmask():
        2015-08-29 - Written - Bovy (UofT)
     """
     return BADPIXMASK
+
+def decode(bits,nbits=32):
+    """
+    NAME:
+       decode
+    PURPOSE:
+       decode an array of bitmask values into a boolean array of which bits are set
+    INPUT:
+       bits - bitmask value(s), e.g., an APOGEE_TARGET1, ASPCAPFLAG, or PIXMASK column (any shape)
+       nbits= (32) number of bits to decode
+    OUTPUT:
+       boolean array with shape bits.shape+(nbits,); [...,b] is True if bit b is set
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    bits= numpy.asarray(bits)
+    out= numpy.empty(bits.shape+(nbits,),dtype='bool')
+    for b in range(nbits):
+        out[...,b]= (bits >> b) & 1
+    return out
+
+def count(bits,bitmask='APOGEE_TARGET1'):
+    """
+    NAME:
+       count
+    PURPOSE:
+       count the number of entries in an array of bitmask values that have each of the flags set
+    INPUT:
+       bits - bitmask values (any shape)
+       bitmask= ('APOGEE_TARGET1') bitmask that the values are from ('APOGEE_TARGET1', 'APOGEE_TARGET2', 'APOGEE_PIXMASK', or 'APOGEE_ASPCAPFLAG')
+    OUTPUT:
+       dictionary with the number of entries that have each flag set, keyed by the name of the flag
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    bits= numpy.asarray(bits)
+    return dict((name,numpy.count_nonzero((bits >> b) & 1))
+                for b,name in _bitmask_dicts(bitmask)[0].items())
+
+def compile_mask(expr=None,bitmask='APOGEE_TARGET1',
+                 anyof=None,allof=None,noneof=None):
+    """
+    NAME:
+       compile_mask
+    PURPOSE:
+       compile a condition on named flags into a function that evaluates it on an array of bitmask values
+    INPUT:
+       expr= (None) condition as a string of clauses separated by commas or semicolons, each of the form 'anyof NAME|NAME|...', 'allof NAME|...', or 'noneof NAME|...' (e.g., 'anyof APOGEE_SHORT|APOGEE_INTERMEDIATE|APOGEE_LONG, noneof APOGEE_WASH_GIANT|APOGEE_WASH_DWARF'); all clauses have to be satisfied
+       bitmask= ('APOGEE_TARGET1') bitmask that the flags are from ('APOGEE_TARGET1', 'APOGEE_TARGET2', 'APOGEE_PIXMASK', or 'APOGEE_ASPCAPFLAG')
+       anyof=, allof=, noneof= (None) lists of flag names (or strings of names separated by |) to add as clauses
+    OUTPUT:
+       function that takes an array of bitmask values (any shape) and returns the boolean array of where the condition is satisfied
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    str2bit= _bitmask_dicts(bitmask)[1]
+    clauses= {'any':[],'all':[],'none':[]}
+    if not expr is None:
+        for clause in re.split(r'[,;]',expr):
+            if clause.strip() == '': continue
+            match= _CLAUSE_RE.match(clause.strip())
+            if match is None:
+                raise ValueError("Clause '%s' not understood; should be of the form 'anyof NAME|NAME', 'allof NAME|NAME', or 'noneof NAME|NAME'" % clause.strip())
+            clauses[match.group(1).lower()].extend(match.group(2).split('|'))
+    for key,names in zip(['any','all','none'],[anyof,allof,noneof]):
+        if names is None: continue
+        if isinstance(names,str): names= names.split('|')
+        clauses[key].extend(names)
+    masks= {}
+    for key in clauses:
+        masks[key]= 0
+        for name in clauses[key]:
+            try:
+                masks[key]|= 2**str2bit[name.strip()]
+            except KeyError:
+                raise KeyError("bit name %s not recognized as an %s bit" \
+                                   % (name.strip(),bitmask.lower()))
+    anymask= numpy.int64(masks['any'])
+    allmask= numpy.int64(masks['all'])
+    nonemask= numpy.int64(masks['none'])
+    def compiled_mask(bits):
+        bits= numpy.asarray(bits)
+        out= numpy.ones(bits.shape,dtype='bool')
+        if anymask != 0:
+            out&= (bits & anymask) != 0
+        if allmask != 0:
+            out&= (bits & allmask) == allmask
+        if nonemask != 0:
+            out&= (bits & nonemask) == 0
+        return out
+    return compiled_mask
+
+def _bitmask_dicts(bitmask):
+    """Return the (bit->name,name->bit) dictionaries of a bitmask"""
+    try:
+        return _BITMASKS[bitmask.upper()]
+    except KeyError:
+        raise ValueError("bitmask %s not recognized; should be one of %s" \
+                             % (bitmask,', '.join(sorted(_BITMASKS.keys()))))
@@ -0,0 +1,140 @@
+###############################################################################
+#
+#   apogee.tools.catalog: catalogs with derived columns that are computed
+#                         lazily
+#
+#   contains:
+#
+#             - CatalogArray: wrapper around a structured array (e.g., read
+#               with fitsio) that holds additional, derived columns
+#
+#   Adding columns to a structured array (e.g., with
+#   esutil.numpy_util.add_fields) allocates a new array and copies the
+#   entire table; a CatalogArray instead keeps the derived columns as
+#   separate arrays next to the original array, and only computes them
+#   when they are first accessed
+#
+###############################################################################
+from collections import OrderedDict
+import numpy
+class CatalogArray(object):
+    """CatalogArray: a structured array with additional, derived columns that are computed when they are first accessed"""
+    def __init__(self,data):
+        """
+        NAME:
+           __init__
+        PURPOSE:
+           initialize a CatalogArray
+        INPUT:
+           data - structured array (not copied)
+        OUTPUT:
+           instance
+        HISTORY:
+           2026-10-18 - Written - Bovy (IAS)
+        """
+        self._data= data
+        self._derived= OrderedDict() # name -> function or None
+        self._cache= {} # name -> computed or set array
+        return None
+
+    def add_column(self,name,value):
+        """
+        NAME:
+           add_column
+        PURPOSE:
+           add a derived column
+        INPUT:
+           name - name of the column
+           value - array with the values of the column or function that takes the CatalogArray and returns the values of the column (only evaluated when the column is first accessed)
+        OUTPUT:
+           (none)
+        HISTORY:
+           2026-10-18 - Written - Bovy (IAS)
+        """
+        if callable(value):
+            self._derived[name]= value
+            self._cache.pop(name,None)
+        else:
+            value= numpy.asarray(value)
+            if len(value) != len(self):
+                raise ValueError("Column %s does not have the same length as the catalog" % name)
+            self._derived[name]= None
+            self._cache[name]= value
+        return None
+
+    @property
+    def names(self):
+        """Names of all columns, original and derived"""
+        return tuple(self._data.dtype.names)+tuple(self._derived.keys())
+
+    @property
+    def raw(self):
+        """The original structured array, without the derived columns"""
+        return self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self,name):
+        return name in self._derived or name in self._data.dtype.names
+
+    def __getitem__(self,key):
+        """
+        NAME:
+           __getitem__
+        PURPOSE:
+           return a column (when key is a string) or a subset of the rows
+        INPUT:
+           key - column name, or index, slice, boolean or integer array into the rows
+        OUTPUT:
+           column array, a row (numpy.void, with the derived columns) for an integer key, or a CatalogArray with the subset of the rows (derived columns that were already computed are indexed, not re-computed)
+        HISTORY:
+           2026-10-18 - Written - Bovy (IAS)
+        """
+        if isinstance(key,str):
+            if not key in self._derived:
+                return self._data[key]
+            if not key in self._cache:
+                self._cache[key]= self._derived[key](self)
+            return self._cache[key]
+        elif isinstance(key,(int,numpy.integer)):
+            return self[numpy.array([key])].as_array()[0]
+        out= CatalogArray(self._data[key])
+        out._derived= OrderedDict(self._derived)
+        out._cache= dict((name,value[key])
+                         for name,value in self._cache.items())
+        return out
+
+    def __setitem__(self,key,value):
+        if isinstance(key,str) and not key in self._data.dtype.names:
+            self.add_column(key,value)
+        else:
+            self._data[key]= value
+        return None
+
+    def __repr__(self):
+        return 'CatalogArray(%i rows, columns: %s)' \
+            % (len(self),', '.join(self.names))
+
+    def as_array(self):
+        """
+        NAME:
+           as_array
+        PURPOSE:
+           return a single structured array with the original and all derived columns (e.g., to write the catalog to a file)
+        INPUT:
+           (none)
+        OUTPUT:
+           structured array (a copy)
+        HISTORY:
+           2026-10-18 - Written - Bovy (IAS)
+        """
+        derived= [(name,self[name]) for name in self._derived]
+        dt= self._data.dtype.descr\
+            +[(name,value.dtype,value.shape[1:]) for name,value in derived]
+        out= numpy.empty(len(self),dtype=dt)
+        for name in self._data.dtype.names:
+            out[name]= self._data[name]
+        for name,value in derived:
+            out[name]= value
+        return out
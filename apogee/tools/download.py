@@ -5,9 +5,24 @@
 ###############################################################################
 import os
 import sys
+import time
+import errno
+import hashlib
 import shutil
-import tempfile
 import subprocess
+import threading
+import socket
+import base64
+import netrc
+import json
+import httplib
+import urlparse
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
+try:
+    import fcntl
+except ImportError: # e.g., Windows; only lock against other threads
+    fcntl= None
 import numpy
 from apogee.tools import path
 _DR10_URL= 'http://data.sdss3.org/sas/dr10'
@@ -15,6 +30,27 @@ _DR12_URL= 'http://data.sdss3.org/sas/dr12'
 _DR13_URL= 'http://data.sdss.org/sas/dr13'
 _PROPRIETARY_URL= 'https://data.sdss.org/sas/apogeework'
 _MAX_NTRIES= 2
+# Attempts that are interrupted after making progress are resumed without
+# counting them as tries, at most _MAX_NRESUMES times per file and after an
+# exponentially increasing wait
+_MAX_NRESUMES= 100
+_RESUME_BACKOFF= 0.1
+_RESUME_MAXBACKOFF= 10.
+_MAX_NREDIRECTS= 5
+_BULK_NTHREADS= 8
+_HTTP_TIMEOUT= 10.
+_HTTP_CHUNKSIZE= 2**16
+_MANIFEST_UPDATE= 100
+_LOCK_TIMEOUT= 3600.
+_LOCK_MAXPOLL= 1.
+# Per-thread HTTP connections, re-used for subsequent downloads
+_CONNECTIONS= threading.local()
+_NETRC_AUTH= {}
+# Per-file locks between the threads of this process (fcntl locks are held
+# by the process, so they don't exclude other threads); entries are removed
+# when no thread holds or waits for the lock
+_THREAD_LOCKS= {}
+_THREAD_LOCKS_LOCK= threading.Lock()
 _ERASESTR= "                                                                                "
 def allStar(dr=None):
     """
@@ -361,7 +397,7 @@ def ferreModelLibrary(lib='GK',pca=True,sixd=True,unf=False,dr=None,
        sixd= (True) if True, download the 6D library (w/o vmicro)
        unf= (False) if True, download the binary library (otherwise ascii)
        convertToBin= (True) if True and not unf, convert the ascii file to binary using ferre's ascii2bin (which has to be on the path)
-       spider= (False) if True, run wget as a spider (doesn't download)
+       spider= (False) if True, only check whether the file exists on the server (doesn't download)
     OUTPUT:
        (none; just downloads; also downloads the corresponding .hdr)
     HISTORY:
@@ -421,7 +457,7 @@ def modelAtmosphere(lib='kurucz_filled',teff=4500,logg=2.5,metals=0.,
        afe= (0.) grid-point alpha-enhancement
        vmicro= (2.) grid-point microturbulence
        dr= return the path corresponding to this data release
-       spider= (False) if True, run wget as a spider (doesn't download)
+       spider= (False) if True, only check whether the file exists on the server (doesn't download)
     OUTPUT:
        (none; just downloads)
     HISTORY:
@@ -449,7 +485,7 @@ def linelist(linelist,dr=None,spider=False):
     INPUT:
        linelist - name of the linelist
        dr= return the path corresponding to this data release
-       spider= (False) if True, run wget as a spider (doesn't download)
+       spider= (False) if True, only check whether the file exists on the server (doesn't download)
     OUTPUT:
        (none; just downloads)
     HISTORY:
@@ -544,52 +580,326 @@ def obslog(year=None):
     _download_file(downloadPath,filePath,None)
     return None
 
-def _download_file(downloadPath,filePath,dr,verbose=False,spider=False):
-    sys.stdout.write('\r'+"Downloading file %s ...\r" \
-                         % (os.path.basename(filePath)))
-    sys.stdout.flush()
+def bulk_aspcapStar(loc_ids,apogee_ids,dr=None,nthreads=_BULK_NTHREADS,
+                    manifest=None):
+    """
+    NAME:
+       bulk_aspcapStar
+    PURPOSE:
+       download many aspcapStar files concurrently
+    INPUT:
+       loc_ids - array of location IDs (fields for 1m targets)
+       apogee_ids - array of APOGEE IDs of the stars
+       dr= return the path corresponding to this data release (general default)
+       nthreads= (8) number of concurrent downloads
+       manifest= (None) if set, JSON file in which the status of each download is recorded; files that do not exist on the server are not tried again when a bulk download is restarted with the same manifest
+    OUTPUT:
+       list of the files that could not be downloaded (files that already exist are skipped)
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    if dr is None: dr= path._default_dr()
+    filePaths= [path.aspcapStarPath(_loc_id(loc_id),apogee_id.strip(),dr=dr)
+                for loc_id,apogee_id in zip(loc_ids,apogee_ids)]
+    return _bulk_download(filePaths,dr,nthreads=nthreads,manifest=manifest)
+
+def bulk_apStar(loc_ids,apogee_ids,dr=None,nthreads=_BULK_NTHREADS,
+                manifest=None):
+    """
+    NAME:
+       bulk_apStar
+    PURPOSE:
+       download many apStar files concurrently
+    INPUT:
+       loc_ids - array of location IDs (fields for 1m targets)
+       apogee_ids - array of APOGEE IDs of the stars
+       dr= return the path corresponding to this data release (general default)
+       nthreads= (8) number of concurrent downloads
+       manifest= (None) if set, JSON file in which the status of each download is recorded; files that do not exist on the server are not tried again when a bulk download is restarted with the same manifest
+    OUTPUT:
+       list of the files that could not be downloaded (files that already exist are skipped)
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    if dr is None: dr= path._default_dr()
+    filePaths= [path.apStarPath(_loc_id(loc_id),apogee_id.strip(),dr=dr)
+                for loc_id,apogee_id in zip(loc_ids,apogee_ids)]
+    return _bulk_download(filePaths,dr,nthreads=nthreads,manifest=manifest)
+
+def _loc_id(loc_id):
+    """Location IDs from a catalog are numpy integers, path needs int"""
+    if isinstance(loc_id,(int,numpy.integer)): return int(loc_id)
+    else: return loc_id
+
+def _bulk_download(filePaths,dr,nthreads=_BULK_NTHREADS,manifest=None):
+    """Download all files in filePaths that do not exist yet with a pool of nthreads threads, keeping track of their status in the manifest"""
+    status= {}
+    if not manifest is None and os.path.exists(manifest):
+        with open(manifest,'r') as manifestFile:
+            status= json.load(manifestFile)
+    todo= []
+    for filePath in filePaths:
+        if os.path.exists(filePath):
+            status[filePath]= 'done'
+        elif status.get(filePath) != 'missing':
+            todo.append((filePath.replace(os.path.join(path._APOGEE_DATA,
+                                                       _dr_string(dr)),
+                                          _base_url(dr=dr)),
+                         filePath))
+    pool= ThreadPool(nthreads)
+    try:
+        for ii,(filePath,fileStatus) in \
+                enumerate(pool.imap_unordered(_bulk_download_one,todo)):
+            status[filePath]= fileStatus
+            sys.stdout.write('\r'+"Downloading files: %i / %i ...\r" \
+                                 % (ii+1,len(todo)))
+            sys.stdout.flush()
+            if not manifest is None and (ii+1) % _MANIFEST_UPDATE == 0:
+                _write_manifest(manifest,status)
+    finally:
+        pool.terminate()
+        if not manifest is None:
+            _write_manifest(manifest,status)
+        sys.stdout.write('\r'+_ERASESTR+'\r')
+        sys.stdout.flush()
+    return [filePath for filePath in filePaths if status[filePath] != 'done']
+
+def _bulk_download_one(args):
+    """Download a single file for _bulk_download, returning its status"""
+    downloadPath,filePath= args
+    try:
+        with _file_lock(filePath):
+            if not os.path.exists(filePath):
+                _download_file_http(downloadPath,filePath)
+    except (IOError,OSError) as e:
+        if e.errno == 404: return (filePath,'missing')
+        else: return (filePath,'failed: %s' % str(e))
+    return (filePath,'done')
+
+def _write_manifest(manifest,status):
+    # Write to a temporary file first, such that the manifest is never 
+    # left in an inconsistent state
+    with open(manifest+'.tmp','w') as manifestFile:
+        json.dump(status,manifestFile,indent=0)
+    os.rename(manifest+'.tmp',manifest)
+    return None
+
+def _download_file_http(downloadPath,filePath,verbose=False,spider=False):
+    """Download a file over a (re-used) HTTP connection, trying the data and mirror servers in turn; interrupted downloads are resumed"""
     try:
         # make all intermediate directories
         os.makedirs(os.path.dirname(filePath)) 
     except OSError: pass
-    # Safe way of downloading
-    downloading= True
-    interrupted= False
-    file, tmp_savefilename= tempfile.mkstemp()
-    os.close(file) #Easier this way
-    ntries= 1
-    while downloading:
+    ntries= 0
+    nresumes= 0
+    while ntries <= _MAX_NTRIES:
+        partSize= _part_size(filePath)
         try:
-            cmd= ['wget','%s' % downloadPath,
-                  '-O','%s' % tmp_savefilename,
-                  '--read-timeout=10',
-                  '--tries=3']
-            if not verbose: cmd.append('-q')
-            if spider: cmd.append('--spider')
-            subprocess.check_call(cmd)
-            if not spider: shutil.move(tmp_savefilename,filePath)
-            downloading= False
-            if interrupted:
-                raise KeyboardInterrupt
-        except subprocess.CalledProcessError as e:
-            if not downloading: #Assume KeyboardInterrupt
-                raise
-            elif ntries > _MAX_NTRIES:
-                raise IOError('File %s does not appear to exist on the server ...' % (os.path.basename(filePath)))
-            elif not 'exit status 4' in str(e):
-                interrupted= True
-            os.remove(tmp_savefilename)
-        finally:
-            if os.path.exists(tmp_savefilename):
-                os.remove(tmp_savefilename)
+            httpStatus= _http_get(downloadPath,filePath,
+                                  verbose=verbose,spider=spider)
+        except (httplib.HTTPException,socket.error) as e:
+            httpStatus= None
+            err= e
+            # Don't count attempts that made progress, resume after a wait
+            if _part_size(filePath) > partSize and nresumes < _MAX_NRESUMES:
+                time.sleep(min(_RESUME_BACKOFF*2.**nresumes,
+                               _RESUME_MAXBACKOFF))
+                nresumes+= 1
+                continue
+        if httpStatus == 200: return None
         # Try the mirror and the data both
-        if ntries % 2 == 1:
+        if ntries % 2 == 0:
             downloadPath= downloadPath.replace('data.sdss','mirror.sdss')
         else:
             downloadPath= downloadPath.replace('mirror.sdss','data.sdss')
         ntries+= 1
-    sys.stdout.write('\r'+_ERASESTR+'\r')
-    sys.stdout.flush()        
+    if httpStatus is None:
+        raise IOError('Downloading file %s failed: %s' \
+                          % (os.path.basename(filePath),str(err)))
+    elif httpStatus == 404:
+        raise IOError(404,'File %s does not appear to exist on the server ...' % (os.path.basename(filePath)))
+    else:
+        raise IOError(httpStatus,'Downloading file %s failed with HTTP status %i' % (os.path.basename(filePath),httpStatus))
+
+def _part_size(filePath):
+    """Size of the partial download of filePath"""
+    try:
+        return os.path.getsize(filePath+'.part')
+    except OSError:
+        return 0
+
+def _http_get(downloadPath,filePath,verbose=False,spider=False):
+    """GET downloadPath into filePath using this thread's connection to the server, resuming from a partial download filePath.part if it exists; returns the HTTP status (200 for a complete download); spider= only checks whether the file exists"""
+    partFilename= filePath+'.part'
+    for nredirects in range(_MAX_NREDIRECTS+1):
+        url= urlparse.urlsplit(downloadPath)
+        conn= _http_connection(url.scheme,url.netloc)
+        headers= {'Connection':'keep-alive'}
+        auth= _netrc_auth(url.hostname)
+        if not auth is None: headers['Authorization']= auth
+        offset= _part_size(filePath)
+        if offset > 0 and not spider:
+            headers['Range']= 'bytes=%i-' % offset
+        try:
+            conn.request('HEAD' if spider else 'GET',
+                         url.path+('?'+url.query if url.query else ''),
+                         headers=headers)
+            response= conn.getresponse()
+            if spider or not response.status in [200,206]:
+                response.read() # such that the connection can be re-used
+                if response.status in [301,302,303,307,308]:
+                    downloadPath= urlparse.urljoin(downloadPath,
+                                           response.getheader('Location'))
+                    continue
+                elif response.status == 416:
+                    # Partial download is invalid, start over
+                    os.remove(partFilename)
+                return response.status
+            if response.status == 200: offset= 0 # Server ignored Range
+            size= response.getheader('Content-Length')
+            if not size is None: size= int(size)+offset
+            # Stream into the partial file in the target directory, moved 
+            # into place when the download is complete
+            with open(partFilename,'ab' if offset > 0 else 'wb') as outFile:
+                while True:
+                    chunk= response.read(_HTTP_CHUNKSIZE)
+                    if not chunk: break
+                    outFile.write(chunk)
+                    if verbose and size:
+                        sys.stdout.write('\r'+"Downloading file %s: %i%% ...\r" % (os.path.basename(filePath),100*outFile.tell()//size))
+                        sys.stdout.flush()
+            if not size is None and _part_size(filePath) < size:
+                raise httplib.IncompleteRead('',size-_part_size(filePath))
+            os.rename(partFilename,filePath)
+        except Exception:
+            # Connection is in an unknown state, start over next time
+            _close_http_connection(url.scheme,url.netloc)
+            raise
+        return 200
+    raise httplib.HTTPException('Too many redirects for %s' % downloadPath)
+
+def _http_connection(scheme,netloc):
+    if not hasattr(_CONNECTIONS,'conns'): _CONNECTIONS.conns= {}
+    if not (scheme,netloc) in _CONNECTIONS.conns:
+        if scheme == 'https':
+            conn= httplib.HTTPSConnection(netloc,timeout=_HTTP_TIMEOUT)
+        else:
+            conn= httplib.HTTPConnection(netloc,timeout=_HTTP_TIMEOUT)
+        _CONNECTIONS.conns[(scheme,netloc)]= conn
+    return _CONNECTIONS.conns[(scheme,netloc)]
+
+def _close_http_connection(scheme,netloc):
+    conn= _http_connection(scheme,netloc)
+    del _CONNECTIONS.conns[(scheme,netloc)]
+    conn.close()
+    return None
+
+def _netrc_auth(host):
+    """Basic authorization header for host from ~/.netrc (like wget uses)"""
+    if not host in _NETRC_AUTH:
+        try:
+            auth= netrc.netrc().authenticators(host)
+        except (IOError,netrc.NetrcParseError):
+            auth= None
+        if auth is None:
+            _NETRC_AUTH[host]= None
+        else:
+            _NETRC_AUTH[host]= 'Basic '\
+                +base64.b64encode(('%s:%s' % (auth[0],auth[2])).encode())\
+                .decode()
+    return _NETRC_AUTH[host]
+
+def _download_file(downloadPath,filePath,dr,verbose=False,spider=False):
+    if spider: # Only checks whether the file exists, no need to lock
+        _download_file_http(downloadPath,filePath,verbose=verbose,
+                            spider=spider)
+        return None
+    # Only one process or thread downloads the file, the others wait for it
+    with _file_lock(filePath):
+        if os.path.exists(filePath): return None
+        sys.stdout.write('\r'+"Downloading file %s ...\r" \
+                             % (os.path.basename(filePath)))
+        sys.stdout.flush()
+        # Downloads to filePath.part, such that an interrupted download is 
+        # resumed the next time
+        _download_file_http(downloadPath,filePath,verbose=verbose)
+        sys.stdout.write('\r'+_ERASESTR+'\r')
+        sys.stdout.flush()        
+    return None
+
+@contextmanager
+def _file_lock(filePath,timeout=_LOCK_TIMEOUT):
+    """Context manager that holds an exclusive lock on filePath against other threads and processes (through fcntl.lockf on a lock file in the locks directory of the cache, which also works on NFS); raises IOError if the lock cannot be acquired within timeout seconds"""
+    key= _lock_key(filePath)
+    with _THREAD_LOCKS_LOCK:
+        # [lock, number of threads holding or waiting for it]
+        threadLock= _THREAD_LOCKS.setdefault(key,[threading.Lock(),0])
+        threadLock[1]+= 1
+    start= time.time()
+    try:
+        _wait_for(lambda: threadLock[0].acquire(False),filePath,start,timeout)
+        try:
+            if fcntl is None:
+                yield None
+                return
+            lockFilename= path.cachePath('locks','%s.lock' % key)
+            try:
+                os.makedirs(os.path.dirname(lockFilename))
+            except OSError: pass
+            while True:
+                with open(lockFilename,'a') as lockFile:
+                    _wait_for(lambda: _lockf(lockFile),filePath,start,timeout)
+                    # The holder of the lock removes the lock file before
+                    # releasing it, so a lock on a file that has been 
+                    # removed (or replaced) in the meantime does not count
+                    try:
+                        current= os.path.samestat(os.fstat(lockFile.fileno()),
+                                                  os.stat(lockFilename))
+                    except OSError:
+                        current= False
+                    if not current:
+                        fcntl.lockf(lockFile,fcntl.LOCK_UN)
+                        continue
+                    try:
+                        yield None
+                    finally:
+                        try:
+                            os.remove(lockFilename)
+                        except OSError: pass
+                        fcntl.lockf(lockFile,fcntl.LOCK_UN)
+                    return
+        finally:
+            threadLock[0].release()
+    finally:
+        with _THREAD_LOCKS_LOCK:
+            threadLock[1]-= 1
+            if threadLock[1] == 0: del _THREAD_LOCKS[key]
+
+def _lock_key(filePath):
+    """Name of the lock of filePath: hash of its path relative to the SAS mirror, such that it is the same on all machines that share the mirror"""
+    return hashlib.md5(os.path.relpath(os.path.abspath(filePath),
+                                       os.path.abspath(path._APOGEE_DATA))\
+                           .encode('utf-8')).hexdigest()
+
+def _lockf(lockFile):
+    """Try to lock lockFile without blocking; return True if the lock is held"""
+    try:
+        fcntl.lockf(lockFile,fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError as e:
+        if e.errno in [errno.EACCES,errno.EAGAIN]: return False
+        elif e.errno == errno.ENOLCK: return True # no locking available
+        raise
+    return True
+
+def _wait_for(acquire,filePath,start,timeout):
+    """Call acquire until it returns True, sleeping increasingly long in between, or raise IOError after timeout seconds"""
+    wait= 0.01
+    while not acquire():
+        if time.time()-start > timeout:
+            raise IOError('Timed out after %g s waiting for the lock on %s' \
+                              % (timeout,os.path.basename(filePath)))
+        time.sleep(wait)
+        wait= min(2.*wait,_LOCK_MAXPOLL)
     return None
 
 def _base_url(dr,rc=False):
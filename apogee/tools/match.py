@@ -0,0 +1,155 @@
+###############################################################################
+#
+#   apogee.tools.match: cross-match catalogs on the sky, caching the results
+#
+#   contains:
+#
+#             - match: match two sets of (RA,Dec), re-using cached matches
+#             - clear_cache: clear the in-memory cache of prepared HTM indices
+#               (and optionally the matches cached on disk)
+#
+#   Matches are stored on disk in the cache directory (path.cachePath),
+#   keyed by the coordinates of both catalogs, the matching radius, and
+#   maxmatch, such that a match is only ever computed once. At most
+#   _MAX_CACHED_MATCHES matches are kept on disk; the least recently used
+#   ones are removed when more are cached. The HTM index of the second
+#   catalog is also kept in memory for repeated matches against the same
+#   catalog (e.g., allStar)
+#
+###############################################################################
+import os, os.path
+import hashlib
+from collections import OrderedDict
+import numpy
+import esutil
+from apogee.tools import path, download
+_HTM_DEPTH= 10
+_MAX_PREPARED= 4
+_PREPARED= OrderedDict()
+_MAX_CACHED_MATCHES= 256
+def match(ra1,dec1,ra2,dec2,radius,maxmatch=1,cache=True):
+    """
+    NAME:
+       match
+    PURPOSE:
+       match two sets of coordinates using esutil's HTM matching, re-using the result of an earlier identical match when available
+    INPUT:
+       ra1, dec1 - coordinates of the first catalog (deg)
+       ra2, dec2 - coordinates of the second catalog (deg)
+       radius - matching radius (deg)
+       maxmatch= (1) maximum number of matches in the second catalog for each object in the first (0: all matches); see esutil.htm.HTM.match
+       cache= (True) if True, store the match on disk and re-use it on subsequent calls (the least recently used matches are removed when more than _MAX_CACHED_MATCHES=256 are stored; use clear_cache(disk=True) to remove all of them)
+    OUTPUT:
+       (m1,m2,d12): indices into the first and second catalog and the distance in deg, like esutil.htm.HTM.match
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+       2026-10-18 - Limit the number of matches cached on disk - Bovy (IAS)
+    """
+    ra1= numpy.atleast_1d(ra1).astype('f8')
+    dec1= numpy.atleast_1d(dec1).astype('f8')
+    ra2= numpy.atleast_1d(ra2).astype('f8')
+    dec2= numpy.atleast_1d(dec2).astype('f8')
+    if cache:
+        key= hashlib.md5()
+        for arr in [ra1,dec1,ra2,dec2]:
+            key.update(numpy.ascontiguousarray(arr).tostring())
+        key.update(('%r %i %i' % (float(radius),maxmatch,_HTM_DEPTH)).encode())
+        cacheFilename= path.cachePath('match','%s.npz' % key.hexdigest())
+        out= _read_match_cache(cacheFilename)
+        if not out is None: return out
+        # Only one process computes the match, the others wait and read it
+        with download._file_lock(cacheFilename):
+            out= _read_match_cache(cacheFilename)
+            if not out is None: return out
+            m1,m2,d12= _match(ra1,dec1,ra2,dec2,radius,maxmatch)
+            try:
+                os.makedirs(os.path.dirname(cacheFilename))
+            except OSError: pass
+            # Write to a temporary file first, such that a partially written
+            # match is never read
+            with open(cacheFilename+'.tmp','wb') as cacheFile:
+                numpy.savez(cacheFile,m1=m1,m2=m2,d12=d12)
+            os.rename(cacheFilename+'.tmp',cacheFilename)
+        _prune_match_cache()
+    else:
+        m1,m2,d12= _match(ra1,dec1,ra2,dec2,radius,maxmatch)
+    return (m1,m2,d12)
+
+def _match(ra1,dec1,ra2,dec2,radius,maxmatch):
+    """Match using the (cached) HTM index of the second catalog"""
+    h= esutil.htm.HTM(_HTM_DEPTH)
+    htmrev2,minid,maxid= _prepare(h,ra2,dec2)
+    return h.match(ra1,dec1,ra2,dec2,radius,maxmatch=maxmatch,
+                   htmrev2=htmrev2,minid=minid,maxid=maxid)
+
+def _read_match_cache(cacheFilename):
+    """Read a cached match; None if it does not exist"""
+    if not os.path.exists(cacheFilename): return None
+    with open(cacheFilename,'rb') as cacheFile:
+        out= numpy.load(cacheFile)
+        out= (out['m1'],out['m2'],out['d12'])
+    # Mark as recently used
+    try:
+        os.utime(cacheFilename,None)
+    except OSError: pass # removed by another process in the meantime
+    return out
+
+def _cached_matches():
+    """List of the matches cached on disk"""
+    cacheDir= path.cachePath('match')
+    if not os.path.exists(cacheDir): return []
+    return [os.path.join(cacheDir,filename)
+            for filename in os.listdir(cacheDir)
+            if filename.endswith('.npz')]
+
+def _prune_match_cache():
+    """Remove the least recently used matches from the disk cache, such that at most _MAX_CACHED_MATCHES remain"""
+    cacheFilenames= _cached_matches()
+    if len(cacheFilenames) <= _MAX_CACHED_MATCHES: return None
+    mtimes= []
+    for cacheFilename in cacheFilenames:
+        try:
+            mtimes.append(os.path.getmtime(cacheFilename))
+        except OSError: # removed by another process in the meantime
+            mtimes.append(-1.)
+    for ii in numpy.argsort(mtimes)[:len(cacheFilenames)-_MAX_CACHED_MATCHES]:
+        try:
+            os.remove(cacheFilenames[ii])
+        except OSError: pass
+    return None
+
+def clear_cache(disk=False):
+    """
+    NAME:
+       clear_cache
+    PURPOSE:
+       clear the in-memory cache of prepared HTM indices and, optionally, the matches cached on disk
+    INPUT:
+       disk= (False) if True, also remove all matches cached on disk
+    OUTPUT:
+       (none)
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+       2026-10-18 - Added disk= - Bovy (IAS)
+    """
+    _PREPARED.clear()
+    if disk:
+        for cacheFilename in _cached_matches():
+            try:
+                os.remove(cacheFilename)
+            except OSError: pass
+    return None
+
+def _prepare(h,ra,dec):
+    """Return the prepared HTM index (htmrev2,minid,maxid) for (ra,dec), re-using it if it was prepared before"""
+    key= hashlib.md5(numpy.ascontiguousarray(ra).tostring()
+                     +numpy.ascontiguousarray(dec).tostring()).hexdigest()
+    try:
+        out= _PREPARED.pop(key)
+    except KeyError:
+        out= h.match_prepare(ra,dec)
+        if len(_PREPARED) >= _MAX_PREPARED:
+            _PREPARED.popitem(last=False)
+    # (Re-)insert as the most recently used
+    _PREPARED[key]= out
+    return out
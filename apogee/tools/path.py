@@ -24,6 +24,7 @@
 #             - aspcapStarPath: path of a aspcapStar file
 #             - apallPath: the path of the apall file (an early version of 
 #               allStar by JB, now deprecated)
+#             - cachePath: path of a file in the cache directory
 #
 ##################################################################################
 import os, os.path
@@ -783,6 +784,21 @@ def apogeeModelAtmosphereLibraryDirPath(dr=None,lib='kurucz_filled'):
         elif 'marcs' in lib.lower():
             return os.path.join('speclib','marcs',lib)
    
+def cachePath(*args):
+    """
+    NAME:
+       cachePath
+    PURPOSE:
+       returns the path of a file or directory in the directory where the apogee module caches the results of expensive computations
+    INPUT:
+       any number of path components within the cache directory
+    OUTPUT:
+       path string
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    return os.path.join(_APOGEE_DATA,'apogee-cache',*args)
+
 def _default_dr():
     if _APOGEE_REDUX == _DR10REDUX: dr= '10'
     elif _APOGEE_REDUX == _DR11REDUX: dr= '11'
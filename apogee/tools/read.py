@@ -11,20 +11,151 @@
 #             - apogeePlate: read the apogeePlate file
 #             - apokasc: read the APOKASC catalog
 #             - mainIndx: return the index of main targets in a data set
+#             - commissioningIndx: return the index of commissioning data
 #             - obslog: read the observation log
 #             - rcsample: read the red clump sample
+#             - enable_spec_cache: cache aspcapStar/apStar reads in memory
+#             - disable_spec_cache: turn off (and empty) the spectrum cache
+#             - spec_cache_info: statistics of the spectrum cache
 #
 ##################################################################################
 from functools import wraps
+from collections import OrderedDict
 import os
+import inspect
 import sys
-import copy
+import threading
+from multiprocessing.pool import ThreadPool
 import numpy
 import esutil
 import fitsio
-import tqdm
-from apogee.tools import path, paramIndx, download
+from apogee.tools import path, paramIndx, download, bitmask, match
+import apogee.spec.wavegrid as apwavegrid
+from apogee.tools.catalog import CatalogArray
 _ERASESTR= "                                                                                "
+_BIGERR= 10.**7.
+# Main survey: main-survey cohorts, no Washington+DDO51 giants/dwarfs or 
+# tellurics
+_MAIN_TARGET1= bitmask.compile_mask(\
+    'anyof APOGEE_SHORT|APOGEE_INTERMEDIATE|APOGEE_LONG, noneof APOGEE_WASH_GIANT|APOGEE_WASH_DWARF',
+    bitmask='APOGEE_TARGET1')
+_MAIN_TARGET2= bitmask.compile_mask('noneof APOGEE_TELLURIC',
+                                    bitmask='APOGEE_TARGET2')
+_NOT_STAR_BAD= bitmask.compile_mask('noneof STAR_BAD',
+                                    bitmask='APOGEE_ASPCAPFLAG')
+_NOT_STAR_WARN= bitmask.compile_mask('noneof STAR_WARN',
+                                     bitmask='APOGEE_ASPCAPFLAG')
+# In-memory LRU cache of aspcapStar/apStar reads; off when maxsize == 0
+_SPEC_CACHE= OrderedDict()
+_SPEC_CACHE_LOCK= threading.Lock()
+_SPEC_CACHE_STATS= {'maxsize':0,'size':0,'hits':0,'misses':0}
+def specCache(func):
+    """Decorator to cache the output of a spectrum read function in memory (if enabled with enable_spec_cache)"""
+    @wraps(func)
+    def cache_wrapper(*args,**kwargs):
+        if _SPEC_CACHE_STATS['maxsize'] == 0:
+            return func(*args,**kwargs)
+        # Key is (function, loc_id, apogee_id, ext, dr, header, aspcapWavegrid),
+        # independent of whether arguments are given by position or name
+        try:
+            callargs= inspect.getcallargs(_spec_signature,*args,**kwargs)
+        except TypeError: # let the function itself raise the error
+            return func(*args,**kwargs)
+        if callargs['dr'] is None: callargs['dr']= path._default_dr()
+        key= (func.__name__,str(callargs['loc_id']).strip(),
+              callargs['apogee_id'].strip(),callargs['ext'],callargs['dr'],
+              callargs['header'],callargs['aspcapWavegrid'])
+        with _SPEC_CACHE_LOCK:
+            out= _SPEC_CACHE.pop(key,None)
+            if not out is None:
+                # (Re-)insert as the most recently used
+                _SPEC_CACHE[key]= out
+                _SPEC_CACHE_STATS['hits']+= 1
+                return out
+            _SPEC_CACHE_STATS['misses']+= 1
+        out= func(*args,**kwargs)
+        # Cached arrays are shared between calls, so make them read-only
+        if key[5]: data= out[0]
+        else: data= out
+        data.flags.writeable= False
+        with _SPEC_CACHE_LOCK:
+            if not key in _SPEC_CACHE \
+                    and data.nbytes <= _SPEC_CACHE_STATS['maxsize']:
+                _SPEC_CACHE[key]= out
+                _SPEC_CACHE_STATS['size']+= data.nbytes
+                _trim_spec_cache()
+        return out
+    return cache_wrapper
+
+def _spec_signature(loc_id,apogee_id,ext=1,dr=None,header=True,
+                    aspcapWavegrid=False):
+    """Signature of the spectrum read functions that are cached, used to bind their arguments"""
+    return None
+
+def enable_spec_cache(maxsize=100.):
+    """
+    NAME:
+       enable_spec_cache
+    PURPOSE:
+       turn on the in-memory LRU cache of aspcapStar and apStar reads; cached reads return read-only arrays
+    INPUT:
+       maxsize= (100.) maximum size of the cache in MB
+    OUTPUT:
+       (none)
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    with _SPEC_CACHE_LOCK:
+        _SPEC_CACHE_STATS['maxsize']= int(maxsize*2**20)
+        _trim_spec_cache()
+    return None
+
+def disable_spec_cache():
+    """
+    NAME:
+       disable_spec_cache
+    PURPOSE:
+       turn off the in-memory cache of aspcapStar and apStar reads and empty it
+    INPUT:
+       (none)
+    OUTPUT:
+       (none)
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    with _SPEC_CACHE_LOCK:
+        _SPEC_CACHE.clear()
+        _SPEC_CACHE_STATS.update(maxsize=0,size=0,hits=0,misses=0)
+    return None
+
+def spec_cache_info():
+    """
+    NAME:
+       spec_cache_info
+    PURPOSE:
+       return statistics of the in-memory cache of aspcapStar and apStar reads
+    INPUT:
+       (none)
+    OUTPUT:
+       dictionary with hits, misses, nentries, size and maxsize (in MB)
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    with _SPEC_CACHE_LOCK:
+        return {'hits':_SPEC_CACHE_STATS['hits'],
+                'misses':_SPEC_CACHE_STATS['misses'],
+                'nentries':len(_SPEC_CACHE),
+                'size':_SPEC_CACHE_STATS['size']/2.**20,
+                'maxsize':_SPEC_CACHE_STATS['maxsize']/2.**20}
+
+def _trim_spec_cache():
+    """Remove the least recently used entries until the cache fits (call with the lock held)"""
+    while _SPEC_CACHE_STATS['size'] > _SPEC_CACHE_STATS['maxsize']:
+        key, out= _SPEC_CACHE.popitem(last=False)
+        if key[5]: out= out[0]
+        _SPEC_CACHE_STATS['size']-= out.nbytes
+    return None
+
 def modelspecOnApStarWavegrid(func):
     """Decorator to put a model spectrum onto the apStar wavelength grid"""
     @wraps(func)
@@ -33,24 +164,8 @@ def modelspecOnApStarWavegrid(func):
         if kwargs.get('apStarWavegrid',True) \
                 or (kwargs.get('ext',-1) == 234 \
                         and kwargs.get('apStarWavegrid',True)):
-            if len(out.shape) == 2:
-                newOut= numpy.zeros((8575,out.shape[0]),dtype=out.dtype)\
-                    +numpy.nan
-                out= out.T
-            else:
-                newOut= numpy.zeros(8575,dtype=out.dtype)+numpy.nan
-            if len(out) == 7214:
-                newOut[322:3242]= out[:2920]
-                newOut[3648:6048]= out[2920:5320]
-                newOut[6412:8306]= out[5320:]
-            else:
-                newOut[246:3274]= out[:3028]
-                newOut[3585:6080]= out[3028:5523]
-                newOut[6344:8335]= out[5523:]
-            if len(out.shape) == 2:
-                out= newOut.T
-            else:
-                out= newOut
+            out= apwavegrid.aspcapWavegrid(npix=out.shape[-1])\
+                .toApStar(out,fill=numpy.nan)
         return out
     return output_wrapper
 
@@ -59,24 +174,14 @@ def specOnAspcapWavegrid(func):
     @wraps(func)
     def output_wrapper(*args,**kwargs):
         out= func(*args,**kwargs)
-        if kwargs.get('header',True):
+        callargs= inspect.getcallargs(_spec_signature,*args,**kwargs)
+        if callargs['header']:
             out, hdr= out
-        if kwargs.get('aspcapWavegrid',False):
-            if len(out.shape) == 2:
-                newOut= numpy.zeros((7214,out.shape[0]),dtype=out.dtype)
-                if issubclass(out.dtype.type,numpy.float): newOut+= numpy.nan
-                out= out.T
-            else:
-                newOut= numpy.zeros(7214,dtype=out.dtype)
-                if issubclass(out.dtype.type,numpy.float): newOut+= numpy.nan
-            newOut[:2920]= out[322:3242]
-            newOut[2920:5320]= out[3648:6048]
-            newOut[5320:]= out[6412:8306]
-            if len(out.shape) == 2:
-                out= newOut.T
-            else:
-                out= newOut
-        if kwargs.get('header',True):
+        if callargs['aspcapWavegrid']:
+            dr= callargs['dr']
+            if dr is None: dr= path._default_dr()
+            out= apwavegrid.aspcapWavegrid(dr=dr).toAspcap(out)
+        if callargs['header']:
             return (out,hdr)
         else:
             return out
@@ -92,7 +197,11 @@ def allStar(rmcommissioning=True,
             adddist=False,
             distredux=None,
             rmdups=False,
-            raw=False):
+            raw=False,
+            columns=None,
+            cuts=None,
+            chunksize=None,
+            lazy=False):
     """
     NAME:
        allStar
@@ -108,128 +217,124 @@ def allStar(rmcommissioning=True,
        rmnovisits= (False) if True, remove stars with no good visits (to go into the combined spectrum); shouldn't be necessary
        adddist= (default: False) add distances (DR10/11 Hayden distances, DR12 combined distances)
        distredux= (default: DR default) reduction on which the distances are based
-       rmdups= (False) if True, remove duplicates (very slow)
+       rmdups= (False) if True, remove duplicates (the index of duplicates is cached next to the allStar file)
        raw= (False) if True, just return the raw file, read w/ fitsio
+       columns= (None) if set to a list of column names, only read these columns (plus the columns necessary for the derived quantities) from a memory-mapped, per-column cache of the allStar file (created the first time it is needed)
+       cuts= (None) list of additional cuts, each a function that takes the data (indexable by column name) and returns a boolean index of the entries to keep; all cuts are combined into a single index that is applied once
+       chunksize= (None) if set, return a generator that reads the file chunksize rows at a time and yields each chunk with all cuts applied and all derived quantities added (chunks that are empty after the cuts are skipped)
+       lazy= (False) if True, return a CatalogArray that holds the derived quantities (J0, H0, K0, distances, METALS, ALPHAFE) next to the data as it is read, rather than copying the data into a new array for each set of derived quantities; derived quantities are only computed when first accessed
     OUTPUT:
-       allStar data
+       allStar data (or generator of chunks of allStar data when chunksize is set)
     HISTORY:
        2013-09-06 - Written - Bovy (IAS)
+       2026-10-18 - Added columns= and cuts=; cuts applied as a single index - Bovy (IAS)
+       2026-10-18 - rmdups now uses a cached index of duplicates - Bovy (IAS)
+       2026-10-18 - Added chunksize= - Bovy (IAS)
+       2026-10-18 - Added lazy= - Bovy (IAS)
     """
     filePath= path.allStarPath()
     if not os.path.exists(filePath):
         download.allStar()
-    #read allStar file
-    data= fitsio.read(path.allStarPath())
-    if raw: return data
-    #Remove duplicates, cache
-    if rmdups:
-        dupsFilename= path.allStarPath().replace('.fits','-nodups.fits')
-        if os.path.exists(dupsFilename):
-            data= fitsio.read(dupsFilename)
-        else:
-            sys.stdout.write('\r'+"Removing duplicates (might take a while) and caching the duplicate-free file ...\r")
-            sys.stdout.flush()
-            data= remove_duplicates(data)
-            #Cache this file for subsequent use of rmdups
-            fitsio.write(dupsFilename,data,clobber=True)
-            sys.stdout.write('\r'+_ERASESTR+'\r')
-            sys.stdout.flush()
-    #Some cuts
-    if rmcommissioning:
-        indx= numpy.array(['apogee.n.c' in s for s in data['APSTAR_ID']])
-        indx+= numpy.array(['apogee.s.c' in s for s in data['APSTAR_ID']])
-        data= data[True-indx]
-    if rmnovisits:
-        indx= numpy.array([s.strip() != '' for s in data['VISITS']])
-        data= data[indx]
-    if main:
-        indx= mainIndx(data)
-        data= data[indx]
     if akvers.lower() == 'targ':
         aktag= 'AK_TARG'
     elif akvers.lower() == 'wise':
         aktag= 'AK_WISE'
-    if ak:
-        data= data[True-numpy.isnan(data[aktag])]
-        data= data[(data[aktag] > -50.)]
-    if exclude_star_bad:
-        data= data[(data['ASPCAPFLAG'] & 2**23) == 0]
-    if exclude_star_warn:
-        data= data[(data['ASPCAPFLAG'] & 2**7) == 0]
+    if not columns is None and not raw:
+        # Add the columns necessary for the derived quantities; columns 
+        # only necessary for the cuts are read from the cache when needed
+        reqcols= ['J','H','K',aktag]
+        if adddist: reqcols.extend(['RA','DEC'])
+        if _addMetalsAlphaFe(): reqcols.append('PARAM')
+        columns= _add_columns(columns,reqcols)
+    #Index of duplicates is computed for the whole file, cached
+    if rmdups and not raw:
+        keep= _duplicate_keep_index_cached(filePath)
+    else:
+        keep= None
+    cutkwargs= {'rmcommissioning':rmcommissioning,'rmnovisits':rmnovisits,
+                'main':main,'ak':ak,'aktag':aktag,
+                'exclude_star_bad':exclude_star_bad,
+                'exclude_star_warn':exclude_star_warn,'cuts':cuts}
+    if not chunksize is None:
+        return _allStar_chunks(filePath,chunksize,keep,raw,columns,
+                               adddist,lazy,cutkwargs)
+    #read allStar file
+    if raw:
+        if columns is None: return fitsio.read(filePath)
+        else: return _read_columns(filePath,columns)
+    if columns is None:
+        data= fitsio.read(filePath)
+    else:
+        data= _MemmapColumns(filePath)
+    return _allStar_process(data,keep,columns,adddist,lazy,cutkwargs)
+
+def _allStar_chunks(filePath,chunksize,keep,raw,columns,adddist,lazy,
+                    cutkwargs):
+    """Generator of processed chunks of the allStar file"""
+    for start,end,data in _read_chunks(filePath,chunksize,columns=columns):
+        if raw:
+            yield _take_rows(data,numpy.ones(end-start,dtype='bool'),
+                             columns=columns)
+            continue
+        if keep is None: ckeep= None
+        else: ckeep= keep[start:end]
+        data= _allStar_process(data,ckeep,columns,adddist,lazy,cutkwargs)
+        if len(data) > 0: yield data
+
+def _allStar_process(data,keep,columns,adddist,lazy,cutkwargs):
+    """Apply the cuts to (a chunk of) the allStar data and add the derived quantities"""
+    #Compile all cuts into a single index and apply it once
+    indx= _cuts_indx(data,keep=keep,idtag='APSTAR_ID',**cutkwargs)
+    data= _take_rows(data,indx,columns=columns)
+    if lazy: data= CatalogArray(data)
     #Add dereddened J, H, and Ks
-    aj= data[aktag]*2.5
-    ah= data[aktag]*1.55
-    data= esutil.numpy_util.add_fields(data,[('J0', float),
-                                             ('H0', float),
-                                             ('K0', float)])
-    data['J0']= data['J']-aj
-    data['H0']= data['H']-ah
-    data['K0']= data['K']-data[aktag]
-    data['J0'][(data[aktag] <= -50.)]= -9999.9999
-    data['H0'][(data[aktag] <= -50.)]= -9999.9999
-    data['K0'][(data[aktag] <= -50.)]= -9999.9999
+    data= _add_dereddened(data,cutkwargs['aktag'])
     #Add distances
     if adddist:
         dist= fitsio.read(path.distPath(),1)
-        h=esutil.htm.HTM()
-        m1,m2,d12 = h.match(dist['RA'],dist['DEC'],
-                             data['RA'],data['DEC'],
-                             2./3600.,maxmatch=1)
+        if len(data) > 0:
+            m1,m2,d12 = match.match(dist['RA'],dist['DEC'],
+                                    data['RA'],data['DEC'],
+                                    2./3600.,maxmatch=1)
+        else:
+            m1= numpy.zeros(0,dtype='int')
+            m2= numpy.zeros(0,dtype='int')
         data= data[m2]
         dist= dist[m1]
         distredux= path._redux_dr()
         if distredux.lower() == 'v302' or distredux.lower() == path._DR10REDUX:
-            data= esutil.numpy_util.add_fields(data,[('DM05', float),
-                                                     ('DM16', float),
-                                                     ('DM50', float),
-                                                     ('DM84', float),
-                                                     ('DM95', float),
-                                                     ('DMPEAK', float),
-                                                     ('DMAVG', float),
-                                                     ('SIG_DM', float),
-                                                     ('DIST_SOL', float),
-                                                     ('SIG_DISTSOL', float)])
-            data['DM05']= dist['DM05']
-            data['DM16']= dist['DM16']
-            data['DM50']= dist['DM50']
-            data['DM84']= dist['DM84']
-            data['DM95']= dist['DM95']
-            data['DMPEAK']= dist['DMPEAK']
-            data['DMAVG']= dist['DMAVG']
-            data['SIG_DM']= dist['SIG_DM']
-            data['DIST_SOL']= dist['DIST_SOL']/1000.
-            data['SIG_DISTSOL']= dist['SIG_DISTSOL']/1000.
+            data= _add_fields(data,[('DM05',dist['DM05']),
+                                    ('DM16',dist['DM16']),
+                                    ('DM50',dist['DM50']),
+                                    ('DM84',dist['DM84']),
+                                    ('DM95',dist['DM95']),
+                                    ('DMPEAK',dist['DMPEAK']),
+                                    ('DMAVG',dist['DMAVG']),
+                                    ('SIG_DM',dist['SIG_DM']),
+                                    ('DIST_SOL',dist['DIST_SOL']/1000.),
+                                    ('SIG_DISTSOL',dist['SIG_DISTSOL']/1000.)])
         elif distredux.lower() == path._DR11REDUX:
-            data= esutil.numpy_util.add_fields(data,[('DISO', float),
-                                                     ('DMASS', float),
-                                                     ('DISO_GAL', float),
-                                                     ('DMASS_GAL', float)])
-            data['DISO']= dist['DISO'][:,1]
-            data['DMASS']= dist['DMASS'][:,1]
-            data['DISO_GAL']= dist['DISO_GAL'][:,1]
-            data['DMASS_GAL']= dist['DMASS_GAL'][:,1]
+            data= _add_fields(data,[('DISO',dist['DISO'][:,1]),
+                                    ('DMASS',dist['DMASS'][:,1]),
+                                    ('DISO_GAL',dist['DISO_GAL'][:,1]),
+                                    ('DMASS_GAL',dist['DMASS_GAL'][:,1])])
         elif distredux.lower() == path._DR12REDUX:
-            data= esutil.numpy_util.add_fields(data,[('HIP_PLX', float),
-                                                     ('HIP_E_PLX', float),
-                                                     ('RC_DIST', float),
-                                                     ('APOKASC_DIST_DIRECT', float),
-                                                     ('BPG_DIST1_MEAN', float),
-                                                     ('HAYDEN_DIST_PEAK', float),
-                                                     ('SCHULTHEIS_DIST', float)])
-            data['HIP_PLX']= dist['HIP_PLX']
-            data['HIP_E_PLX']= dist['HIP_E_PLX']
-            data['RC_DIST']= dist['RC_dist_pc']
-            data['APOKASC_DIST_DIRECT']= dist['APOKASC_dist_direct_pc']/1000.
-            data['BPG_DIST1_MEAN']= dist['BPG_dist1_mean']
-            data['HAYDEN_DIST_PEAK']= 10.**(dist['HAYDEN_distmod_PEAK']/5.-2.)
-            data['SCHULTHEIS_DIST']= dist['SCHULTHEIS_dist']
-    if path._APOGEE_REDUX.lower() == 'current' \
-            or 'l30' in path._APOGEE_REDUX.lower() \
-            or int(path._APOGEE_REDUX[1:]) > 600:
-        data= esutil.numpy_util.add_fields(data,[('METALS', float),
-                                                 ('ALPHAFE', float)])
-        data['METALS']= data['PARAM'][:,paramIndx('metals')]
-        data['ALPHAFE']= data['PARAM'][:,paramIndx('alpha')]
+            data= _add_fields(data,
+                              [('HIP_PLX',dist['HIP_PLX']),
+                               ('HIP_E_PLX',dist['HIP_E_PLX']),
+                               ('RC_DIST',dist['RC_dist_pc']),
+                               ('APOKASC_DIST_DIRECT',
+                                dist['APOKASC_dist_direct_pc']/1000.),
+                               ('BPG_DIST1_MEAN',dist['BPG_dist1_mean']),
+                               ('HAYDEN_DIST_PEAK',
+                                10.**(dist['HAYDEN_distmod_PEAK']/5.-2.)),
+                               ('SCHULTHEIS_DIST',dist['SCHULTHEIS_dist'])])
+    if _addMetalsAlphaFe():
+        data= _add_fields(data,
+                          [('METALS',
+                            lambda d: d['PARAM'][:,paramIndx('metals')]),
+                           ('ALPHAFE',
+                            lambda d: d['PARAM'][:,paramIndx('alpha')])])
     return data
         
 def allVisit(rmcommissioning=True,
@@ -238,7 +343,11 @@ def allVisit(rmcommissioning=True,
              akvers='targ',
              plateInt=False,
              plateS4=False,
-             raw=False):
+             raw=False,
+             columns=None,
+             cuts=None,
+             chunksize=None,
+             lazy=False):
     """
     NAME:
        allVisit
@@ -252,33 +361,64 @@ def allVisit(rmcommissioning=True,
        plateInt= (False) if True, cast plate as an integer and give special plates -1
        plateS4= (False) if True, cast plate as four character string
        raw= (False) if True, just return the raw file, read w/ fitsio
+       columns= (None) if set to a list of column names, only read these columns (plus the columns necessary for the derived quantities) from a memory-mapped, per-column cache of the allVisit file (created the first time it is needed)
+       cuts= (None) list of additional cuts, each a function that takes the data (indexable by column name) and returns a boolean index of the entries to keep; all cuts are combined into a single index that is applied once
+       chunksize= (None) if set, return a generator that reads the file chunksize rows at a time and yields each chunk with all cuts applied and all derived quantities added (chunks that are empty after the cuts are skipped)
+       lazy= (False) if True, return a CatalogArray that holds the derived quantities (J0, H0, K0) next to the data as it is read, rather than copying the data into a new array; derived quantities are only computed when first accessed
     OUTPUT:
-       allVisit data
+       allVisit data (or generator of chunks of allVisit data when chunksize is set)
     HISTORY:
        2013-11-07 - Written - Bovy (IAS)
+       2026-10-18 - Added columns= and cuts=; cuts applied as a single index - Bovy (IAS)
+       2026-10-18 - Added chunksize= - Bovy (IAS)
+       2026-10-18 - Added lazy= - Bovy (IAS)
     """
     filePath= path.allVisitPath()
     if not os.path.exists(filePath):
         download.allVisit()
-    #read allVisit file
-    data= fitsio.read(path.allVisitPath())
-    if raw: return data
-    #Some cuts
-    if rmcommissioning:
-        indx= numpy.array(['apogee.n.c' in s for s in data['VISIT_ID']])
-        indx+= numpy.array(['apogee.s.c' in s for s in data['VISIT_ID']])
-        data= data[True-indx]
-    if main:
-        indx= mainIndx(data)
-        data= data[indx]
     if akvers.lower() == 'targ':
         aktag= 'AK_TARG'
     elif akvers.lower() == 'wise':
         aktag= 'AK_WISE'
-    if ak:
-        data= data[True-numpy.isnan(data[aktag])]
-        data= data[(data[aktag] > -50.)]
-    if plateInt or plateS4:
+    if not columns is None and not raw:
+        # Add the columns necessary for the derived quantities; columns 
+        # only necessary for the cuts are read from the cache when needed
+        reqcols= ['J','H','K',aktag]
+        if plateInt or plateS4: reqcols.append('PLATE')
+        columns= _add_columns(columns,reqcols)
+    cutkwargs= {'rmcommissioning':rmcommissioning,'main':main,'ak':ak,
+                'aktag':aktag,'cuts':cuts}
+    if not chunksize is None:
+        return _allVisit_chunks(filePath,chunksize,raw,columns,
+                                plateInt,plateS4,lazy,cutkwargs)
+    #read allVisit file
+    if raw:
+        if columns is None: return fitsio.read(filePath)
+        else: return _read_columns(filePath,columns)
+    if columns is None:
+        data= fitsio.read(filePath)
+    else:
+        data= _MemmapColumns(filePath)
+    return _allVisit_process(data,columns,plateInt,plateS4,lazy,cutkwargs)
+
+def _allVisit_chunks(filePath,chunksize,raw,columns,plateInt,plateS4,lazy,
+                     cutkwargs):
+    """Generator of processed chunks of the allVisit file"""
+    for start,end,data in _read_chunks(filePath,chunksize,columns=columns):
+        if raw:
+            yield _take_rows(data,numpy.ones(end-start,dtype='bool'),
+                             columns=columns)
+            continue
+        data= _allVisit_process(data,columns,plateInt,plateS4,lazy,
+                                cutkwargs)
+        if len(data) > 0: yield data
+
+def _allVisit_process(data,columns,plateInt,plateS4,lazy,cutkwargs):
+    """Apply the cuts to (a chunk of) the allVisit data and add the derived quantities"""
+    #Compile all cuts into a single index and apply it once
+    indx= _cuts_indx(data,idtag='VISIT_ID',**cutkwargs)
+    data= _take_rows(data,indx,columns=columns)
+    if (plateInt or plateS4) and len(data) > 0:
         #If plate is a string, cast it as an integer
         if isinstance(data['PLATE'][0],str):
             #First cast the special plates as -1
@@ -298,18 +438,36 @@ def allVisit(rmcommissioning=True,
                 dt[plateDtypeIndx]= (dt[plateDtypeIndx][0],'|S4')
             dt= numpy.dtype(dt)
             data= data.astype(dt)
+    if lazy: data= CatalogArray(data)
     #Add dereddened J, H, and Ks
-    aj= data[aktag]*2.5
-    ah= data[aktag]*1.55
-    data= esutil.numpy_util.add_fields(data,[('J0', float),
-                                             ('H0', float),
-                                             ('K0', float)])
-    data['J0']= data['J']-aj
-    data['H0']= data['H']-ah
-    data['K0']= data['K']-data[aktag]
-    data['J0'][(data[aktag] <= -50.)]= -9999.9999
-    data['H0'][(data[aktag] <= -50.)]= -9999.9999
-    data['K0'][(data[aktag] <= -50.)]= -9999.9999
+    return _add_dereddened(data,cutkwargs['aktag'])
+
+def _add_dereddened(data,aktag):
+    """Add dereddened J, H, and Ks to the data"""
+    return _add_fields(data,[('J0',lambda d: _dereddened(d,'J',aktag)),
+                             ('H0',lambda d: _dereddened(d,'H',aktag)),
+                             ('K0',lambda d: _dereddened(d,'K',aktag))])
+
+def _dereddened(data,band,aktag):
+    """Dereddened magnitude in band (J, H, or K); float64, like the column it is stored in, such that the value for bad AK is -9999.9999"""
+    if band == 'J': out= data['J']-data[aktag]*2.5
+    elif band == 'H': out= data['H']-data[aktag]*1.55
+    else: out= data['K']-data[aktag]
+    out= numpy.array(out,dtype='f8')
+    out[(data[aktag] <= -50.)]= -9999.9999
+    return out
+
+def _add_fields(data,fields):
+    """Add float columns to the data, given as a list of (name,values or function of the data that returns the values); for a CatalogArray the columns are added lazily, otherwise the data is copied into a new array with the additional columns"""
+    if isinstance(data,CatalogArray):
+        for name,value in fields: data.add_column(name,value)
+        return data
+    fields= [(name,value(data) if callable(value) else value)
+             for name,value in fields]
+    data= esutil.numpy_util.add_fields(data,[(name,float)
+                                             for name,value in fields])
+    for name,value in fields:
+        data[name]= value
     return data
         
 def apokasc(rmcommissioning=True,
@@ -333,10 +491,9 @@ def apokasc(rmcommissioning=True,
     #read the APOKASC file
     kascdata= fitsio.read(path.apokascPath())
     #Match these two
-    h=esutil.htm.HTM()
-    m1,m2,d12 = h.match(kascdata['RA'],kascdata['DEC'],
-                        data['RA'],data['DEC'],
-                        2./3600.,maxmatch=1)
+    m1,m2,d12 = match.match(kascdata['RA'],kascdata['DEC'],
+                            data['RA'],data['DEC'],
+                            2./3600.,maxmatch=1)
     data= data[m2]
     kascdata= kascdata[m1]
     kascdata= esutil.numpy_util.add_fields(kascdata,[('J0', float),
@@ -498,7 +655,8 @@ def apogeeField(dr=None):
 
 def apogeeObject(field_name,dr=None,
                  ak=True,
-                 akvers='targ'):
+                 akvers='targ',
+                 lazy=False):
     """
     NAME:
        apogeePlate
@@ -509,10 +667,12 @@ def apogeeObject(field_name,dr=None,
        dr= return the file corresponding to this data release
        ak= (default: True) only use objects for which dereddened mags exist
        akvers= 'targ' (default) or 'wise': use target AK (AK_TARG) or AK derived from all-sky WISE (AK_WISE)
+       lazy= (False) if True, return a CatalogArray that holds the dereddened magnitudes (J0, H0, K0) next to the data as it is read, only computed when first accessed
     OUTPUT:
        apogeeObject file
     HISTORY:
        2013-11-04 - Written - Bovy (IAS)
+       2026-10-18 - Added lazy= - Bovy (IAS)
     """
     filePath= path.apogeeObjectPath(field_name,dr=dr)
     if not os.path.exists(filePath):
@@ -523,22 +683,12 @@ def apogeeObject(field_name,dr=None,
     elif akvers.lower() == 'wise':
         aktag= 'AK_WISE'
     if ak:
-        data= data[True-numpy.isnan(data[aktag])]
-        data= data[(data[aktag] > -50.)]
+        data= data[(True-numpy.isnan(data[aktag]))*(data[aktag] > -50.)]
+    if lazy: data= CatalogArray(data)
     #Add dereddened J, H, and Ks
-    aj= data[aktag]*2.5
-    ah= data[aktag]*1.55
-    data= esutil.numpy_util.add_fields(data,[('J0', float),
-                                             ('H0', float),
-                                             ('K0', float)])
-    data['J0']= data['J']-aj
-    data['H0']= data['H']-ah
-    data['K0']= data['K']-data[aktag]
-    data['J0'][(data[aktag] <= -50.)]= -9999.9999
-    data['H0'][(data[aktag] <= -50.)]= -9999.9999
-    data['K0'][(data[aktag] <= -50.)]= -9999.9999
-    return data
+    return _add_dereddened(data,aktag)
 
+@specCache
 @specOnAspcapWavegrid
 def aspcapStar(loc_id,apogee_id,ext=1,dr=None,header=True,
                aspcapWavegrid=False):
@@ -559,6 +709,7 @@ def aspcapStar(loc_id,apogee_id,ext=1,dr=None,header=True,
        aspcapStar file or (aspcapStar file, header)
     HISTORY:
        2014-11-25 - Written - Bovy (IAS)
+       2026-10-18 - Can be cached in memory (enable_spec_cache) - Bovy (IAS)
     """
     filePath= path.aspcapStarPath(loc_id,apogee_id,dr=dr)
     if not os.path.exists(filePath):
@@ -566,6 +717,7 @@ def aspcapStar(loc_id,apogee_id,ext=1,dr=None,header=True,
     data= fitsio.read(filePath,ext,header=header)
     return data
 
+@specCache
 @specOnAspcapWavegrid
 def apStar(loc_id,apogee_id,ext=1,dr=None,header=True,aspcapWavegrid=False):
     """
@@ -585,6 +737,7 @@ def apStar(loc_id,apogee_id,ext=1,dr=None,header=True,aspcapWavegrid=False):
        apStar file or (apStar file, header)
     HISTORY:
        2015-01-13 - Written - Bovy (IAS)
+       2026-10-18 - Can be cached in memory (enable_spec_cache) - Bovy (IAS)
     """
     filePath= path.apStarPath(loc_id,apogee_id,dr=dr)
     if not os.path.exists(filePath):
@@ -592,6 +745,117 @@ def apStar(loc_id,apogee_id,ext=1,dr=None,header=True,aspcapWavegrid=False):
     data= fitsio.read(filePath,ext,header=header)
     return data
 
+def _spec_exts(loc_id,apogee_id,exts,dr=None,ftype='aspcapStar'):
+    """Read several extensions of an aspcapStar (ftype='aspcapStar') or apStar (ftype='apStar') file, opening the file only once"""
+    if ftype.lower() == 'aspcapstar':
+        filePath= path.aspcapStarPath(loc_id,apogee_id,dr=dr)
+        if not os.path.exists(filePath):
+            download.aspcapStar(loc_id,apogee_id,dr=dr)
+    else:
+        filePath= path.apStarPath(loc_id,apogee_id,dr=dr)
+        if not os.path.exists(filePath):
+            download.apStar(loc_id,apogee_id,dr=dr)
+    with fitsio.FITS(filePath) as fits:
+        return [fits[ext].read() for ext in exts]
+
+def apStarBatch(loc_ids,apogee_ids,dr=None,pixmask=bitmask.BADPIXMASK,
+                maskmode='inflate',aspcapWavegrid=False,nthreads=8):
+    """
+    NAME:
+       apStarBatch
+    PURPOSE:
+       read the combined spectra, errors, and masks of many stars from their apStar files (each file is opened once) and mask bad pixels
+    INPUT:
+       loc_ids - location IDs (fields for 1m targets)
+       apogee_ids - APOGEE IDs of the stars
+       dr= read the files corresponding to this data release (general default)
+       pixmask= (bitmask.BADPIXMASK) APOGEE_PIXMASK bitmask of the flags for which a pixel is masked (None: no masking)
+       maskmode= ('inflate') how to mask pixels: 'inflate' sets the error of masked pixels to 10^7, 'nan' sets the spectrum and error of masked pixels to NaN
+       aspcapWavegrid= (False) if True, output the spectra on the ASPCAP wavelength grid
+       nthreads= (8) number of files to read (and download if necessary) in parallel
+    OUTPUT:
+       (spec,specerr,mask): (nspec,nwave) arrays with the spectra, their errors, and the APOGEE_PIXMASK of each pixel; spectra and errors of stars whose file could not be read are NaN
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    return _specBatch(loc_ids,apogee_ids,'apStar',dr,pixmask,maskmode,
+                      aspcapWavegrid,nthreads)
+
+def aspcapStarBatch(loc_ids,apogee_ids,dr=None,pixmask=None,
+                    maskmode='inflate',aspcapWavegrid=False,nthreads=8):
+    """
+    NAME:
+       aspcapStarBatch
+    PURPOSE:
+       read the spectra and errors of many stars from their aspcapStar files (each file is opened once), optionally masking bad pixels
+    INPUT:
+       loc_ids - location IDs (fields for 1m targets)
+       apogee_ids - APOGEE IDs of the stars
+       dr= read the files corresponding to this data release (general default)
+       pixmask= (None) if set, APOGEE_PIXMASK bitmask (e.g., bitmask.BADPIXMASK) of the flags for which a pixel is masked; aspcapStar files do not contain a mask, so this reads the mask of the combined spectrum from the apStar file
+       maskmode= ('inflate') how to mask pixels: 'inflate' sets the error of masked pixels to 10^7, 'nan' sets the spectrum and error of masked pixels to NaN
+       aspcapWavegrid= (False) if True, output the spectra on the ASPCAP wavelength grid
+       nthreads= (8) number of files to read (and download if necessary) in parallel
+    OUTPUT:
+       (spec,specerr): (nspec,nwave) arrays with the spectra and their errors; spectra and errors of stars whose file could not be read are NaN
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    return _specBatch(loc_ids,apogee_ids,'aspcapStar',dr,pixmask,maskmode,
+                      aspcapWavegrid,nthreads)[:2]
+
+def _specBatch(loc_ids,apogee_ids,ftype,dr,pixmask,maskmode,aspcapWavegrid,
+               nthreads):
+    """Read the spectra, errors, and masks of many stars in parallel and mask the pixels that have any of the flags in pixmask set"""
+    if not maskmode.lower() in ['inflate','nan']:
+        raise ValueError("maskmode= should be 'inflate' or 'nan'")
+    if dr is None: dr= path._default_dr()
+    grid= apwavegrid.aspcapWavegrid(dr=dr)
+    nwave= grid.npix if aspcapWavegrid else apwavegrid._NLAMBDA
+    spec= numpy.empty((len(loc_ids),nwave))
+    specerr= numpy.empty((len(loc_ids),nwave))
+    mask= numpy.zeros((len(loc_ids),nwave),dtype='int32')
+    readmask= ftype.lower() == 'apstar' or not pixmask is None
+    def read_one(ii):
+        loc_id= download._loc_id(loc_ids[ii])
+        apogee_id= apogee_ids[ii].strip()
+        try:
+            if ftype.lower() == 'apstar':
+                data= _spec_exts(loc_id,apogee_id,[1,2,3],dr=dr,
+                                 ftype='apStar')
+            else:
+                data= _spec_exts(loc_id,apogee_id,[1,2],dr=dr,
+                                 ftype='aspcapStar')
+                if readmask:
+                    data.extend(_spec_exts(loc_id,apogee_id,[3],dr=dr,
+                                           ftype='apStar'))
+        except (IOError,OSError):
+            spec[ii]= numpy.nan
+            specerr[ii]= numpy.nan
+            return None
+        # Combined spectrum for apStar files with multiple visits
+        data= [d[0] if len(d.shape) == 2 else d for d in data]
+        if aspcapWavegrid:
+            grid.toAspcap(data[0],out=spec[ii])
+            grid.toAspcap(data[1],out=specerr[ii])
+            if readmask: grid.toAspcap(data[2],out=mask[ii])
+        else:
+            grid.toApStar(data[0],out=spec[ii],fill=numpy.nan)
+            grid.toApStar(data[1],out=specerr[ii],fill=_BIGERR)
+            if readmask: mask[ii]= data[2]
+        return None
+    pool= ThreadPool(nthreads)
+    try:
+        pool.map(read_one,range(len(loc_ids)))
+    finally:
+        pool.terminate()
+    if not pixmask is None:
+        masked= (mask & pixmask) != 0
+        specerr[masked]= _BIGERR if maskmode.lower() == 'inflate' \
+            else numpy.nan
+        if maskmode.lower() == 'nan': spec[masked]= numpy.nan
+    return (spec,specerr,mask)
+
 @modelspecOnApStarWavegrid
 def modelSpec(lib='GK',teff=4500,logg=2.5,metals=0.,
               cfe=0.,nfe=0.,afe=0.,vmicro=2.,
@@ -652,10 +916,10 @@ def modelSpec(lib='GK',teff=4500,logg=2.5,metals=0.,
     elif not ext == 234:
         return hdulist[ext].data[metalsIndx,loggIndx,teffIndx]
     else: #ext == 234, combine 2,3,4
-        out= numpy.zeros(7214)
-        out[:2920]= hdulist[2].data[metalsIndx,loggIndx,teffIndx]
-        out[2920:5320]= hdulist[3].data[metalsIndx,loggIndx,teffIndx]
-        out[5320:]= hdulist[4].data[metalsIndx,loggIndx,teffIndx]
+        grid= apwavegrid.aspcapWavegrid(dr=dr)
+        out= numpy.empty(grid.npix)
+        for aspcapSlice,chipExt in zip(grid.aspcapSlices,[2,3,4]):
+            out[aspcapSlice]= hdulist[chipExt].data[metalsIndx,loggIndx,teffIndx]
         return out
 
 def apWave(chip,ext=2,dr=None):
@@ -712,12 +976,51 @@ def mainIndx(data):
        index of 'main' targets in data
     HISTORY:
        2013-11-19 - Written - Bovy (IAS)
+       2026-10-18 - Use compiled masks of the flag names - Bovy (IAS)
     """
-    indx= (((data['APOGEE_TARGET1'] & 2**11) != 0)+((data['APOGEE_TARGET1'] & 2**12) != 0)+((data['APOGEE_TARGET1'] & 2**13) != 0))\
-        *((data['APOGEE_TARGET1'] & 2**7) == 0)\
-        *((data['APOGEE_TARGET1'] & 2**8) == 0)\
-        *((data['APOGEE_TARGET2'] & 2**9) == 0)
-        #*((data['APOGEE_TARGET1'] & 2**17) == 0)\
+    return _MAIN_TARGET1(data['APOGEE_TARGET1'])\
+        *_MAIN_TARGET2(data['APOGEE_TARGET2'])
+
+def commissioningIndx(ids):
+    """
+    NAME:
+       commissioningIndx
+    PURPOSE:
+       return the index of data obtained during commissioning
+    INPUT:
+       ids - APSTAR_ID or VISIT_ID array
+    OUTPUT:
+       index of commissioning data
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    return (numpy.char.find(ids,'apogee.n.c') >= 0)\
+        +(numpy.char.find(ids,'apogee.s.c') >= 0)
+
+def _cuts_indx(data,keep=None,rmcommissioning=False,idtag='APSTAR_ID',
+               rmnovisits=False,main=False,ak=False,aktag='AK_TARG',
+               exclude_star_bad=False,exclude_star_warn=False,cuts=None):
+    """Compile all cuts into a single boolean index, evaluating one column at a time; keep= is an initial index to start from"""
+    if keep is None:
+        indx= numpy.ones(len(data[aktag]),dtype='bool')
+    else:
+        indx= numpy.array(keep,dtype='bool')
+    if rmcommissioning:
+        indx&= True-commissioningIndx(data[idtag])
+    if rmnovisits:
+        indx&= numpy.char.strip(data['VISITS']) != ''
+    if main:
+        indx&= mainIndx(data)
+    if ak:
+        indx&= True-numpy.isnan(data[aktag])
+        indx&= data[aktag] > -50.
+    if exclude_star_bad:
+        indx&= _NOT_STAR_BAD(data['ASPCAPFLAG'])
+    if exclude_star_warn:
+        indx&= _NOT_STAR_WARN(data['ASPCAPFLAG'])
+    if not cuts is None:
+        for cut in cuts:
+            indx&= cut(data)
     return indx
 
 def remove_duplicates(data):
@@ -732,33 +1035,204 @@ def remove_duplicates(data):
        array w/ duplicates removed
     HISTORY:
        2014-06-23 - Written - Bovy (IAS)
+       2026-10-18 - Single self-match and vectorized selection of duplicates - Bovy (IAS)
     """
-    tdata= copy.copy(data)
-    #Match the data against itself
+    return data[_duplicate_keep_index(data)]
+
+def _duplicate_keep_index(data):
+    """Return the boolean index of the entries in data that are kept when removing duplicates: within each group of entries within 2 arcsec of each other, only the entry with the highest SNR is kept, with commissioning data and entries with bad AK only kept if there is nothing else"""
+    #Match the data against itself, all matches
     h=esutil.htm.HTM()
-    htmrev2,minid,maxid = h.match_prepare(data['RA'],data['DEC'])
     m1,m2,d12 = h.match(data['RA'],data['DEC'],
                         data['RA'],data['DEC'],
-                        2./3600.,maxmatch=0, #all matches
-                        htmrev2=htmrev2,minid=minid,maxid=maxid)
-    sindx= numpy.argsort(m1)
-    sm1= m1[sindx]
-    dup= sm1[1:] == sm1[:-1]
-    for d in tqdm.tqdm(sm1[:-1][dup]):
-        #Find the matches for just this duplicate
-        nm1,nm2,nd12= h.match(data['RA'][d],data['DEC'][d],
-                              data['RA'],data['DEC'],
-                              2./3600.,maxmatch=0, #all matches
-                              htmrev2=htmrev2,minid=minid,maxid=maxid)
-        #If some matches are commissioning data or have bad ak, rm from consideration
-        comindx= numpy.array(['apogee.n.c' in s for s in data['APSTAR_ID'][nm2]])
-        comindx+= numpy.array(['apogee.s.c' in s for s in data['APSTAR_ID'][nm2]])
-        goodak= (True-numpy.isnan(data['AK_TARG'][nm2]))\
-            *(data['AK_TARG'][nm2] > -50.)
-        hisnr= numpy.argmax(data['SNR'][nm2]*(True-comindx)*goodak) #effect. make com zero SNR
-        if numpy.amax(data['SNR'][nm2]*(True-comindx)*goodak) == 0.: #all commissioning or bad ak, treat all equally
-            hisnr= numpy.argmax(data['SNR'][nm2])
-        tindx= numpy.ones(len(nm2),dtype='bool')
-        tindx[hisnr]= False
-        tdata['RA'][nm2[tindx]]= -9999
-    return tdata[tdata['RA'] != -9999]
+                        2./3600.,maxmatch=0)
+    #If some matches are commissioning data or have bad ak, effectively 
+    #make their SNR zero
+    snr= numpy.nan_to_num(data['SNR'])
+    score= snr*(True-commissioningIndx(data['APSTAR_ID']))\
+        *(True-numpy.isnan(data['AK_TARG']))*(data['AK_TARG'] > -50.)
+    #Group the matches by m1
+    sindx= numpy.lexsort((m2,m1))
+    m1= m1[sindx]
+    m2= m2[sindx]
+    start= numpy.flatnonzero(numpy.hstack(([True],m1[1:] != m1[:-1])))
+    ngroup= numpy.diff(numpy.hstack((start,[len(m1)])))
+    #All commissioning or bad ak within a group, treat all equally
+    allbad= numpy.maximum.reduceat(score[m2],start) == 0.
+    gscore= numpy.where(numpy.repeat(allbad,ngroup),snr[m2],score[m2])
+    #Sort within each group on decreasing score, the first entry is kept
+    sindx= numpy.lexsort((-gscore,m1))
+    m2= m2[sindx]
+    best= numpy.repeat(m2[start],ngroup)
+    keep= numpy.ones(len(data),dtype='bool')
+    keep[m2[m2 != best]]= False
+    return keep
+
+def _duplicate_keep_index_cached(filePath):
+    """Return the index of entries kept when removing duplicates from the allStar file at filePath, cached in a small file next to the allStar file that is keyed by the checksum of the allStar file"""
+    dupsFilename= filePath.replace('.fits','-dups.npz')
+    key= _file_checksum(filePath)
+    keep= _read_dups_cache(dupsFilename,key)
+    if not keep is None: return keep
+    # Only one process finds the duplicates, the others wait and read them
+    with download._file_lock(dupsFilename):
+        keep= _read_dups_cache(dupsFilename,key)
+        if not keep is None: return keep
+        sys.stdout.write('\r'+"Finding duplicates and caching their index ...\r")
+        sys.stdout.flush()
+        keep= _duplicate_keep_index(\
+            fitsio.read(filePath,
+                        columns=['RA','DEC','SNR','APSTAR_ID','AK_TARG']))
+        # Write to a temporary file first, such that a partially written file
+        # is never read
+        with open(dupsFilename+'.tmp','wb') as dupsFile:
+            numpy.savez(dupsFile,key=numpy.array(key),ndata=len(keep),
+                        dups=numpy.flatnonzero(True-keep))
+        os.rename(dupsFilename+'.tmp',dupsFilename)
+    sys.stdout.write('\r'+_ERASESTR+'\r')
+    sys.stdout.flush()
+    return keep
+
+def _read_dups_cache(dupsFilename,key):
+    """Read the index of kept entries from the duplicates cache; None if the cache does not exist or is for a different version of the file"""
+    if not os.path.exists(dupsFilename): return None
+    with open(dupsFilename,'rb') as dupsFile:
+        dups= numpy.load(dupsFile)
+        if str(dups['key']) != key: return None
+        keep= numpy.ones(int(dups['ndata']),dtype='bool')
+        keep[dups['dups']]= False
+    return keep
+
+def _file_checksum(filePath,ext=1):
+    """Key that identifies the contents of a FITS file: its DATASUM/CHECKSUM if present, otherwise the file's name, size, and modification time"""
+    hdr= fitsio.read_header(filePath,ext)
+    if 'DATASUM' in hdr or 'CHECKSUM' in hdr:
+        return 'DATASUM=%s CHECKSUM=%s' % (hdr.get('DATASUM',''),
+                                           hdr.get('CHECKSUM',''))
+    stat= os.stat(filePath)
+    return '%s %i %i' % (os.path.basename(filePath),
+                         stat.st_size,int(stat.st_mtime))
+
+def _addMetalsAlphaFe():
+    """Whether METALS and ALPHAFE need to be added to the allStar data"""
+    return path._APOGEE_REDUX.lower() == 'current' \
+        or 'l30' in path._APOGEE_REDUX.lower() \
+        or int(path._APOGEE_REDUX[1:]) > 600
+
+def _add_columns(columns,reqcols):
+    """Add the required columns reqcols to columns, w/o duplicates"""
+    out= list(columns)
+    upcols= [col.upper() for col in out]
+    for col in reqcols:
+        if not col.upper() in upcols:
+            out.append(col)
+            upcols.append(col.upper())
+    return out
+
+def _columns_cache(filePath,ext=1):
+    """Create (if necessary) the per-column cache of a FITS table and return the directory it lives in; each column is stored as a .npy file that can be memory-mapped"""
+    cacheDir= filePath.replace('.fits','-columns')
+    if ext != 1: cacheDir+= '-%i' % ext
+    stat= os.stat(filePath)
+    source= '%s %i %i\n' % (os.path.basename(filePath),
+                            stat.st_size,int(stat.st_mtime))
+    sourceFilename= os.path.join(cacheDir,'_source')
+    if _columns_cache_current(sourceFilename,source): return cacheDir
+    # Only one process writes the cache, the others wait for it
+    with download._file_lock(cacheDir):
+        if _columns_cache_current(sourceFilename,source): return cacheDir
+        sys.stdout.write('\r'+"Caching the columns of %s (only happens once) ...\r" % os.path.basename(filePath))
+        sys.stdout.flush()
+        try:
+            os.makedirs(cacheDir)
+        except OSError: pass
+        if os.path.exists(sourceFilename): os.remove(sourceFilename)
+        with fitsio.FITS(filePath) as fits:
+            hdu= fits[ext]
+            for col in hdu.get_colnames():
+                # Write to a temporary file first, such that a cache is never
+                # left in an inconsistent state
+                colFilename= os.path.join(cacheDir,'%s.npy' % col)
+                with open(colFilename+'.tmp','wb') as colFile:
+                    numpy.save(colFile,hdu.read_column(col))
+                os.rename(colFilename+'.tmp',colFilename)
+        # Only mark the cache as complete when all columns have been written
+        with open(sourceFilename,'w') as sourceFile:
+            sourceFile.write(source)
+    sys.stdout.write('\r'+_ERASESTR+'\r')
+    sys.stdout.flush()
+    return cacheDir
+
+def _columns_cache_current(sourceFilename,source):
+    """Whether the column cache with the given _source file is complete and for the current version of the FITS file"""
+    if not os.path.exists(sourceFilename): return False
+    with open(sourceFilename,'r') as sourceFile:
+        return sourceFile.read() == source
+
+class _MemmapColumns(dict):
+    """Dictionary of the memory-mapped columns of a FITS table, columns are only loaded when they are first accessed"""
+    def __init__(self,filePath,ext=1):
+        dict.__init__(self)
+        self._filePath= filePath
+        self._cacheDir= _columns_cache(filePath,ext=ext)
+        self._names= dict((os.path.splitext(name)[0].upper(),
+                           os.path.splitext(name)[0])
+                          for name in os.listdir(self._cacheDir)
+                          if name.endswith('.npy'))
+        self._rows= None
+    def __missing__(self,col):
+        try:
+            name= self._names[col.upper()]
+        except KeyError:
+            raise ValueError("Column %s not found in %s" % (col,os.path.basename(self._filePath)))
+        out= numpy.load(os.path.join(self._cacheDir,'%s.npy' % name),
+                        mmap_mode='r')
+        if not self._rows is None: out= out[self._rows]
+        self[col]= out
+        return out
+    def name(self,col):
+        """Return the name of a column as stored in the file"""
+        return self._names[col.upper()]
+    def rows(self,start,end):
+        """Return the columns for rows start to end (memory-mapped, not copied)"""
+        out= _MemmapColumns.__new__(_MemmapColumns)
+        dict.__init__(out)
+        out._filePath= self._filePath
+        out._cacheDir= self._cacheDir
+        out._names= self._names
+        out._rows= slice(start,end)
+        return out
+
+def _take_rows(data,indx,columns=None):
+    """Apply the index indx to data, which is either a recarray or a _MemmapColumns instance (in which case columns is the list of columns to return)"""
+    if not isinstance(data,_MemmapColumns):
+        if numpy.all(indx): return data
+        else: return data[indx]
+    dt= [(data.name(col),data[col].dtype,data[col].shape[1:]) 
+         for col in columns]
+    out= numpy.empty(numpy.sum(indx),dtype=dt)
+    for col,(name,_,_) in zip(columns,dt):
+        out[name]= data[col][indx]
+    return out
+
+def _read_chunks(filePath,chunksize,columns=None,ext=1):
+    """Generator that reads a FITS table chunksize rows at a time, yielding (start,end,data); data is a recarray if columns is None and a _MemmapColumns instance for the rows in the chunk otherwise"""
+    if columns is None:
+        with fitsio.FITS(filePath) as fits:
+            hdu= fits[ext]
+            nrows= hdu.get_nrows()
+            for start in range(0,nrows,chunksize):
+                end= min(start+chunksize,nrows)
+                yield (start,end,hdu[start:end])
+    else:
+        data= _MemmapColumns(filePath,ext=ext)
+        nrows= len(data[columns[0]])
+        for start in range(0,nrows,chunksize):
+            end= min(start+chunksize,nrows)
+            yield (start,end,data.rows(start,end))
+
+def _read_columns(filePath,columns,ext=1):
+    """Read a subset of columns of a FITS table through the per-column cache"""
+    data= _MemmapColumns(filePath,ext=ext)
+    return _take_rows(data,numpy.ones(len(data[columns[0]]),dtype='bool'),
+                      columns=columns)
@@ -0,0 +1,117 @@
+#
+# bench_import.py: measure the time and memory it takes to import each of
+#                  the public apogee modules
+#
+# Every module is imported in a fresh interpreter, such that the numbers
+# represent the cold-start cost that a short-lived script pays. The time is
+# the wall-clock time spent in the import statement, the memory is the
+# increase in the maximum resident set size over that of an interpreter
+# that has only imported numpy (which every module needs)
+#
+# Run as 'python bench_import.py' (add -n 5 to take the median of 5 runs
+# and -o bench.csv to save the results); the environment variables
+# described in apogee.tools.path need to be set
+#
+import sys
+from optparse import OptionParser
+import subprocess
+import csv
+import numpy
+_MODULES= ['apogee.tools.path',
+           'apogee.tools.bitmask',
+           'apogee.tools.download',
+           'apogee.tools',
+           'apogee.tools.read',
+           'apogee.tools.match',
+           'apogee.spec.wavegrid',
+           'apogee.spec.window',
+           'apogee.spec.lsf',
+           'apogee.spec.continuum',
+           'apogee.spec.cube',
+           'apogee.spec.cannon',
+           'apogee.spec.stack',
+           'apogee.spec.plot',
+           'apogee.modelatm.atlas9',
+           'apogee.modelspec',
+           'apogee.modelspec.ferre',
+           'apogee.modelspec.moog',
+           'apogee.modelspec.turbospec',
+           'apogee.select.apogeeSelect',
+           'apogee.samples.rc',
+           'apogee.util.dens_kde']
+# Heavy optional dependencies that only the functions that need them should
+# import
+_HEAVY= ['matplotlib','galpy','isodist','emcee']
+_BENCH_CODE= """
+import resource, sys, time
+import numpy
+rss0= resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start= time.time()
+import %s
+print(time.time()-start)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss-rss0)
+print(' '.join([m for m in %r if m in sys.modules]))
+"""
+def bench_import(module,nruns=1):
+    """
+    NAME:
+       bench_import
+    PURPOSE:
+       measure the cold-start cost of importing a module
+    INPUT:
+       module - name of the module
+       nruns= (1) number of fresh interpreters to import the module in; the median time is returned
+    OUTPUT:
+       (time in s,increase in max. RSS in MB,list of heavy dependencies that got imported); (nan,nan,[]) if the import fails
+    HISTORY:
+       2026-10-18 - Written - Bovy (IAS)
+    """
+    times, mems= [], []
+    for ii in range(nruns):
+        proc= subprocess.Popen([sys.executable,'-c',
+                                _BENCH_CODE % (module,_HEAVY)],
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+        out, err= proc.communicate()
+        if proc.returncode != 0:
+            return (numpy.nan,numpy.nan,[])
+        out= out.decode().split('\n')
+        times.append(float(out[0]))
+        # ru_maxrss is in kB on Linux, in bytes on Mac OS X
+        if sys.platform == 'darwin':
+            mems.append(float(out[1])/2.**20.)
+        else:
+            mems.append(float(out[1])/2.**10.)
+    return (numpy.median(times),numpy.median(mems),out[2].split())
+
+def bench(args,options):
+    if len(args) > 0: modules= args
+    else: modules= _MODULES
+    results= []
+    print "%-30s %10s %10s   %s" % ('module','time (s)','mem (MB)',
+                                    'heavy dependencies imported')
+    for module in modules:
+        time, mem, heavy= bench_import(module,nruns=options.nruns)
+        results.append((module,time,mem,' '.join(heavy)))
+        print "%-30s %10.3f %10.1f   %s" % results[-1]
+    if not options.savefilename is None:
+        with open(options.savefilename,'w') as csvfile:
+            writer= csv.writer(csvfile)
+            writer.writerow(['module','time','mem','heavy'])
+            for result in results:
+                writer.writerow(result)
+    return None
+
+def get_options():
+    usage = "usage: %prog [options] [modules]"
+    parser = OptionParser(usage=usage)
+    parser.add_option("-n",dest='nruns',default=1,type='int',
+                      help="Number of times to import each module; the median is reported")
+    parser.add_option("-o",dest='savefilename',default=None,
+                      help="Name of a CSV file to save the results to")
+    return parser
+
+if __name__ == '__main__':
+    parser= get_options()
+    options,args= parser.parse_args()
+    bench(args,options)
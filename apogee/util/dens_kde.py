@@ -1,7 +1,6 @@
 # KDE density estimation
 import copy
 import numpy
-from galpy.util import logsumexp
 class densKDE:
     """Class for KDE density estimation"""
     def __init__(self,data,kernel='biweight',w=None,
@@ -85,6 +84,7 @@ class densKDE:
                                  numpy.tile(self._data.T,(x.shape[0],1,1))/divh,
                                  log=log)
         if log:
+            from galpy.util import logsumexp
             return logsumexp(thiskernel+numpy.tile(numpy.log(self._w),(x.shape[0],1))\
 #            return -self._dim*numpy.log(thish)\
                                  -numpy.sum(numpy.log(divh),axis=1),axis=1) #latter assumes that lambda are spherical